@@ -424,15 +424,25 @@ export const askPdGPT = async (
     }
 
     const reader = response.body?.getReader();
+    const decoder = new TextDecoder();
     if (reader) {
+      let buffer = '';
       while (true) {
         const { done, value } = await reader.read();
         if (done) break;
 
-        const chunk = new TextDecoder().decode(value);
-        const data = JSON.parse(chunk.replace('data: ', ''));
-
-        onData(data.word);
+        // A read can hold several SSE frames, or end part-way through one
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop() || '';
+
+        for (const line of lines) {
+          const trimmed = line.trim();
+          if (!trimmed.startsWith('data:')) continue;
+          const data = JSON.parse(trimmed.replace(/^data:\s*/, ''));
+          if (data.error) throw new Error(data.error);
+          if (data.word) onData(data.word);
+        }
       }
     }
   } catch (error) {
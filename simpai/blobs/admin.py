@@ -0,0 +1,17 @@
+from django.contrib import admin
+
+from .models import Blob, UploadSession
+
+
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'refcount', 'created_at')
+    search_fields = ('sha256',)
+
+
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'kind', 'filename', 'received', 'size', 'file_id', 'updated_at')
+    list_filter = ('kind',)
+
+
+admin.site.register(Blob, BlobAdmin)
+admin.site.register(UploadSession, UploadSessionAdmin)
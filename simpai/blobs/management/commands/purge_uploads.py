@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from blobs.models import UploadSession
+from blobs.uploads import discard_upload
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked upload sessions, and their partial files, that saw no activity for a while'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ttl", default=None, type=int,
+                            help="Idle seconds before a session is deleted (default: UPLOAD_SESSION_TTL)")
+
+    def handle(self, *args, **options):
+        # python manage.py purge_uploads --ttl 3600
+        ttl = options["ttl"] if options["ttl"] is not None else settings.UPLOAD_SESSION_TTL
+        cutoff = timezone.now() - timedelta(seconds=ttl)
+        purged = 0
+        for session in UploadSession.objects.filter(updated_at__lt=cutoff).iterator():
+            discard_upload(session)
+            purged += 1
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} upload session(s)"))
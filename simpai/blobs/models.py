@@ -0,0 +1,73 @@
+import os
+import uuid
+
+from django.conf import settings
+from django.db import models
+
+
+class Blob(models.Model):
+    """
+    One stored file, shared by every upload with the same bytes and
+    extension. `refcount` is the number of uploads pointing at it; the file
+    is deleted when the last of them is.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
+
+
+class UploadKind(models.TextChoices):
+    DOCUMENT = 'document', 'Document'
+    SPREADSHEET = 'spreadsheet', 'Spreadsheet'
+
+
+class UploadSession(models.Model):
+    """
+    A chunked upload in progress. Chunks are appended in order to a partial
+    file under UPLOADS_PARTIAL_ROOT, each checked against the SHA-256 the
+    client sent with it; a client that lost its connection fetches the
+    session and resumes at `next_chunk`. Completing the upload turns the
+    partial file into an UploadedFile or UploadedSpreadsheet.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=UploadKind.choices)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    # Optional SHA-256 of the whole file, checked on completion
+    sha256 = models.CharField(max_length=64, blank=True, default="")
+    received = models.BigIntegerField(default=0)
+    chunk_checksums = models.JSONField(default=list, blank=True)
+    # The UploadedFile or UploadedSpreadsheet, once completed
+    file_id = models.IntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size} bytes)"
+
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    @property
+    def next_chunk(self):
+        return len(self.chunk_checksums)
+
+    @property
+    def is_complete(self):
+        return self.file_id is not None
+
+    @property
+    def partial_path(self):
+        return os.path.join(settings.UPLOADS_PARTIAL_ROOT, f"{self.pk}.part")
+
+    def chunk_length(self, index):
+        """The exact length of chunk `index`; only the last may be shorter."""
+        return min(self.chunk_size, self.size - index * self.chunk_size)
@@ -0,0 +1,29 @@
+from django.conf import settings
+from rest_framework import serializers
+from blobs.models import UploadSession
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    upload_id = serializers.UUIDField(source='id', read_only=True)
+    chunk_count = serializers.IntegerField(read_only=True)
+    next_chunk = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            'upload_id', 'kind', 'filename', 'size', 'sha256', 'chunk_size', 'chunk_count',
+            'next_chunk', 'received', 'file_id', 'created_at',
+        ]
+        read_only_fields = ['chunk_size', 'received', 'file_id', 'created_at']
+
+    def validate_size(self, size):
+        if size < 1:
+            raise serializers.ValidationError("The file is empty.")
+        if size > settings.UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f"Files may be at most {settings.UPLOAD_MAX_SIZE} bytes.")
+        return size
+
+    def validate_sha256(self, sha256):
+        sha256 = sha256.strip().lower()
+        if sha256 and (len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256)):
+            raise serializers.ValidationError("Must be a SHA-256 hex digest.")
+        return sha256
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+from .models import Blob
+
+BLOB_DIR = "blobs"
+_BLOB_NAME_RE = re.compile(rf"^{BLOB_DIR}/[0-9a-f]{{2}}/(?P<digest>[0-9a-f]{{64}})(?:\.\w+)?$")
+
+
+def blob_name(digest, extension):
+    return f"{BLOB_DIR}/{digest[:2]}/{digest}{extension}"
+
+
+class BlobStorage(FileSystemStorage):
+    """
+    Content-addressed file storage under MEDIA_ROOT/blobs.
+
+    Saving a file stores it as `blobs/<sha256[:2]>/<sha256><ext>` and
+    counts a reference to it; saving the same bytes again only counts
+    another reference. Deleting drops one reference and removes the file
+    with the last one. The upload's own name only contributes its
+    extension, which the extractors dispatch on.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # _save picks the final name from the content
+        return name
+
+    def _spool(self, content, directory):
+        """Copies content to a temporary file, hashing it on the way."""
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        with os.fdopen(fd, 'wb') as tmp:
+            for chunk in content.chunks():
+                digest.update(chunk)
+                tmp.write(chunk)
+        return tmp_path, digest.hexdigest()
+
+    def _place(self, content, full_path, tmp_path):
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if tmp_path:
+            os.replace(tmp_path, full_path)
+        elif hasattr(content, 'temporary_file_path'):
+            # Large uploads are already on disk; move instead of copying
+            file_move_safe(content.temporary_file_path(), full_path, allow_overwrite=True)
+        else:
+            tmp_path, _ = self._spool(content, os.path.dirname(full_path))
+            os.replace(tmp_path, full_path)
+
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1].lower()
+        # The hashing upload handlers hash uploads as they stream in; any
+        # other content is hashed while it is copied
+        digest = getattr(content, 'sha256', None)
+        tmp_path = None
+        if digest is None:
+            os.makedirs(self.path(BLOB_DIR), exist_ok=True)
+            tmp_path, digest = self._spool(content, self.path(BLOB_DIR))
+
+        name = blob_name(digest, extension)
+        try:
+            with transaction.atomic():
+                blob, created = Blob.objects.select_for_update().get_or_create(
+                    name=name, defaults={"sha256": digest, "size": content.size}
+                )
+                if created or not self.exists(name):
+                    self._place(content, self.path(name), tmp_path)
+                    tmp_path = None
+                Blob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return name
+
+    def delete(self, name):
+        """Drops one reference to a blob, deleting the file with the last one."""
+        if not _BLOB_NAME_RE.match(name or ""):
+            # Uploads stored before blobs belong to a single row
+            return super().delete(name)
+        with transaction.atomic():
+            blob = Blob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                return
+            if blob.refcount > 1:
+                Blob.objects.filter(pk=blob.pk).update(refcount=F('refcount') - 1)
+                return
+            blob.delete()
+            super().delete(name)
+
+
+blob_storage = BlobStorage()
+
+
+def get_blob_storage():
+    return blob_storage
+
+def blob_digest(path):
+    """
+    Returns the SHA-256 of a stored blob from its path alone, or None if
+    the path is not a blob.
+    """
+    try:
+        name = os.path.relpath(path, blob_storage.location).replace(os.sep, "/")
+    except ValueError:
+        return None
+    match = _BLOB_NAME_RE.match(name)
+    return match["digest"] if match else None
@@ -0,0 +1,217 @@
+import hashlib
+import os
+import threading
+
+from django.apps import apps
+from django.core.files import File
+from django.db import transaction
+
+from .models import UploadKind, UploadSession
+
+# The model each kind of chunked upload turns into
+UPLOAD_MODELS = {
+    UploadKind.DOCUMENT: "summarisation.UploadedFile",
+    UploadKind.SPREADSHEET: "spreadsheet.UploadedSpreadsheet",
+}
+
+# Request bodies are copied to disk in blocks of this size
+COPY_BLOCK_SIZE = 64 * 1024
+# Running digests of at most this many uploads are kept per process
+RUNNING_DIGESTS_MAX = 256
+
+# Upload id -> (bytes hashed, SHA-256 of them) for uploads whose chunks
+# this process received. Clients send the chunks of an upload one after
+# another, usually over one connection and so to one worker, which then
+# has the whole file's digest by the time the upload completes
+_running_digests = {}
+_running_digests_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    """A chunk or completion request that cannot be accepted."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class _AssembledUpload(File):
+    """
+    A completed partial file, presented to BlobStorage like a large
+    upload: already hashed and on disk, so it is moved rather than copied.
+    """
+
+    def __init__(self, path, name, sha256):
+        super().__init__(open(path, 'rb'), name=name)
+        self.sha256 = sha256
+        self._path = path
+
+    def temporary_file_path(self):
+        return self._path
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _running_digest(session_id, offset):
+    """
+    Returns a copy of the running SHA-256 of an upload's first `offset`
+    bytes, or None if this process does not have it.
+    """
+    if offset == 0:
+        return hashlib.sha256()
+    with _running_digests_lock:
+        hashed, digest = _running_digests.get(session_id, (None, None))
+        return digest.copy() if hashed == offset else None
+
+def _keep_running_digest(session_id, hashed, digest):
+    with _running_digests_lock:
+        _running_digests.pop(session_id, None)
+        _running_digests[session_id] = (hashed, digest)
+        while len(_running_digests) > RUNNING_DIGESTS_MAX:
+            # The least recently appended-to upload
+            del _running_digests[next(iter(_running_digests))]
+
+def _drop_running_digest(session_id):
+    with _running_digests_lock:
+        _running_digests.pop(session_id, None)
+
+def append_chunk(session_id, user, index, stream, length, checksum):
+    """
+    Writes chunk `index` of an upload from the file-like `stream`.
+
+    The body is copied to the partial file in small blocks while it is
+    hashed, so memory use does not depend on the chunk size. The whole
+    file's digest is carried on from chunk to chunk where this process
+    received the previous one, for complete_upload. A chunk that
+    was already received is accepted again if its checksum matches, which
+    lets clients retry a chunk whose response they never saw.
+
+    Args:
+        session_id (UUID): The upload session.
+        user (User): The requesting user, who must own the session.
+        index (int): The chunk number, counting from 0.
+        stream: The request body.
+        length (int): The body's Content-Length.
+        checksum (str): The SHA-256 hex digest the client computed.
+
+    Returns:
+        UploadSession: The updated session.
+
+    Raises:
+        UploadSession.DoesNotExist: If the session does not exist for `user`.
+        UploadError: If the chunk is out of order, has the wrong length or
+            does not match its checksum.
+    """
+    checksum = (checksum or "").strip().lower()
+    if len(checksum) != 64:
+        raise UploadError("The X-Chunk-SHA256 header must hold the chunk's SHA-256.")
+
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(id=session_id, user=user)
+        if session.is_complete:
+            raise UploadError("The upload is already complete.", status=409)
+        if index < session.next_chunk:
+            if session.chunk_checksums[index] != checksum:
+                raise UploadError(f"Chunk {index} was already received with a different checksum.", status=409)
+            return session
+        if index != session.next_chunk or index >= session.chunk_count:
+            raise UploadError(f"Expected chunk {session.next_chunk}.", status=409)
+        expected = session.chunk_length(index)
+        if length != expected:
+            raise UploadError(f"Chunk {index} must be {expected} bytes, got {length}.")
+
+        offset = index * session.chunk_size
+        digest = hashlib.sha256()
+        running = _running_digest(session.pk, offset)
+        written = 0
+        os.makedirs(os.path.dirname(session.partial_path), exist_ok=True)
+        fd = os.open(session.partial_path, os.O_WRONLY | os.O_CREAT, 0o600)
+        with os.fdopen(fd, 'wb') as partial:
+            partial.seek(offset)
+            # Drop anything a failed attempt at this chunk left behind
+            partial.truncate()
+            while written < expected:
+                block = stream.read(min(COPY_BLOCK_SIZE, expected - written))
+                if not block:
+                    break
+                digest.update(block)
+                if running is not None:
+                    running.update(block)
+                partial.write(block)
+                written += len(block)
+            if written != expected or digest.hexdigest() != checksum:
+                partial.truncate(offset)
+                raise UploadError(f"Chunk {index} does not match its checksum; send it again.")
+
+        session.chunk_checksums.append(checksum)
+        session.received = offset + written
+        session.save(update_fields=["chunk_checksums", "received", "updated_at"])
+    if running is not None:
+        _keep_running_digest(session.pk, session.received, running)
+    return session
+
+def complete_upload(session_id, user):
+    """
+    Turns a fully received upload into an UploadedFile or
+    UploadedSpreadsheet, stored through BlobStorage like any other upload.
+    Completing an upload twice returns the same file.
+
+    The file's SHA-256 is the running digest kept by append_chunk where
+    this process has it. Otherwise the partial file is hashed, outside the
+    session's row lock: once every byte has been received it cannot change.
+    The partial file is gone once the upload is complete, either moved
+    into the blob store or, if the blob was already stored, deleted.
+
+    Returns:
+        UploadSession: The session, with `file_id` set.
+    """
+    session = UploadSession.objects.get(id=session_id, user=user)
+    if session.is_complete:
+        return session
+    if session.received != session.size:
+        raise UploadError(f"Only {session.received} of {session.size} bytes were received.", status=409)
+
+    running = _running_digest(session.pk, session.size)
+    try:
+        digest = running.hexdigest() if running is not None else _sha256_file(session.partial_path)
+    except FileNotFoundError:
+        # Completed meanwhile by another request, which removed the file
+        session.refresh_from_db()
+        if session.is_complete:
+            return session
+        raise
+
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(id=session_id, user=user)
+        if session.is_complete:
+            return session
+        if session.sha256 and session.sha256 != digest:
+            raise UploadError("The file does not match its SHA-256; start the upload again.")
+
+        model = apps.get_model(UPLOAD_MODELS[session.kind])
+        upload = model(user=user, original_name=session.filename)
+        content = _AssembledUpload(session.partial_path, session.filename, digest)
+        try:
+            upload.file.save(session.filename, content)
+        finally:
+            content.close()
+
+        session.file_id = upload.pk
+        session.save(update_fields=["file_id", "updated_at"])
+    _drop_running_digest(session.pk)
+    # Left behind when the content was already stored as a blob
+    if os.path.exists(session.partial_path):
+        os.remove(session.partial_path)
+    return session
+
+def discard_upload(session):
+    """Deletes an upload session and its partial file."""
+    _drop_running_digest(session.pk)
+    if os.path.exists(session.partial_path):
+        os.remove(session.partial_path)
+    session.delete()
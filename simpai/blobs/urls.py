@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path("", views.UploadSessionView.as_view(), name="upload-create"),
+    path("<uuid:upload_id>/", views.UploadStatusView.as_view(), name="upload-status"),
+    path("<uuid:upload_id>/chunks/<int:index>/", views.UploadChunkView.as_view(), name="upload-chunk"),
+    path("<uuid:upload_id>/complete/", views.UploadCompleteView.as_view(), name="upload-complete"),
+]
@@ -0,0 +1,90 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import UploadSession
+from .serializers import UploadSessionSerializer
+from .uploads import UploadError, append_chunk, complete_upload, discard_upload
+
+
+class UploadSessionView(APIView):
+    """
+    Starts a chunked upload:
+
+        POST   api/uploads/                        {kind, filename, size, sha256?}
+        PUT    api/uploads/<id>/chunks/<n>/        raw bytes, X-Chunk-SHA256 header
+        GET    api/uploads/<id>/                   progress, including next_chunk
+        POST   api/uploads/<id>/complete/          -> {file_id}
+        DELETE api/uploads/<id>/                   abandon the upload
+    """
+    parser_classes = [JSONParser]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = UploadSessionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        session = serializer.save(user=request.user, chunk_size=settings.UPLOAD_CHUNK_SIZE)
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+
+class UploadStatusView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, upload_id, *args, **kwargs):
+        try:
+            session = UploadSession.objects.get(id=upload_id, user=request.user)
+        except UploadSession.DoesNotExist:
+            return Response({"error": "Upload not found."}, status=404)
+        return Response(UploadSessionSerializer(session).data)
+
+    def delete(self, request, upload_id, *args, **kwargs):
+        try:
+            session = UploadSession.objects.get(id=upload_id, user=request.user)
+        except UploadSession.DoesNotExist:
+            return Response({"error": "Upload not found."}, status=404)
+        discard_upload(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadChunkView(APIView):
+    permission_classes = [IsAuthenticated]
+    # The body is raw bytes, read straight from the request stream
+    parser_classes = []
+
+    def put(self, request, upload_id, index, *args, **kwargs):
+        try:
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            return Response({"error": "Content-Length is required."}, status=411)
+
+        try:
+            session = append_chunk(
+                upload_id, request.user, index, request.stream, length,
+                request.headers.get("X-Chunk-SHA256"),
+            )
+        except UploadSession.DoesNotExist:
+            return Response({"error": "Upload not found."}, status=404)
+        except UploadError as e:
+            data = {"error": str(e)}
+            session = UploadSession.objects.filter(id=upload_id, user=request.user).first()
+            if session is not None:
+                data["next_chunk"] = session.next_chunk
+            return Response(data, status=e.status)
+        return Response(UploadSessionSerializer(session).data)
+
+
+class UploadCompleteView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, upload_id, *args, **kwargs):
+        try:
+            session = complete_upload(upload_id, request.user)
+        except UploadSession.DoesNotExist:
+            return Response({"error": "Upload not found."}, status=404)
+        except UploadError as e:
+            return Response({"error": str(e)}, status=e.status)
+        return Response({"file_id": session.file_id, "upload": UploadSessionSerializer(session).data})
@@ -1,12 +1,12 @@
-from rest_framework.views import APIView
+from helpers.async_api import AsyncAPIView
 from django.http import JsonResponse
 import requests
 import json
 from decouple import config
-from openai import OpenAI
+from helpers.llm import achat_completion
 
-class AskGPTView(APIView):
-    def post(self, request):
+class AskGPTView(AsyncAPIView):
+    async def post(self, request):
         if request.method == "POST":
             try:
                 # Extracting the query from the request body
@@ -17,19 +17,13 @@ class AskGPTView(APIView):
                     return JsonResponse({"error": "Query cannot be empty"}, status=400)
 
                 # Send the query to Deepseeks API
-                client = OpenAI(
-                    api_key=config('DEEPSEEK_API_KEY'),
-                    base_url="https://api.deepseek.com"
-                )
-                response = client.chat.completions.create(
-                    model="deepseek-chat",
-                    messages=[
+                answer = await achat_completion(
+                    [
                         {"role": "system", "content": "You are a helpful assistant answering user questions."},
                         {"role": "user", "content": question},
                     ],
-                    stream=False
+                    use_cache=not body.get("no_cache", False),
                 )
-                answer = response.choices[0].message.content
                 return JsonResponse({"response": answer})
             except Exception as e:
                 return JsonResponse({"error": f"Failed to process request: {str(e)}"}, status=500)
\ No newline at end of file
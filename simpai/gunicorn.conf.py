@@ -0,0 +1,17 @@
+# Loaded by gunicorn from the working directory.
+import os
+import shutil
+
+
+def on_starting(server):
+    # Metrics files of a previous run would be summed into this one's
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
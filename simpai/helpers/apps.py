@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class HelpersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'helpers'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .metrics import install_query_timer
+        connection_created.connect(install_query_timer)
@@ -0,0 +1,40 @@
+from asgiref.sync import sync_to_async
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView whose handlers are coroutines (`async def post(...)`).
+
+    DRF's own dispatch is synchronous. Here the checks that may touch the
+    database (authentication, permissions, throttling) run in a thread
+    through sync_to_async, and the handler is awaited on the event loop.
+    Under ASGI, a request waiting on the model then ties up no worker
+    thread. Under WSGI, Django runs the view in an event loop of its own,
+    so the same views still work with runserver or a sync deployment.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if hasattr(response, "__await__"):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
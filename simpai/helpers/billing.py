@@ -2,8 +2,21 @@ import requests
 from decouple import config
 import stripe.error
 from . import date_utils
+from .metrics import stage_timer
 from subscriptions.models import UserSubscription
 
+
+class _TimedSession(requests.Session):
+    """A session that times every Paystack API call as stage "paystack"."""
+
+    def request(self, *args, **kwargs):
+        with stage_timer("paystack"):
+            return super().request(*args, **kwargs)
+
+
+# Shared by all calls, so they also reuse connections to the API
+paystack_http = _TimedSession()
+
 class PaystackService:
     BASE_URL = "https://api.paystack.co"
 
@@ -38,7 +51,7 @@ class PaystackService:
             "email": email,
             "metadata": metadata,
         }
-        response = requests.post(
+        response = paystack_http.post(
             url,
             headers=PaystackService._get_headers(),
             json=payload
@@ -56,7 +69,7 @@ class PaystackService:
             "currency": "NGN",  # Default to USD, change as needed
             # "metadata": metadata,
         }
-        response = requests.post(
+        response = paystack_http.post(
             url,
             headers=PaystackService._get_headers(),
             json=payload
@@ -100,7 +113,7 @@ class PaystackService:
             "callback_url": success_url,
             "metadata": metadata or {}
         }
-        response = requests.post(
+        response = paystack_http.post(
             url,
             headers=PaystackService._get_headers(),
             json=payload
@@ -117,7 +130,7 @@ class PaystackService:
         url = f"{PaystackService.BASE_URL}/transaction/verify/{reference}"
         
         try:
-            response = requests.get(url, headers=PaystackService._get_headers(), timeout=10)
+            response = paystack_http.get(url, headers=PaystackService._get_headers(), timeout=10)
             response.raise_for_status()
             data = response.json()
 
@@ -173,7 +186,7 @@ class PaystackService:
     def get_customer_transactions(customer_email):
         """Fetch all transactions for a customer from Paystack"""
         url = f"{PaystackService.BASE_URL}/transaction?customer={customer_email}"
-        response = requests.get(url, headers=PaystackService._get_headers())
+        response = paystack_http.get(url, headers=PaystackService._get_headers())
         return response.json().get('data', [])
 
     @staticmethod
@@ -199,7 +212,7 @@ class PaystackService:
     @staticmethod
     def get_subscription(subscription_code, raw=False):
         url = f"{PaystackService.BASE_URL}/subscription/{subscription_code}"
-        response = requests.get(url, headers=PaystackService._get_headers())
+        response = paystack_http.get(url, headers=PaystackService._get_headers())
         response_data = response.json()
         
         # Add error handling
@@ -231,7 +244,7 @@ class PaystackService:
             "code": subscription_code,
             "token": config("PAYSTACK_SECRET_KEY"),
         }
-        response = requests.post(url, headers=PaystackService._get_headers())
+        response = paystack_http.post(url, headers=PaystackService._get_headers())
         if raw:
             return response.json()
         return response.json()
@@ -243,7 +256,7 @@ class PaystackService:
         Returns: customer_code if found, None otherwise
         """
         url = f"{PaystackService.BASE_URL}/customer/{email}"
-        response = requests.get(url, headers=PaystackService._get_headers())
+        response = paystack_http.get(url, headers=PaystackService._get_headers())
         data = response.json().get('data', {})
         
         if raw:
@@ -262,7 +275,7 @@ class PaystackService:
     }
         try:
             print(f"DEBUG: Requesting {url} with params: {params}")
-            response = requests.get(
+            response = paystack_http.get(
                 url,
                 headers=PaystackService._get_headers(),
                 params=params,  # More reliable than URL concatenation
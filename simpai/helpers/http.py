@@ -0,0 +1,174 @@
+import os
+import re
+
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Files are sent this many bytes at a time
+FILE_BLOCK_SIZE = 64 * 1024
+
+
+class _Unsatisfiable(Exception):
+    pass
+
+
+def _parse_range(header, size):
+    """
+    Returns the inclusive (start, end) of a single-range `Range` header,
+    or None when the header should be ignored and the whole file sent
+    (absent, malformed or multi-range).
+    """
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ("", ""):
+        return None
+    start, end = match.groups()
+    if start == "":
+        # Suffix range: the last `end` bytes
+        length = int(end)
+        if length == 0 or size == 0:
+            raise _Unsatisfiable()
+        return max(size - length, 0), size - 1
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        raise _Unsatisfiable()
+    end = int(end) if end else size - 1
+    return start, min(end, size - 1)
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+class _FileRange:
+    """
+    Reads `length` bytes of an open file from its current position, a
+    block at a time. StreamingHttpResponse closes it, and so the file,
+    once the response is done.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read_block(self):
+        data = self.file.read(min(FILE_BLOCK_SIZE, self.remaining)) if self.remaining > 0 else b""
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+class _SyncFileRange(_FileRange):
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        data = self.read_block()
+        if not data:
+            raise StopIteration
+        return data
+
+
+class _AsyncFileRange(_FileRange):
+    """
+    For ASGI, where blocks are read on a worker thread: Django would read a
+    synchronous iterator to the end before sending any of it.
+    """
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        data = await sync_to_async(self.read_block, thread_sensitive=False)()
+        if not data:
+            raise StopAsyncIteration
+        return data
+
+
+def _stat_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+def file_etag(path):
+    """A strong validator for a file, from its size and modification time."""
+    return _stat_etag(os.stat(path))
+
+def conditional_file_response(request, path, content_type, filename=None, etag=None, asynchronous=False):
+    """
+    Serves a file with ETag and Last-Modified validators.
+
+    Conditional GET/HEAD requests whose validators still match get an
+    empty 304. A single `Range: bytes=...` request gets a 206 with just
+    that slice, or a 416 when it lies outside the file; `If-Range` falls
+    back to the full file once the file has changed. The file is streamed
+    a block at a time rather than read into memory.
+
+    Args:
+        request (HttpRequest): The incoming request.
+        path (str): The file to send.
+        content_type (str): Its media type.
+        filename (str): Offered as the attachment name, if given.
+        etag (str): A quoted entity tag. Defaults to file_etag(path).
+        asynchronous (bool): Whether the response is served over ASGI, by
+            an async view, rather than WSGI.
+
+    Returns:
+        HttpResponse: The 200, 206, 304, 412 or 416 response.
+
+    Raises:
+        FileNotFoundError: If the file does not exist. It is opened before
+            anything else, so once this returns, removing the file (e.g.
+            evicting a cached artifact) no longer affects the response.
+    """
+    file = open(path, 'rb')
+    streamed = False
+    try:
+        stat = os.fstat(file.fileno())
+        size = stat.st_size
+        last_modified = int(stat.st_mtime)
+        etag = etag or _stat_etag(stat)
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            try:
+                byte_range = None
+                if request.method in ("GET", "HEAD") and _if_range_matches(request, etag, last_modified):
+                    byte_range = _parse_range(request.META.get("HTTP_RANGE"), size)
+            except _Unsatisfiable:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{size}"
+            else:
+                if byte_range is None and not asynchronous:
+                    # Lets the WSGI server send the file with sendfile
+                    response = FileResponse(file, content_type=content_type)
+                else:
+                    start, end = byte_range or (0, size - 1)
+                    file.seek(start)
+                    content = (_AsyncFileRange if asynchronous else _SyncFileRange)(file, end - start + 1)
+                    response = StreamingHttpResponse(content, content_type=content_type)
+                    response["Content-Length"] = end - start + 1
+                    if byte_range is not None:
+                        response.status_code = 206
+                        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+                streamed = True
+                if filename:
+                    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    finally:
+        # The response closes the file once it is sent, if it has a body
+        if not streamed:
+            file.close()
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Accept-Ranges"] = "bytes"
+    return response
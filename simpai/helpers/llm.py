@@ -0,0 +1,207 @@
+import asyncio
+import os
+import threading
+import weakref
+from contextlib import aclosing, closing
+
+import httpx
+from django.conf import settings
+from openai import AsyncOpenAI, OpenAI
+
+from .llm_cache import acached_completion, cached_completion, llm_cache, make_cache_key
+from .metrics import atimed_iter, timed_iter
+
+DEFAULT_MODEL = "deepseek-chat"
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+# httpx.AsyncClient connections belong to the event loop that opened them,
+# so async clients are kept per loop rather than per process.
+_async_clients = weakref.WeakKeyDictionary()
+
+_stats = {"requests": 0, "connections_opened": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+def _trace(event_name, info):
+    # httpcore reports every new TCP connection; reused keep-alive
+    # connections skip this event.
+    if event_name == "connection.connect_tcp.complete":
+        _count("connections_opened")
+
+async def _atrace(event_name, info):
+    _trace(event_name, info)
+
+def _on_request(request):
+    _count("requests")
+    request.extensions["trace"] = _trace
+
+async def _on_async_request(request):
+    _count("requests")
+    request.extensions["trace"] = _atrace
+
+def _pool_options():
+    return {
+        "limits": httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(settings.LLM_TIMEOUT, connect=10.0),
+    }
+
+def _build_client():
+    http_client = httpx.Client(event_hooks={"request": [_on_request]}, **_pool_options())
+    return OpenAI(
+        api_key=settings.DEEPSEEK_API_KEY,
+        base_url=settings.DEEPSEEK_BASE_URL,
+        http_client=http_client,
+    )
+
+def get_client() -> OpenAI:
+    """
+    Returns this process's shared DeepSeek client.
+
+    The client and its connection pool are created on first use and reused
+    by every thread afterwards. A forked child (e.g. a pool worker) gets its
+    own client instead of sharing the parent's sockets.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = _build_client()
+                _client_pid = pid
+    return _client
+
+def get_async_client() -> AsyncOpenAI:
+    """
+    Returns the shared async DeepSeek client of the running event loop.
+
+    Under uvicorn each worker runs one loop, so this is one client and one
+    connection pool per worker, used by every in-flight request.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        http_client = httpx.AsyncClient(event_hooks={"request": [_on_async_request]}, **_pool_options())
+        client = AsyncOpenAI(
+            api_key=settings.DEEPSEEK_API_KEY,
+            base_url=settings.DEEPSEEK_BASE_URL,
+            http_client=http_client,
+        )
+        _async_clients[loop] = client
+    return client
+
+def chat_completion(messages, model=DEFAULT_MODEL, use_cache=True, **params) -> str:
+    """
+    Sends a chat completion through the shared client and response cache.
+
+    Args:
+        messages (list): The chat messages.
+        model (str): The model name.
+        use_cache (bool): Set to False to bypass the response cache.
+        **params: Extra arguments for `chat.completions.create`.
+
+    Returns:
+        str: The content of the model's reply.
+    """
+    return cached_completion(get_client(), messages, model, use_cache, **params)
+
+def _stream_deltas(model, messages, params):
+    stream = get_client().chat.completions.create(model=model, messages=messages, stream=True, **params)
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        stream.close()
+
+def stream_chat_completion(messages, model=DEFAULT_MODEL, use_cache=True, **params):
+    """
+    Streams a chat completion, yielding content deltas as DeepSeek sends them.
+
+    A cached reply is yielded whole. A reply streamed to the end is added
+    to the cache; one abandoned half-way is not, and closing the generator
+    closes the upstream response so DeepSeek stops generating.
+
+    Args:
+        messages (list): The chat messages.
+        model (str): The model name.
+        use_cache (bool): Set to False to bypass the response cache.
+        **params: Extra arguments for `chat.completions.create`.
+
+    Yields:
+        str: The next piece of the reply.
+    """
+    key = make_cache_key(messages, model, **params)
+    if use_cache and settings.LLM_CACHE_ENABLED:
+        content = llm_cache.get(key)
+        if content is not None:
+            yield content
+            return
+
+    parts = []
+    # Timed until the last delta, but not while the caller handles each one
+    with closing(timed_iter("llm", _stream_deltas(model, messages, params))) as deltas:
+        for delta in deltas:
+            parts.append(delta)
+            yield delta
+
+    if settings.LLM_CACHE_ENABLED:
+        llm_cache.set(key, "".join(parts))
+
+async def achat_completion(messages, model=DEFAULT_MODEL, use_cache=True, **params) -> str:
+    """
+    Async counterpart of chat_completion. The event loop is free to serve
+    other requests while the reply is awaited.
+    """
+    return await acached_completion(get_async_client(), messages, model, use_cache, **params)
+
+async def _astream_deltas(model, messages, params):
+    stream = await get_async_client().chat.completions.create(model=model, messages=messages, stream=True, **params)
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        await stream.close()
+
+async def astream_chat_completion(messages, model=DEFAULT_MODEL, use_cache=True, **params):
+    """
+    Async counterpart of stream_chat_completion, yielding content deltas as
+    DeepSeek sends them. Closing the generator closes the upstream response.
+    """
+    key = make_cache_key(messages, model, **params)
+    if use_cache and settings.LLM_CACHE_ENABLED:
+        content = llm_cache.get(key)
+        if content is not None:
+            yield content
+            return
+
+    parts = []
+    async with aclosing(atimed_iter("llm", _astream_deltas(model, messages, params))) as deltas:
+        async for delta in deltas:
+            parts.append(delta)
+            yield delta
+
+    if settings.LLM_CACHE_ENABLED:
+        llm_cache.set(key, "".join(parts))
+
+def connection_stats() -> dict:
+    """
+    Returns how many requests this process sent to DeepSeek and how many
+    TCP connections it had to open for them.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    requests = stats["requests"]
+    stats["reuse_ratio"] = (1 - stats["connections_opened"] / requests) if requests else 0.0
+    return stats
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .metrics import count_cache, stage_timer
+
+
+class LLMCache:
+    """
+    Thread-safe LRU cache of chat-completion replies with a time-to-live.
+
+    Each entry remembers how many times it has been served. The cache lives
+    in the worker process, so every gunicorn worker keeps its own copy.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> [value, expires_at, hits]
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                count_cache("llm", False)
+                return None
+            self._entries.move_to_end(key)
+            entry[2] += 1
+            self.hits += 1
+            count_cache("llm", True)
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = [value, time.monotonic() + self.ttl, 0]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "entry_hits": {key: entry[2] for key, entry in self._entries.items()},
+            }
+
+
+llm_cache = LLMCache(settings.LLM_CACHE_MAX_ENTRIES, settings.LLM_CACHE_TTL)
+
+
+def make_cache_key(messages, model, **params):
+    """
+    Builds a cache key from the normalised messages, the model name and any
+    sampling parameters. Runs of whitespace are collapsed so formatting
+    differences in the same document or question still hit the cache.
+    """
+    normalised = [
+        {"role": message["role"], "content": " ".join(message["content"].split())}
+        for message in messages
+    ]
+    payload = json.dumps({"model": model, "messages": normalised, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def cached_completion(client, messages, model="deepseek-chat", use_cache=True, **params):
+    """
+    Runs a non-streaming chat completion through the response cache.
+
+    Args:
+        client (OpenAI): The client to call on a cache miss.
+        messages (list): The chat messages.
+        model (str): The model name.
+        use_cache (bool): Set to False to bypass the cache for this call.
+            The fresh reply still replaces any cached one.
+        **params: Extra arguments for `chat.completions.create`.
+
+    Returns:
+        str: The content of the model's reply.
+    """
+    use_cache = use_cache and settings.LLM_CACHE_ENABLED
+    key = make_cache_key(messages, model, **params)
+    if use_cache:
+        content = llm_cache.get(key)
+        if content is not None:
+            return content
+
+    with stage_timer("llm"):
+        response = client.chat.completions.create(model=model, messages=messages, stream=False, **params)
+    content = response.choices[0].message.content
+    if settings.LLM_CACHE_ENABLED:
+        llm_cache.set(key, content)
+    return content
+
+async def acached_completion(client, messages, model="deepseek-chat", use_cache=True, **params):
+    """
+    Async counterpart of cached_completion, for an AsyncOpenAI client.
+    """
+    use_cache = use_cache and settings.LLM_CACHE_ENABLED
+    key = make_cache_key(messages, model, **params)
+    if use_cache:
+        content = llm_cache.get(key)
+        if content is not None:
+            return content
+
+    with stage_timer("llm"):
+        response = await client.chat.completions.create(model=model, messages=messages, stream=False, **params)
+    content = response.choices[0].message.content
+    if settings.LLM_CACHE_ENABLED:
+        llm_cache.set(key, content)
+    return content
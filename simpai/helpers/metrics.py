@@ -0,0 +1,254 @@
+import contextvars
+import functools
+import inspect
+import os
+import time
+from asyncio import CancelledError
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.urls import Resolver404, get_resolver
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Worker processes write their metrics to files in this directory, which
+# must exist before the first metric is recorded
+if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+# Up to five minutes: long documents take that long to summarise
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+REQUEST_SECONDS = Histogram(
+    "simpai_request_duration_seconds", "Time until the view returns its response, by endpoint",
+    ["endpoint", "method", "status"], buckets=BUCKETS,
+)
+STAGE_SECONDS = Histogram(
+    "simpai_stage_duration_seconds", "Time spent in each pipeline stage, by endpoint",
+    ["endpoint", "stage"], buckets=BUCKETS,
+)
+ERRORS = Counter("simpai_errors", "Failed stages and 5xx responses, by endpoint", ["endpoint", "stage"])
+CACHE_LOOKUPS = Counter("simpai_cache_lookups", "Cache lookups, by cache and result", ["cache", "result"])
+EXTRACTED_BYTES = Counter("simpai_extracted_bytes", "Bytes of input read by each text extractor", ["extractor"])
+EXTRACTION_SECONDS = Counter("simpai_extraction_seconds", "Time spent by each text extractor", ["extractor"])
+
+# Work outside a request or job
+NO_ENDPOINT = "none"
+# Requests for URLs that match no view
+UNMATCHED = "unmatched"
+
+_endpoint = contextvars.ContextVar("metrics_endpoint", default=NO_ENDPOINT)
+
+
+def current_endpoint() -> str:
+    return _endpoint.get()
+
+@contextmanager
+def endpoint(name):
+    """Labels the metrics recorded inside the block with endpoint `name`."""
+    token = _endpoint.set(name)
+    try:
+        yield
+    finally:
+        _endpoint.reset(token)
+
+@contextmanager
+def stage_timer(stage):
+    """
+    Times the block as `stage` of the current endpoint. An exception
+    leaving the block is counted as an error of the stage; a cancelled
+    task or an abandoned generator is not.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except (GeneratorExit, CancelledError):
+        raise
+    except BaseException:
+        ERRORS.labels(current_endpoint(), stage).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(current_endpoint(), stage).observe(time.perf_counter() - start)
+
+def timed(stage):
+    """
+    Decorator timing every call of a function, coroutine function or
+    (async) generator function as `stage`. A generator is timed from its
+    first item to its last, including the time its consumer takes.
+    """
+    def decorator(function):
+        if inspect.isasyncgenfunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                with stage_timer(stage):
+                    async for item in function(*args, **kwargs):
+                        yield item
+        elif iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                with stage_timer(stage):
+                    return await function(*args, **kwargs)
+        elif inspect.isgeneratorfunction(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with stage_timer(stage):
+                    return (yield from function(*args, **kwargs))
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with stage_timer(stage):
+                    return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def timed_iter(stage, iterable):
+    """
+    Yields from `iterable`, timing only the time spent producing items
+    (not the consumer's) as `stage`, recorded once it is exhausted or
+    closed. For lazy stages such as chunking that are interleaved with
+    the work consuming them.
+    """
+    iterator = iter(iterable)
+    spent = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                spent += time.perf_counter() - start
+                return
+            except BaseException:
+                ERRORS.labels(current_endpoint(), stage).inc()
+                raise
+            spent += time.perf_counter() - start
+            yield item
+    finally:
+        STAGE_SECONDS.labels(current_endpoint(), stage).observe(spent)
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+async def atimed_iter(stage, iterable):
+    """Async counterpart of timed_iter, for async iterables."""
+    iterator = aiter(iterable)
+    spent = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = await anext(iterator)
+            except StopAsyncIteration:
+                spent += time.perf_counter() - start
+                return
+            except CancelledError:
+                raise
+            except BaseException:
+                ERRORS.labels(current_endpoint(), stage).inc()
+                raise
+            spent += time.perf_counter() - start
+            yield item
+    finally:
+        STAGE_SECONDS.labels(current_endpoint(), stage).observe(spent)
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+def count_cache(cache, hit):
+    """Counts a lookup in `cache` as a hit or a miss."""
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+def observe_extraction(name, file_path, size, seconds):
+    """
+    EXTRACTION_METRICS_HOOK that exports extractor throughput: bytes/s is
+    rate(simpai_extracted_bytes_total) / rate(simpai_extraction_seconds_total).
+    """
+    EXTRACTED_BYTES.labels(name).inc(size)
+    EXTRACTION_SECONDS.labels(name).inc(seconds)
+    STAGE_SECONDS.labels(current_endpoint(), "extraction").observe(seconds)
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper timing every query as stage "db"."""
+    with stage_timer("db"):
+        return execute(sql, params, many, context)
+
+def install_query_timer(sender, connection, **kwargs):
+    """connection_created receiver: time the queries of every new connection."""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+class MetricsMiddleware:
+    """
+    Times each request by endpoint (the URL name of its view), and labels
+    everything timed while handling it with that endpoint. Requests are
+    timed until the response object is returned: for a streaming response
+    that is before any of its body is produced, so the stages timed while
+    it streams (the model, speech synthesis) show where that time goes.
+
+    The URL is resolved here rather than in process_view, which Django
+    would run on the shared sync thread of an async request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        name = self._start(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self._observe(request, response, name, start)
+        return response
+
+    async def __acall__(self, request):
+        name = self._start(request)
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self._observe(request, response, name, start)
+        return response
+
+    def _start(self, request):
+        try:
+            match = get_resolver(getattr(request, "urlconf", None)).resolve(request.path_info)
+            name = match.view_name or match.route
+        except Resolver404:
+            name = UNMATCHED
+        # Not reset on the way out: a streaming response's body runs after
+        # this returns and must keep the label. Each ASGI request runs in a
+        # task of its own, and each WSGI request replaces its thread's label
+        _endpoint.set(name)
+        return name
+
+    def _observe(self, request, response, name, start):
+        REQUEST_SECONDS.labels(name, request.method, str(response.status_code)).observe(
+            time.perf_counter() - start
+        )
+        if response.status_code >= 500:
+            ERRORS.labels(name, "response").inc()
+
+
+def exposition() -> bytes:
+    """
+    Returns all metrics in the Prometheus text format. With
+    PROMETHEUS_MULTIPROC_DIR set, as under gunicorn, they are summed over
+    every process that has written there, not just this one.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
@@ -0,0 +1,232 @@
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Deltas are coalesced into one frame until this many seconds have passed
+# since the previous frame, or this many characters are waiting.
+FRAME_INTERVAL = 0.05
+FRAME_MAX_CHARS = 64
+
+# Text with no whitespace to end a frame on (CJK, long URLs, code) is sent
+# anyway once this many characters are waiting, or once it has waited this
+# many seconds.
+FRAME_HOLD_MAX_CHARS = 256
+FRAME_HOLD_MAX_SECONDS = 0.5
+
+# An SSE comment is sent when nothing else has been written for this long.
+# It keeps proxies from closing an idle stream and, because the write fails
+# once the client has gone, is how a disconnect gets noticed.
+HEARTBEAT_INTERVAL = 15.0
+HEARTBEAT = ": keep-alive\n\n"
+
+_DONE = object()
+
+
+class _UpstreamError:
+    def __init__(self, error):
+        self.error = error
+
+
+def sse_event(data: dict) -> str:
+    """Formats one server-sent event carrying a JSON payload."""
+    return f"data: {json.dumps(data)}\n\n"
+
+def _frame(text):
+    # Clients append `word` with a separating space, so frames end on a word
+    # boundary wherever there is one; `delta` carries the exact text for
+    # newer clients.
+    return sse_event({"word": text.strip(), "delta": text})
+
+def _split_at_word_boundary(buffer):
+    boundary = max(buffer.rfind(" "), buffer.rfind("\n"))
+    if boundary <= 0:
+        return "", buffer
+    return buffer[:boundary + 1], buffer[boundary + 1:]
+
+
+class _Framer:
+    """
+    Batches deltas into frames and decides when a heartbeat is due. Shared
+    by the sync and async streams so both pace output the same way.
+    """
+
+    def __init__(self, heartbeat_interval):
+        self.heartbeat_interval = heartbeat_interval
+        self.buffer = ""
+        # When the oldest text in the buffer arrived
+        self.held_since = 0.0
+        self.last_frame = 0.0
+        self.last_write = time.monotonic()
+
+    def timeout(self):
+        """Seconds to wait for the next delta before output is due anyway."""
+        now = time.monotonic()
+        wait = self.heartbeat_interval - (now - self.last_write)
+        # A buffer holding only part of a word is not sent until more text
+        # arrives or it has been held too long, so only then is it due
+        if _split_at_word_boundary(self.buffer)[0].strip():
+            wait = min(wait, FRAME_INTERVAL - (now - self.last_frame))
+        elif self.buffer.strip():
+            wait = min(wait, max(
+                FRAME_INTERVAL - (now - self.last_frame),
+                FRAME_HOLD_MAX_SECONDS - (now - self.held_since),
+            ))
+        return max(wait, 0.001)
+
+    def feed(self, delta):
+        """Adds a delta (None after a timeout) and returns the output due now, if any."""
+        now = time.monotonic()
+        if delta:
+            if not self.buffer:
+                self.held_since = now
+            self.buffer += delta
+        if self.buffer and (now - self.last_frame >= FRAME_INTERVAL or len(self.buffer) >= FRAME_MAX_CHARS):
+            text, rest = _split_at_word_boundary(self.buffer)
+            if not text.strip() and (
+                len(self.buffer) >= FRAME_HOLD_MAX_CHARS or now - self.held_since >= FRAME_HOLD_MAX_SECONDS
+            ):
+                text, rest = self.buffer, ""
+            if text.strip():
+                self.buffer = rest
+                self.held_since = now
+                self.last_frame = self.last_write = now
+                return _frame(text)
+        if now - self.last_write >= self.heartbeat_interval:
+            self.last_write = now
+            return HEARTBEAT
+        return None
+
+    def flush(self):
+        """Returns the frame for whatever is left once the upstream is done."""
+        return _frame(self.buffer) if self.buffer.strip() else None
+
+
+def _pump(deltas, pending, cancelled):
+    """Reads upstream deltas on a helper thread until done or cancelled."""
+    try:
+        for delta in deltas:
+            if cancelled.is_set():
+                break
+            pending.put(delta)
+    except Exception as e:
+        pending.put(_UpstreamError(e))
+    finally:
+        # Closing the generator closes the upstream HTTP response, so an
+        # abandoned answer stops being generated and billed.
+        close = getattr(deltas, "close", None)
+        if close is not None:
+            close()
+        pending.put(_DONE)
+
+def sse_text_stream(deltas, heartbeat_interval=HEARTBEAT_INTERVAL):
+    """
+    Turns a stream of text deltas into server-sent events.
+
+    The upstream is read on a helper thread so this generator can keep
+    writing while it waits: small deltas are batched into frames that end
+    on whitespace where there is any (text without it is sent once
+    FRAME_HOLD_MAX_CHARS characters or FRAME_HOLD_MAX_SECONDS have built
+    up, so it is not held to the end of the stream), and a heartbeat
+    comment is sent whenever the stream has been idle for
+    `heartbeat_interval` seconds.
+
+    When the client disconnects the server closes this generator, which
+    tells the helper thread to stop and close the upstream call. An
+    upstream failure is reported as a final `error` event.
+
+    Args:
+        deltas (iterable): Pieces of text, as yielded by stream_chat_completion.
+        heartbeat_interval (float): Seconds of silence before a heartbeat.
+
+    Yields:
+        str: Encoded SSE frames and heartbeats.
+    """
+    pending = queue.Queue()
+    cancelled = threading.Event()
+    threading.Thread(target=_pump, args=(iter(deltas), pending, cancelled), daemon=True).start()
+
+    framer = _Framer(heartbeat_interval)
+    try:
+        while True:
+            try:
+                item = pending.get(timeout=framer.timeout())
+            except queue.Empty:
+                item = None
+
+            if item is _DONE:
+                break
+            if isinstance(item, _UpstreamError):
+                logger.error(f"Error while streaming response: {str(item.error)}")
+                yield sse_event({"error": "The answer could not be completed."})
+                return
+            output = framer.feed(item)
+            if output:
+                yield output
+
+        tail = framer.flush()
+        if tail:
+            yield tail
+    finally:
+        cancelled.set()
+
+
+async def _apump(deltas, pending):
+    """Reads upstream deltas on a separate task until done or cancelled."""
+    try:
+        async for delta in deltas:
+            pending.put_nowait(delta)
+    except Exception as e:
+        pending.put_nowait(_UpstreamError(e))
+    finally:
+        aclose = getattr(deltas, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        pending.put_nowait(_DONE)
+
+async def asse_text_stream(deltas, heartbeat_interval=HEARTBEAT_INTERVAL):
+    """
+    Async counterpart of sse_text_stream, for async views served over ASGI.
+
+    The upstream is read on its own task instead of a thread. When the
+    client disconnects, the server cancels this generator, which cancels
+    that task and closes the upstream call.
+
+    Args:
+        deltas (async iterable): Pieces of text, as yielded by
+            astream_chat_completion.
+        heartbeat_interval (float): Seconds of silence before a heartbeat.
+
+    Yields:
+        str: Encoded SSE frames and heartbeats.
+    """
+    pending = asyncio.Queue()
+    reader = asyncio.create_task(_apump(deltas, pending))
+
+    framer = _Framer(heartbeat_interval)
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(pending.get(), timeout=framer.timeout())
+            except asyncio.TimeoutError:
+                item = None
+
+            if item is _DONE:
+                break
+            if isinstance(item, _UpstreamError):
+                logger.error(f"Error while streaming response: {str(item.error)}")
+                yield sse_event({"error": "The answer could not be completed."})
+                return
+            output = framer.feed(item)
+            if output:
+                yield output
+
+        tail = framer.flush()
+        if tail:
+            yield tail
+    finally:
+        reader.cancel()
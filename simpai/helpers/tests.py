@@ -1,3 +1,43 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from helpers import sse
+
+
+def _deltas(frames):
+    return [json.loads(frame[len("data: "):])["delta"] for frame in frames]
+
+
+class FramerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        clock = mock.patch.object(sse.time, "monotonic", lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.framer = sse._Framer(sse.HEARTBEAT_INTERVAL)
+
+    def test_frames_end_on_a_word_boundary(self):
+        self.assertEqual(_deltas([self.framer.feed("Hello wor")]), ["Hello "])
+        self.assertEqual(self.framer.buffer, "wor")
+
+    def test_long_text_without_whitespace_is_sent_at_the_size_cap(self):
+        text = "長" * sse.FRAME_HOLD_MAX_CHARS
+        self.assertEqual(_deltas([self.framer.feed(text)]), [text])
+        self.assertEqual(self.framer.buffer, "")
+
+    def test_text_without_whitespace_is_sent_after_the_time_limit(self):
+        self.assertIsNone(self.framer.feed("https://example.com/"))
+        self.assertAlmostEqual(self.framer.timeout(), sse.FRAME_HOLD_MAX_SECONDS)
+
+        self.now += sse.FRAME_HOLD_MAX_SECONDS
+        self.assertEqual(_deltas([self.framer.feed(None)]), ["https://example.com/"])
+
+    def test_no_text_is_dropped(self):
+        frames = []
+        for delta in ["  ", "x", "yz w", "中文", "b c"]:
+            self.now += sse.FRAME_HOLD_MAX_SECONDS
+            frames.append(self.framer.feed(delta))
+        frames.append(self.framer.flush())
+        self.assertEqual("".join(_deltas(filter(None, frames))), "  xyz w中文b c")
@@ -156,4 +156,23 @@ def contact_form(request):
     return Response(
         {"success": False, "error": "Invalid request method"},
         status=status.HTTP_405_METHOD_NOT_ALLOWED
-    )
\ No newline at end of file
+    )
+
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST
+from .metrics import exposition
+
+def metrics_view(request):
+    """
+    Serves the metrics of every worker process in the Prometheus text
+    format to scrapers sending METRICS_TOKEN as a bearer token. Without a
+    token configured the endpoint does not exist.
+    """
+    if not settings.METRICS_TOKEN:
+        raise Http404()
+    if not constant_time_compare(
+        request.headers.get('Authorization', ''), f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(exposition(), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'priority', 'progress', 'attempts', 'user', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+
+
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from jobs.models import Job, JobStatus
+from jobs.queue import enqueue
+from jobs.worker import run_workers
+
+
+class Command(BaseCommand):
+    help = 'Measure job throughput with increasing numbers of workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--jobs", default=40, type=int)
+        parser.add_argument("--seconds", default=0.25, type=float, help="Duration of each sleep job")
+        parser.add_argument("--workers", default="1,2,4,8", help="Comma-separated worker counts to try")
+
+    def handle(self, *args, **options):
+        # python manage.py bench_jobs --jobs 100 --seconds 0.5 --workers 1,4,16
+        counts = [int(count) for count in options["workers"].split(",")]
+        baseline = None
+        for count in counts:
+            ids = [
+                enqueue("sleep", {"seconds": options["seconds"], "bench": True}, priority=-100).pk
+                for _ in range(options["jobs"])
+            ]
+            start = time.perf_counter()
+            run_workers(count, kinds=["sleep"], burst=True, poll_interval=0.05)
+            elapsed = time.perf_counter() - start
+
+            done = Job.objects.filter(id__in=ids, status=JobStatus.SUCCEEDED).count()
+            Job.objects.filter(id__in=ids).delete()
+            throughput = done / elapsed
+            baseline = baseline or throughput
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{count} worker(s): {done}/{len(ids)} jobs in {elapsed:.2f} s, "
+                    f"{throughput:.1f} jobs/s ({throughput / baseline:.1f}x)"
+                )
+            )
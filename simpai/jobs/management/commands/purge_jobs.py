@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from jobs.queue import purge_jobs
+
+
+class Command(BaseCommand):
+    help = 'Delete the result files of finished jobs, and the jobs themselves, once they expire'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--result-ttl", default=None, type=int,
+                            help="Seconds after a job finishes before its result files are deleted "
+                                 "(default: JOBS_RESULT_TTL)")
+        parser.add_argument("--record-ttl", default=None, type=int,
+                            help="Seconds after a job finishes before it is deleted (default: JOBS_RECORD_TTL)")
+
+    def handle(self, *args, **options):
+        # python manage.py purge_jobs --result-ttl 3600
+        removed, deleted = purge_jobs(options["result_ttl"], options["record_ttl"])
+        self.stdout.write(self.style.SUCCESS(f"Purged {removed} job result(s) and {deleted} job(s)"))
@@ -0,0 +1,35 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.queue import registered_kinds
+from jobs.worker import run_workers
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers against the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", default=1, type=int, help="Number of worker processes")
+        parser.add_argument("--kinds", default=None, help="Comma-separated job kinds to run (default: all)")
+        parser.add_argument("--burst", action="store_true", help="Exit once no job is due")
+        parser.add_argument("--poll-interval", default=None, type=float)
+
+    def handle(self, *args, **options):
+        # python manage.py run_jobs --workers 4
+        # python manage.py run_jobs --kinds charts --burst
+        kinds = None
+        if options["kinds"]:
+            kinds = [kind.strip() for kind in options["kinds"].split(",") if kind.strip()]
+            unknown = set(kinds) - set(registered_kinds())
+            if unknown:
+                raise CommandError(f"Unknown job kinds: {', '.join(sorted(unknown))}")
+        if options["workers"] < 1:
+            raise CommandError("--workers must be at least 1")
+
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+        self.stdout.write(
+            f"Starting {options['workers']} worker(s) for: {', '.join(kinds or registered_kinds())}"
+        )
+        processed = run_workers(options["workers"], kinds, options["burst"], options["poll_interval"])
+        self.stdout.write(self.style.SUCCESS(f"Workers stopped after {processed} job(s)"))
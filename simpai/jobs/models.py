@@ -0,0 +1,84 @@
+import os
+import time
+
+from django.db import models
+from django.conf import settings
+from django.utils import timezone
+
+
+class JobStatus(models.TextChoices):
+    QUEUED = 'queued', 'Queued'
+    RUNNING = 'running', 'Running'
+    SUCCEEDED = 'succeeded', 'Succeeded'
+    FAILED = 'failed', 'Failed'
+
+
+class Job(models.Model):
+    """
+    A unit of background work, stored in the database and picked up by a
+    `run_jobs` worker. Higher `priority` runs first; within a priority,
+    jobs run in the order they became due.
+    """
+    # Progress is written at most this often, unless the job is finishing
+    PROGRESS_WRITE_INTERVAL = 1.0
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
+    kind = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict, blank=True)
+    priority = models.IntegerField(default=0)
+    status = models.CharField(max_length=20, choices=JobStatus.choices, default=JobStatus.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    progress = models.FloatField(default=0.0)
+    progress_message = models.CharField(max_length=255, blank=True, default="")
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    run_after = models.DateTimeField(default=timezone.now)
+    worker = models.CharField(max_length=100, blank=True, default="")
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_after'], name='jobs_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+    @property
+    def result_dir(self):
+        return os.path.join(settings.JOBS_RESULT_ROOT, str(self.pk))
+
+    def result_path(self, filename):
+        """Returns where a handler should write the result file `filename`."""
+        os.makedirs(self.result_dir, exist_ok=True)
+        return os.path.join(self.result_dir, filename)
+
+    def set_progress(self, progress, message=None):
+        """
+        Records how far the job has got, as a fraction between 0 and 1.
+
+        Called by job handlers as they work. Writes are throttled so a
+        handler can report after every small step; each write also renews
+        the worker's lease on the job, which `run_job` otherwise renews in
+        the background while the handler runs.
+        """
+        self.progress = max(0.0, min(1.0, progress))
+        if message is not None:
+            self.progress_message = message[:255]
+        now = time.monotonic()
+        if progress < 1.0 and now - getattr(self, '_progress_written', 0.0) < self.PROGRESS_WRITE_INTERVAL:
+            return
+        self._progress_written = now
+        Job.objects.filter(pk=self.pk, worker=self.worker).update(
+            progress=self.progress,
+            progress_message=self.progress_message,
+            heartbeat_at=timezone.now(),
+        )
@@ -0,0 +1,248 @@
+import logging
+import os
+import shutil
+import socket
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+# Result directories looked up per query when purging, within SQLite's
+# limit on query parameters
+PURGE_BATCH_SIZE = 500
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying the job cannot help."""
+
+
+def register(kind):
+    """
+    Registers the decorated function as the handler of a job kind.
+
+    Handlers live in each app's `tasks` module, which the jobs app imports
+    on startup. A handler receives the Job, may call `job.set_progress()`
+    as it goes, and returns a JSON-serialisable result.
+    """
+    def decorator(func):
+        _handlers[kind] = func
+        return func
+    return decorator
+
+def get_handler(kind):
+    return _handlers.get(kind)
+
+def registered_kinds():
+    return sorted(_handlers)
+
+def enqueue(kind, payload=None, user=None, priority=0, max_attempts=None):
+    """
+    Adds a job to the queue.
+
+    Args:
+        kind (str): The registered job kind.
+        payload (dict): Arguments for the handler; must be JSON-serialisable.
+        user (User): The user the job belongs to, if any.
+        priority (int): Higher priorities are picked up first.
+        max_attempts (int): Runs allowed before the job fails. Defaults to
+            JOBS_MAX_ATTEMPTS.
+
+    Returns:
+        Job: The queued job.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+    return Job.objects.create(
+        kind=kind,
+        payload=payload or {},
+        user=user,
+        priority=priority,
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+    )
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _mark_running(job_id, worker, now):
+    return Job.objects.filter(id=job_id, status=JobStatus.QUEUED).update(
+        status=JobStatus.RUNNING,
+        attempts=F('attempts') + 1,
+        worker=worker,
+        started_at=now,
+        heartbeat_at=now,
+    ) == 1
+
+def claim_next(worker, kinds=None):
+    """
+    Marks the most urgent due job as running for `worker` and returns it,
+    or returns None when nothing is due.
+
+    Where the database supports it (PostgreSQL) the candidate row is
+    locked with SKIP LOCKED so concurrent workers pick different jobs.
+    Either way the claim is a conditional UPDATE on the queued status, so
+    two workers can never both win the same job; the loser moves on to the
+    next candidate.
+    """
+    now = timezone.now()
+    due = Job.objects.filter(status=JobStatus.QUEUED, run_after__lte=now)
+    if kinds:
+        due = due.filter(kind__in=kinds)
+    due = due.order_by('-priority', 'run_after', 'id')
+
+    while True:
+        if connection.features.has_select_for_update_skip_locked:
+            with transaction.atomic():
+                job_id = due.select_for_update(skip_locked=True).values_list('id', flat=True).first()
+                claimed = job_id is not None and _mark_running(job_id, worker, now)
+        else:
+            # Without row locks (SQLite) the conditional UPDATE alone decides;
+            # a read-then-write transaction would only add lock upgrade errors.
+            job_id = due.values_list('id', flat=True).first()
+            claimed = job_id is not None and _mark_running(job_id, worker, now)
+        if job_id is None:
+            return None
+        if claimed:
+            return Job.objects.get(id=job_id)
+        # Another worker won this job; try the next one
+
+def _claimed(job):
+    """The job's row, as long as its worker still holds the lease."""
+    return Job.objects.filter(pk=job.pk, status=JobStatus.RUNNING, worker=job.worker)
+
+@contextmanager
+def _lease(job):
+    """
+    Renews the worker's lease on `job` from a background thread while the
+    block runs, so a handler that goes a long time without reporting
+    progress is not mistaken for a dead worker and requeued.
+    """
+    stop = threading.Event()
+
+    def heartbeat():
+        try:
+            while not stop.wait(settings.JOBS_LEASE_TIMEOUT / 3):
+                try:
+                    renewed = _claimed(job).update(heartbeat_at=timezone.now())
+                except OperationalError as e:
+                    # e.g. SQLite busy with the handler's own writes; the
+                    # next beat comes well within the lease
+                    logger.warning(f"Could not renew the lease on job {job.pk}: {str(e)}")
+                    continue
+                if not renewed:
+                    logger.warning(f"Job {job.pk} ({job.kind}) lost its lease")
+                    return
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=heartbeat, name=f"job-{job.pk}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+def run_job(job):
+    """
+    Runs a claimed job through its handler and records the outcome.
+
+    A failed job is requeued with exponential backoff until it has used
+    up `max_attempts`, unless the handler raised PermanentJobError. The
+    outcome is only recorded while the worker still holds the job: one
+    that was requeued as stale meanwhile belongs to whoever claimed it.
+    """
+    handler = get_handler(job.kind)
+    try:
+        if handler is None:
+            raise PermanentJobError(f"No handler registered for job kind '{job.kind}'")
+        with _lease(job):
+            result = handler(job)
+    except Exception as e:
+        logger.exception(f"Job {job.pk} ({job.kind}) failed on attempt {job.attempts}")
+        retry = not isinstance(e, PermanentJobError) and job.attempts < job.max_attempts
+        fields = {"error": str(e), "worker": "", "heartbeat_at": None}
+        if retry:
+            delay = settings.JOBS_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            fields.update(status=JobStatus.QUEUED, run_after=timezone.now() + timedelta(seconds=delay))
+        else:
+            fields.update(status=JobStatus.FAILED, finished_at=timezone.now())
+        if not _claimed(job).update(**fields):
+            logger.warning(f"Job {job.pk} ({job.kind}) lost its lease; its failure is not recorded")
+        return False
+
+    recorded = _claimed(job).update(
+        status=JobStatus.SUCCEEDED,
+        result=result,
+        error="",
+        progress=1.0,
+        progress_message="",
+        finished_at=timezone.now(),
+        heartbeat_at=None,
+    )
+    if not recorded:
+        logger.warning(f"Job {job.pk} ({job.kind}) lost its lease; its result is not recorded")
+        return False
+    return True
+
+def requeue_stale(lease_timeout=None):
+    """
+    Requeues running jobs whose worker stopped reporting, e.g. because the
+    process was killed. Returns the number of jobs requeued.
+    """
+    if lease_timeout is None:
+        lease_timeout = settings.JOBS_LEASE_TIMEOUT
+    cutoff = timezone.now() - timedelta(seconds=lease_timeout)
+    return Job.objects.filter(status=JobStatus.RUNNING, heartbeat_at__lt=cutoff).update(
+        status=JobStatus.QUEUED,
+        worker="",
+        heartbeat_at=None,
+        run_after=timezone.now(),
+    )
+
+def purge_jobs(result_ttl=None, record_ttl=None):
+    """
+    Removes the result files of jobs that finished more than `result_ttl`
+    seconds ago, and deletes the jobs that finished more than `record_ttl`
+    seconds ago. Result directories of jobs that no longer exist are
+    removed too.
+
+    Args:
+        result_ttl (int): Defaults to JOBS_RESULT_TTL.
+        record_ttl (int): Defaults to JOBS_RECORD_TTL.
+
+    Returns:
+        tuple: (result directories removed, jobs deleted).
+    """
+    if result_ttl is None:
+        result_ttl = settings.JOBS_RESULT_TTL
+    if record_ttl is None:
+        record_ttl = settings.JOBS_RECORD_TTL
+    now = timezone.now()
+    finished = Q(status__in=(JobStatus.SUCCEEDED, JobStatus.FAILED))
+
+    deleted, _ = Job.objects.filter(finished, finished_at__lt=now - timedelta(seconds=record_ttl)).delete()
+
+    try:
+        job_ids = sorted(int(name) for name in os.listdir(settings.JOBS_RESULT_ROOT) if name.isdigit())
+    except FileNotFoundError:
+        job_ids = []
+    expired = finished & Q(finished_at__lt=now - timedelta(seconds=result_ttl))
+    removed = 0
+    for start in range(0, len(job_ids), PURGE_BATCH_SIZE):
+        batch = job_ids[start:start + PURGE_BATCH_SIZE]
+        keep = set(Job.objects.filter(id__in=batch).exclude(expired).values_list('id', flat=True))
+        for job_id in batch:
+            if job_id not in keep:
+                shutil.rmtree(os.path.join(settings.JOBS_RESULT_ROOT, str(job_id)), ignore_errors=True)
+                removed += 1
+    return removed, deleted
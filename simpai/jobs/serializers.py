@@ -0,0 +1,20 @@
+from django.urls import reverse
+from rest_framework import serializers
+from jobs.models import Job, JobStatus
+
+class JobSerializer(serializers.ModelSerializer):
+    job_id = serializers.IntegerField(source='id', read_only=True)
+    message = serializers.CharField(source='progress_message', read_only=True)
+    result_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = [
+            'job_id', 'kind', 'status', 'priority', 'progress', 'message', 'attempts',
+            'max_attempts', 'error', 'created_at', 'started_at', 'finished_at', 'result_url',
+        ]
+
+    def get_result_url(self, job):
+        if job.status != JobStatus.SUCCEEDED:
+            return None
+        return reverse('job-result', args=[job.pk])
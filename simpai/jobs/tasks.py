@@ -0,0 +1,16 @@
+import time
+
+from .queue import register
+
+
+@register("sleep")
+def sleep(job):
+    """
+    Sleeps for `payload["seconds"]`, reporting progress every tenth of the
+    way. Used by `bench_jobs` and to check that workers are running.
+    """
+    seconds = float(job.payload.get("seconds", 0))
+    for step in range(1, 11):
+        time.sleep(seconds / 10)
+        job.set_progress(step / 10)
+    return {"slept": seconds}
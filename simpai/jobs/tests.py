@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .models import Job, JobStatus
+from .views import JobResultView
+
+
+class PurgeJobsTests(TestCase):
+    def setUp(self):
+        self.result_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.result_root, ignore_errors=True)
+        settings = override_settings(JOBS_RESULT_ROOT=self.result_root, JOBS_RESULT_TTL=3600, JOBS_RECORD_TTL=86400)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = get_user_model().objects.create_user(username="purge", email="purge@example.com")
+
+    def make_job(self, status, finished_ago=None):
+        job = Job.objects.create(
+            kind="summarize",
+            user=self.user,
+            status=status,
+            result={"file": "summary.pdf", "filename": "summary.pdf", "content_type": "application/pdf"},
+            finished_at=timezone.now() - finished_ago if finished_ago is not None else None,
+        )
+        with open(job.result_path("summary.pdf"), 'wb') as file:
+            file.write(b"%PDF-")
+        return job
+
+    def result(self, job):
+        request = APIRequestFactory().get(f"/jobs/{job.pk}/result/")
+        force_authenticate(request, self.user)
+        return JobResultView.as_view()(request, job_id=job.pk)
+
+    def test_purge_expires_results_then_jobs(self):
+        recent = self.make_job(JobStatus.SUCCEEDED, timedelta(minutes=5))
+        expired = self.make_job(JobStatus.SUCCEEDED, timedelta(hours=2))
+        old = self.make_job(JobStatus.FAILED, timedelta(days=2))
+        running = self.make_job(JobStatus.RUNNING)
+        orphan = os.path.join(self.result_root, "999999")
+        os.makedirs(orphan)
+
+        out = StringIO()
+        call_command("purge_jobs", stdout=out)
+        self.assertIn("Purged 3 job result(s) and 1 job(s)", out.getvalue())
+
+        self.assertTrue(os.path.isdir(recent.result_dir))
+        self.assertTrue(os.path.isdir(running.result_dir))
+        self.assertFalse(os.path.exists(expired.result_dir))
+        self.assertFalse(os.path.exists(old.result_dir))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertFalse(Job.objects.filter(pk=old.pk).exists())
+
+        self.assertEqual(self.result(recent).status_code, 200)
+        self.assertEqual(self.result(expired).status_code, 410)
+        self.assertEqual(self.result(old).status_code, 404)
+
+    def test_ttls_can_be_given_on_the_command_line(self):
+        job = self.make_job(JobStatus.SUCCEEDED, timedelta(minutes=5))
+        call_command("purge_jobs", "--result-ttl", "60", "--record-ttl", "3600", stdout=StringIO())
+        self.assertFalse(os.path.exists(job.result_dir))
+        self.assertTrue(Job.objects.filter(pk=job.pk).exists())
@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path("<int:job_id>/", views.JobStatusView.as_view(), name="job-status"),
+    path("<int:job_id>/result/", views.JobResultView.as_view(), name="job-result"),
+]
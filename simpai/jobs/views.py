@@ -0,0 +1,98 @@
+import os
+
+from django.http import FileResponse
+from rest_framework import status
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import Job, JobStatus
+from .queue import enqueue
+from .serializers import JobSerializer
+
+
+class JobSubmitView(APIView):
+    """
+    Base view for endpoints that queue a background job and return its id
+    straight away (202), instead of doing the work inside the request.
+
+    Subclasses set the job `kind`, its `priority`, the model whose
+    `file_id` the job works on and the optional request fields to pass on.
+    """
+    parser_classes = [JSONParser]
+    permission_classes = [IsAuthenticated]
+
+    kind = None
+    priority = 0
+    file_model = None
+    # Whether the file must belong to the requesting user
+    check_owner = True
+    payload_fields = ()
+
+    def validate(self, request):
+        """Returns an error message for invalid request data, or None."""
+        return None
+
+    def post(self, request, *args, **kwargs):
+        file_id = request.data.get("file_id")
+        if not file_id:
+            return Response({"error": "file_id is required."}, status=400)
+
+        error = self.validate(request)
+        if error:
+            return Response({"error": error}, status=400)
+
+        files = self.file_model.objects.filter(id=file_id)
+        if self.check_owner:
+            files = files.filter(user=request.user)
+        if not files.exists():
+            return Response({"error": "File not found or access denied."}, status=404)
+
+        payload = {"file_id": file_id}
+        for field in self.payload_fields:
+            if field in request.data:
+                payload[field] = request.data[field]
+
+        job = enqueue(self.kind, payload, user=request.user, priority=self.priority)
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class JobStatusView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id, *args, **kwargs):
+        try:
+            job = Job.objects.get(id=job_id, user=request.user)
+        except Job.DoesNotExist:
+            return Response({"error": "Job not found."}, status=404)
+        return Response(JobSerializer(job).data)
+
+
+class JobResultView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id, *args, **kwargs):
+        try:
+            job = Job.objects.get(id=job_id, user=request.user)
+        except Job.DoesNotExist:
+            return Response({"error": "Job not found."}, status=404)
+
+        if job.status == JobStatus.FAILED:
+            return Response({"error": job.error or "The job failed."}, status=500)
+        if job.status != JobStatus.SUCCEEDED:
+            return Response(JobSerializer(job).data, status=status.HTTP_409_CONFLICT)
+
+        result = job.result or {}
+        if "file" not in result:
+            return Response(result)
+
+        path = os.path.join(job.result_dir, os.path.basename(result["file"]))
+        if not os.path.exists(path):
+            return Response({"error": "The result has expired."}, status=410)
+        return FileResponse(
+            open(path, 'rb'),
+            as_attachment=True,
+            filename=result.get("filename", result["file"]),
+            content_type=result.get("content_type"),
+        )
@@ -0,0 +1,118 @@
+import logging
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, connections
+
+from helpers.metrics import endpoint
+
+from .queue import claim_next, purge_jobs, requeue_stale, run_job, worker_name
+
+logger = logging.getLogger(__name__)
+
+# How often an idle worker also looks for jobs abandoned by dead workers
+STALE_CHECK_INTERVAL = 60.0
+# How often a worker removes expired results and jobs (see purge_jobs)
+PURGE_INTERVAL = 60 * 60.0
+
+
+def work(kinds=None, burst=False, poll_interval=None, stop=None):
+    """
+    Runs jobs one after another until stopped.
+
+    Args:
+        kinds (list): Only run jobs of these kinds. Defaults to all.
+        burst (bool): Return as soon as no job is due instead of polling.
+        poll_interval (float): Seconds to sleep when the queue is empty.
+            Defaults to JOBS_POLL_INTERVAL.
+        stop (multiprocessing.Event): Set to ask the worker to exit after
+            its current job.
+
+    Returns:
+        int: The number of jobs run.
+    """
+    if poll_interval is None:
+        poll_interval = settings.JOBS_POLL_INTERVAL
+    name = worker_name()
+    processed = 0
+    last_stale_check = 0.0
+    last_purge = 0.0
+
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        try:
+            if time.monotonic() - last_stale_check >= STALE_CHECK_INTERVAL:
+                last_stale_check = time.monotonic()
+                requeued = requeue_stale()
+                if requeued:
+                    logger.warning(f"Requeued {requeued} stale job(s)")
+            if time.monotonic() - last_purge >= PURGE_INTERVAL:
+                last_purge = time.monotonic()
+                removed, deleted = purge_jobs()
+                if removed or deleted:
+                    logger.info(f"Purged {removed} job result(s) and {deleted} job(s)")
+            job = claim_next(name, kinds)
+        except OperationalError as e:
+            # e.g. SQLite reporting the database as locked under contention;
+            # back off briefly rather than treating the queue as empty
+            logger.warning(f"Could not claim a job: {str(e)}")
+            time.sleep(0.1)
+            continue
+
+        if job is None:
+            if burst:
+                break
+            if stop is not None:
+                stop.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+            continue
+
+        logger.info(f"{name} running job {job.pk} ({job.kind})")
+        with endpoint(f"job:{job.kind}"):
+            run_job(job)
+        processed += 1
+
+    return processed
+
+def _work_in_child(kinds, burst, poll_interval, stop, counter):
+    # The parent handles Ctrl-C and SIGTERM and tells children through `stop`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    processed = work(kinds, burst, poll_interval, stop)
+    with counter.get_lock():
+        counter.value += processed
+
+def run_workers(count, kinds=None, burst=False, poll_interval=None):
+    """
+    Runs `count` worker processes and waits for them to exit.
+
+    SIGINT or SIGTERM ask every worker to stop after its current job.
+
+    Returns:
+        int: The number of jobs run by all workers.
+    """
+    context = multiprocessing.get_context('fork')
+    stop = context.Event()
+    previous = {sig: signal.signal(sig, lambda *args: stop.set()) for sig in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        if count == 1:
+            return work(kinds, burst, poll_interval, stop)
+
+        # Children must not inherit the parent's database connections
+        connections.close_all()
+        counter = context.Value('i', 0)
+        processes = [
+            context.Process(target=_work_in_child, args=(kinds, burst, poll_interval, stop, counter))
+            for _ in range(count)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        return counter.value
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
@@ -14,6 +14,7 @@ PASSWORD_RESET_TIMEOUT = 604800
 
 
 DEEPSEEK_API_KEY = config('DEEPSEEK_API_KEY')
+DEEPSEEK_BASE_URL = config('DEEPSEEK_BASE_URL', default="https://api.deepseek.com")
 DATABASE_URL = config('DATABASE_URL', default=None)
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -27,9 +28,103 @@ EMAIL_USE_SSL = config("EMAIL_USE_SSL", cast=bool, default=False)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 TEMP_DIR = os.path.join(MEDIA_ROOT, 'temp')
+TEXTSTORE_ROOT = os.path.join(MEDIA_ROOT, 'textstore')
+ARTIFACTS_ROOT = os.path.join(MEDIA_ROOT, 'artifacts')
+UPLOADS_PARTIAL_ROOT = os.path.join(MEDIA_ROOT, 'partial')
 
 DATA_UPLOAD_MAX_MEMORY_SIZE = 20 * 1024 * 1024  # 20MB
 FILE_UPLOAD_MAX_MEMORY_SIZE = 20 * 1024 * 1024  # 20MB
+# Chunked uploads (api/uploads/): files of any size arrive in chunks of
+# UPLOAD_CHUNK_SIZE, so no request holds more than one chunk
+UPLOAD_CHUNK_SIZE = config("UPLOAD_CHUNK_SIZE", cast=int, default=4 * 1024 * 1024)
+UPLOAD_MAX_SIZE = config("UPLOAD_MAX_SIZE", cast=int, default=1024 * 1024 * 1024)
+# Unfinished uploads are removed by `manage.py purge_uploads` after this long
+UPLOAD_SESSION_TTL = config("UPLOAD_SESSION_TTL", cast=int, default=24 * 60 * 60)
+# Uploads are hashed as they stream in, so identical files are stored once
+FILE_UPLOAD_HANDLERS = [
+    'blobs.uploadhandler.HashingMemoryFileUploadHandler',
+    'blobs.uploadhandler.HashingTemporaryFileUploadHandler',
+]
+
+# Engine that reads the text layer of PDFs: "pdftotext" (poppler),
+# "pypdf2", or "auto" for pdftotext when it is installed
+PDF_TEXT_ENGINE = config("PDF_TEXT_ENGINE", default="auto")
+# PyPDF2 extraction is spread over a process pool for large documents
+PDF_EXTRACT_WORKERS = config("PDF_EXTRACT_WORKERS", cast=int, default=min(4, os.cpu_count() or 1))
+PDF_EXTRACT_PARALLEL_MIN_PAGES = config("PDF_EXTRACT_PARALLEL_MIN_PAGES", cast=int, default=64)
+
+# Called with (extractor name, file path, bytes, seconds) after each text
+# extraction
+EXTRACTION_METRICS_HOOK = config("EXTRACTION_METRICS_HOOK", default="helpers.metrics.observe_extraction")
+
+# PDF pages with fewer than OCR_MIN_TEXT_CHARS characters of text are
+# treated as scans and read with Tesseract, OCR_WORKERS pages at a time
+OCR_ENABLED = config("OCR_ENABLED", cast=bool, default=True)
+OCR_DPI = config("OCR_DPI", cast=int, default=300)
+OCR_LANG = config("OCR_LANG", default="eng")
+OCR_MIN_TEXT_CHARS = config("OCR_MIN_TEXT_CHARS", cast=int, default=10)
+OCR_WORKERS = config("OCR_WORKERS", cast=int, default=min(4, os.cpu_count() or 1))
+OCR_CACHE_ROOT = os.path.join(MEDIA_ROOT, 'ocr')
+
+# Generated summary PDFs and audio are kept for reuse up to this many bytes
+ARTIFACTS_MAX_BYTES = config("ARTIFACTS_MAX_BYTES", cast=int, default=512 * 1024 * 1024)
+# Each process checks that limit after storing an artifact at most this often
+ARTIFACTS_EVICT_INTERVAL = config("ARTIFACTS_EVICT_INTERVAL", cast=float, default=60.0)
+
+# Text-to-speech: documents are read out in segments of whole sentences,
+# synthesised concurrently by TTS_BACKEND and streamed in order
+TTS_BACKEND = config("TTS_BACKEND", default="summarisation.tts.GTTSBackend")
+TTS_SEGMENT_CHARS = config("TTS_SEGMENT_CHARS", cast=int, default=400)
+TTS_MAX_CONCURRENCY = config("TTS_MAX_CONCURRENCY", cast=int, default=4)
+
+# Bearer token Prometheus must send to scrape /metrics, which is not
+# served (404) until it is set.
+# Under gunicorn, set the PROMETHEUS_MULTIPROC_DIR environment variable so
+# /metrics sums every worker's metrics (see gunicorn.conf.py)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
+# Maximum number of chunk summaries requested from DeepSeek at once
+SUMMARY_MAX_CONCURRENCY = config("SUMMARY_MAX_CONCURRENCY", cast=int, default=8)
+# Files accepted by one batch summary request; their API calls share
+# SUMMARY_MAX_CONCURRENCY
+SUMMARY_BATCH_MAX_FILES = config("SUMMARY_BATCH_MAX_FILES", cast=int, default=20)
+
+# Document Q&A sends only the best-matching passages of long documents
+RETRIEVAL_TOP_K = config("RETRIEVAL_TOP_K", cast=int, default=8)
+RETRIEVAL_PASSAGE_TOKENS = config("RETRIEVAL_PASSAGE_TOKENS", cast=int, default=300)
+RETRIEVAL_PASSAGE_OVERLAP = config("RETRIEVAL_PASSAGE_OVERLAP", cast=int, default=50)
+RETRIEVAL_FULL_TEXT_TOKENS = config("RETRIEVAL_FULL_TEXT_TOKENS", cast=int, default=6000)
+RETRIEVAL_DENSE = config("RETRIEVAL_DENSE", cast=bool, default=True)
+
+# Document chat keeps the last CHAT_RECENT_MESSAGES messages verbatim and
+# folds older ones into a rolling summary of about CHAT_SUMMARY_TOKENS
+CHAT_RECENT_MESSAGES = config("CHAT_RECENT_MESSAGES", cast=int, default=6)
+CHAT_COMPACT_BATCH = config("CHAT_COMPACT_BATCH", cast=int, default=4)
+CHAT_SUMMARY_TOKENS = config("CHAT_SUMMARY_TOKENS", cast=int, default=400)
+
+# In-process LRU cache of DeepSeek replies, keyed by model and normalised messages
+LLM_CACHE_ENABLED = config("LLM_CACHE_ENABLED", cast=bool, default=True)
+LLM_CACHE_MAX_ENTRIES = config("LLM_CACHE_MAX_ENTRIES", cast=int, default=1024)
+LLM_CACHE_TTL = config("LLM_CACHE_TTL", cast=int, default=6 * 60 * 60)
+
+# Connection pool of the shared DeepSeek client (one per worker process)
+LLM_MAX_CONNECTIONS = config("LLM_MAX_CONNECTIONS", cast=int, default=32)
+LLM_MAX_KEEPALIVE_CONNECTIONS = config("LLM_MAX_KEEPALIVE_CONNECTIONS", cast=int, default=16)
+LLM_KEEPALIVE_EXPIRY = config("LLM_KEEPALIVE_EXPIRY", cast=float, default=90.0)
+LLM_TIMEOUT = config("LLM_TIMEOUT", cast=float, default=300.0)
+
+# Background jobs (see the jobs app and `manage.py run_jobs`)
+JOBS_RESULT_ROOT = os.path.join(MEDIA_ROOT, 'jobs')
+JOBS_POLL_INTERVAL = config("JOBS_POLL_INTERVAL", cast=float, default=1.0)
+JOBS_MAX_ATTEMPTS = config("JOBS_MAX_ATTEMPTS", cast=int, default=3)
+JOBS_RETRY_BACKOFF = config("JOBS_RETRY_BACKOFF", cast=float, default=10.0)
+# A running job whose worker has not reported in this long is requeued
+JOBS_LEASE_TIMEOUT = config("JOBS_LEASE_TIMEOUT", cast=float, default=900.0)
+# Result files of finished jobs are removed this long after they finish, and
+# the jobs themselves after JOBS_RECORD_TTL, by `manage.py purge_jobs` and by
+# the workers now and then. A removed result answers 410 until then.
+JOBS_RESULT_TTL = config("JOBS_RESULT_TTL", cast=int, default=24 * 60 * 60)
+JOBS_RECORD_TTL = config("JOBS_RECORD_TTL", cast=int, default=7 * 24 * 60 * 60)
 
 SECRET_KEY = 'django-insecure-klh^+(_78yw90o5rw%t_hkh7v%$#roox3dz)&3zqnmq2syc7w)'
 
@@ -70,6 +165,8 @@ INSTALLED_APPS = [
     'helpers',
     'customers',
     'subscriptions',
+    'jobs',
+    'blobs',
 ]
 
 REST_FRAMEWORK = {
@@ -114,6 +211,8 @@ CORS_ALLOW_CREDENTIALS = True
 
 
 MIDDLEWARE = [
+    # First, so it times everything below it
+    'helpers.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -3,8 +3,8 @@ from django.urls import path, include
 from django.conf import settings
 # from django.conf.urls.static import static
 from django.views.generic import TemplateView
-from summarisation.views import FileUploadView, AskQuestionsView as pdprompt, SummarizeView, GPTChatView
-from spreadsheet.views import SpreadsheetUploadView, AnalyzeDataView, GenerateChartView
+from summarisation.views import FileUploadView, AskQuestionsView as pdprompt, SummarizeView, BatchSummarizeView, GPTChatView, ChatHistoryView, SummarizeJobView, AudioJobView
+from spreadsheet.views import SpreadsheetUploadView, AnalyzeDataView, GenerateChartView, ChartJobView
 from gpt.views import AskGPTView
 from . import views
 from auth.views import login_view, register_view
@@ -23,7 +23,7 @@ from profiles.views import request_password_reset, verify_reset_token, reset_pas
 from spreadsheet.views import AskQuestionView
 from customers.views import UserProfileView
 from subscriptions.views import check_subscription_status
-from helpers.views import paystack_webhook, contact_form as contact_view
+from helpers.views import paystack_webhook, contact_form as contact_view, metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -73,17 +73,27 @@ urlpatterns = [
     path('csv/upload/', SpreadsheetUploadView.as_view(), name='upload_spreadsheet'),
     path('csv/analyze/', AnalyzeDataView.as_view(), name='analyze_data'),
     path('csv/chart/', GenerateChartView.as_view(), name='generate_chart'),
+    path('csv/chart/jobs/', ChartJobView.as_view(), name='generate_chart_job'),
     path('csv/', views.spreadsheet_view, name='spreadsheet'),
     path('csv/ask/', AskQuestionView.as_view(), name='ask-question'),
 
     path('gpt/ask/', AskGPTView.as_view(), name='ask_gpt'),
     path('gpt-chat/', GPTChatView.as_view(), name="gpt-chat"),
+    path('gpt-chat/history/', ChatHistoryView.as_view(), name="gpt-chat-history"),
     
     #path('summarisation/', views.index, name='index'),
     #path('summarisation/pdf_features/', TemplateView.as_view(template_name='pdf_features.html'), name='pdf-features'),
     path('summarisation/ask/', pdprompt.as_view(), name='ask-question'),
     path('summarisation/upload/', FileUploadView.as_view(), name='file-upload'),
     path('summarisation/summarize/', SummarizeView.as_view(), name='summarize'),
+    path('summarisation/summarize/batch/', BatchSummarizeView.as_view(), name='summarize-batch'),
+    path('summarisation/summarize/jobs/', SummarizeJobView.as_view(), name='summarize-job'),
+    path('summarisation/audio/jobs/', AudioJobView.as_view(), name='audio-job'),
+
+    path('api/jobs/', include('jobs.urls')),
+    path('api/uploads/', include('blobs.urls')),
+
+    path('metrics', metrics_view, name='metrics'),
     ] 
 # + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
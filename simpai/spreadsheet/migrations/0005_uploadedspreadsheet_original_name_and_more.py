@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:12
+
+import blobs.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spreadsheet', '0004_alter_uploadedspreadsheet_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedspreadsheet',
+            name='original_name',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='uploadedspreadsheet',
+            name='file',
+            field=models.FileField(storage=blobs.storage.get_blob_storage, upload_to='spreadsheets/'),
+        ),
+    ]
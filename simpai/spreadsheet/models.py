@@ -1,9 +1,31 @@
-from django.db import models
+import os
+
+from django.db import models, transaction
 from django.conf import settings
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from blobs.storage import get_blob_storage
+
 
 class UploadedSpreadsheet(models.Model):
-    file = models.FileField(upload_to='spreadsheets/')
+    # Stored once per distinct content; see blobs.storage.BlobStorage
+    file = models.FileField(upload_to='spreadsheets/', storage=get_blob_storage)
+    original_name = models.CharField(max_length=255, blank=True, default='')
     uploaded_at = models.DateTimeField(auto_now_add=True)
     user=models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
     def __str__(self):
-        return self.file.name
+        return self.original_name or self.file.name
+
+    def save(self, *args, **kwargs):
+        # Keep the name the file was uploaded under; the stored one is its hash
+        if self.file and not self.file._committed and not self.original_name:
+            self.original_name = os.path.basename(self.file.name)[:255]
+        super().save(*args, **kwargs)
+
+
+@receiver(post_delete, sender=UploadedSpreadsheet)
+def release_spreadsheet_blob(sender, instance, **kwargs):
+    # Other uploads may share the file; the storage counts references
+    if instance.file:
+        transaction.on_commit(lambda: instance.file.delete(save=False))
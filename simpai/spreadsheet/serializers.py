@@ -5,4 +5,5 @@ from .models import UploadedSpreadsheet
 class UploadedSpreadsheetSerializer(serializers.ModelSerializer):
     class Meta:
         model = UploadedSpreadsheet
-        fields = ['id', 'file', 'uploaded_at']
\ No newline at end of file
+        fields = ['id', 'file', 'original_name', 'uploaded_at']
+        read_only_fields = ['original_name']
\ No newline at end of file
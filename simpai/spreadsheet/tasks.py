@@ -0,0 +1,27 @@
+from jobs.queue import PermanentJobError, register
+
+from .models import UploadedSpreadsheet
+from .utils import render_charts
+
+
+@register("charts")
+def generate_charts(job):
+    """
+    Renders charts for an uploaded spreadsheet.
+
+    Payload:
+        file_id (int): The UploadedSpreadsheet to chart.
+        sample_size (int): Rows sampled for the charts. Defaults to 1000.
+    """
+    try:
+        spreadsheet = UploadedSpreadsheet.objects.get(id=job.payload["file_id"])
+        job.set_progress(0.0, "Rendering charts")
+        charts = render_charts(spreadsheet.file.path, sample_size=int(job.payload.get("sample_size", 1000)))
+    except UploadedSpreadsheet.DoesNotExist:
+        raise PermanentJobError("File not found or access denied.")
+    except ValueError as e:
+        raise PermanentJobError(str(e))
+
+    if not charts:
+        raise PermanentJobError("No suitable chart found for the dataset.")
+    return {"charts": charts}
@@ -1,6 +1,6 @@
 # utils.py
+import asyncio
 import pandas as pd
-from openai import OpenAI
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
@@ -12,11 +12,14 @@ import os
 from django.conf import settings
 import seaborn as sns
 from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing, nullcontext
 from openpyxl import load_workbook
 from django.core.cache import cache
-
-# Initialize DeepSeek client
-client = OpenAI(api_key=config('DEEPSEEK_API_KEY'), base_url="https://api.deepseek.com")
+from asgiref.sync import sync_to_async
+from helpers import metrics
+from helpers.llm import achat_completion, astream_chat_completion, chat_completion, stream_chat_completion
+from helpers.metrics import timed
+from summarisation.pool import submit
 
 def save_to_temp(file):
     temp_dir = os.path.join(settings.MEDIA_ROOT, 'temp')
@@ -45,60 +48,95 @@ def parse_spreadsheet(file_path, sample_size=None):
         raise ValueError("Unsupported file format. Please upload a CSV or Excel file.")
     return data
 
-def analyze_data(data):
+def _analyze_data_messages(data):
+    data_str = data.to_string()
+    return [
+        {"role": "system", "content": (
+            "You are a data analysis assistant. Analyze the following dataset and suggest the most suitable chart type."
+            "Respond in the following format:\n"
+            "Chart type: <chart_type>\n"
+            "Reason: <reason for the suggested chart type>\n"
+            "Additional notes: <optional additional context or alternative chart types>"
+            )},
+        {"role": "user", "content": f"Dataset:\n{data_str}"},
+    ]
+
+def analyze_data(data, use_cache=True):
     """
     Analyze the dataset using DeepSeek's API and suggest a chart type.
     """
-    data_str = data.to_string()
-    response = client.chat.completions.create(
-        model="deepseek-chat",
-        messages=[
-            {"role": "system", "content": (
-                "You are a data analysis assistant. Analyze the following dataset and suggest the most suitable chart type."
-                "Respond in the following format:\n"
-                "Chart type: <chart_type>\n"
-                "Reason: <reason for the suggested chart type>\n"
-                "Additional notes: <optional additional context or alternative chart types>"
-                )},
-            {"role": "user", "content": f"Dataset:\n{data_str}"},
-        ],
-        stream=False
-    )
-    return response.choices[0].message.content
+    return chat_completion(_analyze_data_messages(data), use_cache=use_cache)
 
-def ask_question(data_summary, question):
+async def aanalyze_data(data, use_cache=True):
     """
-    Answer a user's question about the dataset using DeepSeek's API.
+    Async counterpart of analyze_data.
+    """
+    return await achat_completion(_analyze_data_messages(data), use_cache=use_cache)
+
+CHART_REQUEST_ANSWER = (
+    "It looks like you're asking about chart generation. "
+    "Please use the 'Generate Chart' feature on the platform to create visualizations for your dataset. "
+    "If you have other questions, let me know!"
+)
+
+def _ask_question_messages(data_summary, question):
+    """
+    Build the chat messages for a question about the dataset, or return None
+    when the question asks for a chart, which is answered without the API.
     """
     chart_keywords = ["generate chart", "generate a bar chart","create chart", "make chart", "plot chart",
         "generate graph", "create graph", "make graph", "plot graph",
         "visualize data", "show chart", "show graph", "draw chart", "draw graph"]
 
     if any(keyword in question.lower() for keyword in chart_keywords):
-        return (
-            "It looks like you're asking about chart generation. "
-            "Please use the 'Generate Chart' feature on the platform to create visualizations for your dataset. "
-            "If you have other questions, let me know!"
-        )
+        return None
     summary_str = (
         f"Columns: {data_summary['columns']}\n"
         f"Data Types: {data_summary['data_types']}\n"
         f"Sample Data: {data_summary['sample_data']}\n"
         f"Numeric Summary: {data_summary['numeric_summary']}"
     )
-    response = client.chat.completions.create(
-        model="deepseek-chat",
-        messages=[
-            {"role": "system", "content": (
-                "You are a data analysis assistant."
-                "Answer the user's questions based on the provided dataset summary."
-                "If the question is unrelated to the dataset, respond with 'I'm sorry, I can only answer questions related to the dataset.'"
-                )},
-            {"role": "user", "content": f"Dataset Summary:\n{summary_str}\n\nQuestion: {question}"},
-        ],
-        stream=False
-    )
-    return response.choices[0].message.content
+    return [
+        {"role": "system", "content": (
+            "You are a data analysis assistant."
+            "Answer the user's questions based on the provided dataset summary."
+            "If the question is unrelated to the dataset, respond with 'I'm sorry, I can only answer questions related to the dataset.'"
+            )},
+        {"role": "user", "content": f"Dataset Summary:\n{summary_str}\n\nQuestion: {question}"},
+    ]
+
+def ask_question(data_summary, question, use_cache=True):
+    """
+    Answer a user's question about the dataset using DeepSeek's API.
+    """
+    messages = _ask_question_messages(data_summary, question)
+    if messages is None:
+        return CHART_REQUEST_ANSWER
+    return chat_completion(messages, use_cache=use_cache)
+
+def ask_question_stream(data_summary, question, use_cache=True):
+    """
+    Streaming counterpart of ask_question: yields the answer in pieces as
+    DeepSeek generates it.
+    """
+    messages = _ask_question_messages(data_summary, question)
+    if messages is None:
+        yield CHART_REQUEST_ANSWER
+        return
+    yield from stream_chat_completion(messages, use_cache=use_cache)
+
+async def aask_question_stream(data_summary, question, use_cache=True):
+    """
+    Async counterpart of ask_question_stream.
+    """
+    messages = _ask_question_messages(data_summary, question)
+    if messages is None:
+        yield CHART_REQUEST_ANSWER
+        return
+    # aclosing() passes a client disconnect on to the upstream stream.
+    async with aclosing(astream_chat_completion(messages, use_cache=use_cache)) as deltas:
+        async for delta in deltas:
+            yield delta
 
 def preprocess_file_ask(file_path):
     """
@@ -145,6 +183,7 @@ def preprocess_file(file_path):
     except Exception as e:
         raise ValueError(f"Error processing file: {str(e)}")
 
+@timed("chart_render")
 def generate_dynamic_charts(data, sample_size=1000):
     """
     Automatically generate charts based on the data structure.
@@ -201,6 +240,33 @@ def generate_dynamic_charts(data, sample_size=1000):
 
     return charts
 
+def render_charts(file_path, sample_size=1000, endpoint=None):
+    """
+    Reads a spreadsheet and renders its charts (see generate_dynamic_charts).
+
+    pyplot keeps global state and is not thread-safe, so only one thread of
+    a process may run this: the job worker, or a process of the shared pool
+    through arender_charts.
+    """
+    with metrics.endpoint(endpoint) if endpoint else nullcontext():
+        data = preprocess_file(file_path)
+        # Ensure data is a DataFrame
+        if isinstance(data, dict):
+            data = pd.DataFrame(data)
+        return generate_dynamic_charts(data, sample_size=sample_size)
+
+async def arender_charts(file_path, sample_size=1000):
+    """
+    Async counterpart of render_charts, for async views. Charts are rendered
+    in the shared process pool, so a render neither blocks the event loop
+    nor holds up the thread that serves the ORM.
+    """
+    # submit() starts the pool on first use, which is blocking work
+    future = await sync_to_async(submit, thread_sensitive=False)(
+        render_charts, file_path, sample_size, metrics.current_endpoint()
+    )
+    return await asyncio.wrap_future(future)
+
 def save_chart_to_base64():
     """
     Save the current matplotlib figure to a Base64 string.
@@ -1,50 +1,46 @@
-from rest_framework.views import APIView
-from rest_framework.parsers import MultiPartParser
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
 from .models import UploadedSpreadsheet
 from .serializers import UploadedSpreadsheetSerializer
-from .utils import parse_spreadsheet, analyze_data, generate_dynamic_charts, ask_question, preprocess_file, preprocess_file_ask
+from .utils import parse_spreadsheet, aanalyze_data, aask_question_stream, arender_charts, preprocess_file_ask
 import os
-import pandas as pd
 from rest_framework.permissions import IsAuthenticated
 import uuid
 import logging
 import numpy as np
 from django.http import StreamingHttpResponse
-import json
-import time
-from django.core.cache import cache
+from asgiref.sync import sync_to_async
+from helpers.async_api import AsyncAPIView
+from helpers.sse import asse_text_stream
+from jobs.views import JobSubmitView
 
 def clean_dataframe(df):
     """Replace NaN, Infinity, and -Infinity with None for JSON serialization."""
     return df.replace([np.nan, np.inf, -np.inf], None)
 
-class SpreadsheetUploadView(APIView):
+def _preview(file_path):
+    data = clean_dataframe(parse_spreadsheet(file_path))
+    return data.head().to_dict(orient='records')
+
+class SpreadsheetUploadView(AsyncAPIView):
     parser_classes = [MultiPartParser]
     permission_classes = [IsAuthenticated]
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         # Save the uploaded file
         file_serializer = UploadedSpreadsheetSerializer(data=request.data)
-        if file_serializer.is_valid():
-            spreadsheet = file_serializer.save()
+        if await sync_to_async(file_serializer.is_valid)():
+            spreadsheet = await sync_to_async(file_serializer.save)()
             file_path = spreadsheet.file.path
 
-            cache_key = f"spreadsheet_preview_{spreadsheet.id}"
-            preview = cache.get(cache_key)
-
-            
-
             print(f"Uploaded Spreadsheet ID: {spreadsheet.id}")  
-            # Parse the file
+            # Parse the file in a thread, off the event loop
             try:
-                data = parse_spreadsheet(file_path)
-                data = clean_dataframe(data)
-                preview = data.head().to_dict(orient='records')
+                preview = await sync_to_async(_preview, thread_sensitive=False)(file_path)
 
-                request.session['analyzed_data'] = None
-                request.session['generated_charts'] = None
-                request.session['question_answers'] = None
+                await request.session.aset('analyzed_data', None)
+                await request.session.aset('generated_charts', None)
+                await request.session.aset('question_answers', None)
 
                 return Response({"preview": preview, "file_id": spreadsheet.id})
             except ValueError as e:
@@ -52,10 +48,10 @@ class SpreadsheetUploadView(APIView):
         else:
             return Response(file_serializer.errors, status=400)
 
-class AnalyzeDataView(APIView):
+class AnalyzeDataView(AsyncAPIView):
     permission_classes = [IsAuthenticated]
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         file_id = request.data.get('file_id')
         sample_size = request.data.get('sample_size', 10)
         print(f"Received file_id: {file_id}")
@@ -64,26 +60,26 @@ class AnalyzeDataView(APIView):
             return Response({"error": "file_id is required."}, status=400)
         
         try:
-            spreadsheet = UploadedSpreadsheet.objects.get(id=file_id)
+            spreadsheet = await UploadedSpreadsheet.objects.aget(id=file_id)
             file_path = spreadsheet.file.path
 
-            # Parse the file
-            data = parse_spreadsheet(file_path, sample_size=int(sample_size))
+            # Parse the file in a thread, off the event loop
+            data = await sync_to_async(parse_spreadsheet, thread_sensitive=False)(file_path, sample_size=int(sample_size))
             # data = clean_dataframe(data)
 
             # Analyze the data
-            chart_suggestion = analyze_data(data)
-            request.session['analyzed_data'] = chart_suggestion
+            chart_suggestion = await aanalyze_data(data)
+            await request.session.aset('analyzed_data', chart_suggestion)
 
             return Response({"chart_suggestion": chart_suggestion})
 
         except Exception as e:
             return Response({"error": str(e)}, status=500)
 
-class GenerateChartView(APIView):
+class GenerateChartView(AsyncAPIView):
     permission_classes = [IsAuthenticated]
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         file_id = request.data.get('file_id')
         sample_size = request.data.get('sample_size', 1000)
         
@@ -91,26 +87,19 @@ class GenerateChartView(APIView):
             return Response({"error": "file_id is required."}, status=400)
         
         try:
-            spreadsheet = UploadedSpreadsheet.objects.get(id=file_id)
+            spreadsheet = await UploadedSpreadsheet.objects.aget(id=file_id)
             file_path = spreadsheet.file.path
 
-            # Parse the file
-            data = preprocess_file(file_path)
-
-            # Ensure data is a DataFrame
-            if isinstance(data, dict):
-                data = pd.DataFrame(data)
-            
-            # data = clean_dataframe(data)
+            # Parse the file and render the charts in a pool process:
+            # pyplot is not thread-safe, and a render can take seconds
             if sample_size is not None:
-                charts = generate_dynamic_charts(data, sample_size=int(sample_size))
-            # Generate dynamic charts
+                charts = await arender_charts(file_path, sample_size=int(sample_size))
             else:
-                charts = generate_dynamic_charts(data)
+                charts = await arender_charts(file_path)
             if not charts:
                 return Response({"error": "No suitable chart found for the dataset."}, status=400)
             
-            request.session['generated_charts'] = charts
+            await request.session.aset('generated_charts', charts)
 
             return Response({"charts": charts})
 
@@ -121,23 +110,22 @@ class GenerateChartView(APIView):
             return Response({"error": f"An unexpected error occurred: {str(e)}"}, status=500)
 
 
-from rest_framework.views import APIView
-from rest_framework.parsers import JSONParser
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.response import Response
-from django.http import StreamingHttpResponse
-from .models import UploadedSpreadsheet
-from .utils import preprocess_file_ask, ask_question
-from asgiref.sync import sync_to_async
-import json
-import time
-from spreadsheet.utils import ask_question
+class ChartJobView(JobSubmitView):
+    """Queues the work of GenerateChartView as a background job."""
+    kind = "charts"
+    # Chart requests are small and interactive, so they jump the queue
+    priority = 10
+    file_model = UploadedSpreadsheet
+    # Spreadsheets are looked up by id alone, as in the other spreadsheet views
+    check_owner = False
+    payload_fields = ("sample_size",)
+
 
-class AskQuestionView(APIView):
+class AskQuestionView(AsyncAPIView):
     permission_classes = [IsAuthenticated]
     parser_classes = [JSONParser]
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         file_id = request.data.get('file_id')
         question = request.data.get('question')
 
@@ -149,22 +137,18 @@ class AskQuestionView(APIView):
 
         try:
             # Retrieve the uploaded file asynchronously
-            spreadsheet = UploadedSpreadsheet.objects.get(id=file_id)
+            spreadsheet = await UploadedSpreadsheet.objects.aget(id=file_id)
             file_path = spreadsheet.file.path
-            print(f"File path: {file_path}")
 
-            # Preprocess the file to generate a summary
-            data_summary = preprocess_file_ask(file_path)
+            # Preprocess the file to generate a summary, in a thread
+            data_summary = await sync_to_async(preprocess_file_ask, thread_sensitive=False)(file_path)
 
-            # Stream the response back to the frontend
-            def stream_response():
-                answer = ask_question(data_summary, question)
-                for word in answer.split():
-                    yield f"data: {json.dumps({'word': word})}\n\n"
-                    time.sleep(0.1)
+            # Stream the answer back to the frontend as DeepSeek generates it
+            answer = aask_question_stream(data_summary, question)
 
-            response = StreamingHttpResponse(stream_response(), content_type='text/event-stream')
+            response = StreamingHttpResponse(asse_text_stream(answer), content_type='text/event-stream')
             response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'
             return response
 
         except UploadedSpreadsheet.DoesNotExist:
@@ -121,13 +121,12 @@ class SubscriptionPrice(models.Model):
         
         if not self.paystack_id:
             try:
-                from helpers.billing import PaystackService
-                import requests
+                from helpers.billing import PaystackService, paystack_http
                 
                 url = f"{PaystackService.BASE_URL}/plan"
                 headers = PaystackService._get_headers()
                 
-                response = requests.post(
+                response = paystack_http.post(
                     url,
                     headers=headers,
                     json={
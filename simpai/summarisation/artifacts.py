@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+
+from helpers.metrics import count_cache
+
+from .textstore import write_atomic
+
+_last_eviction = 0.0
+_eviction_lock = threading.Lock()
+
+
+def artifact_key(digest: str, operation: str, prompt_key: str, version) -> str:
+    """
+        Returns the cache key of a generated file.
+
+        Args:
+            digest (str): SHA-256 of the source document.
+            operation (str): What was generated, e.g. "summary_pdf".
+            prompt_key (str): The summarisation prompt used.
+            version: Version of the renderer; bump it to invalidate
+                everything it produced before.
+
+        Returns:
+            str: A hex key that names the artifact on disk.
+    """
+    payload = json.dumps([digest, operation, prompt_key, str(version)])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def artifact_path(key: str, suffix: str) -> str:
+    return os.path.join(settings.ARTIFACTS_ROOT, key[:2], f"{key}{suffix}")
+
+def get_artifact(key: str, suffix: str):
+    """
+        Returns the path of a stored artifact, or None if it is not stored.
+
+        A hit refreshes the file's access time, which eviction uses to find
+        the least recently used artifacts. The modification time is left
+        alone so it keeps serving as Last-Modified.
+    """
+    path = artifact_path(key, suffix)
+    cache = f"artifact_{suffix.lstrip('.')}"
+    try:
+        stat = os.stat(path)
+        os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))
+    except FileNotFoundError:
+        count_cache(cache, False)
+        return None
+    count_cache(cache, True)
+    return path
+
+def read_artifact(key: str, suffix: str):
+    """
+        Returns the bytes of a stored artifact, or None if it is not stored,
+        including when it is evicted between the lookup and the read.
+    """
+    path = get_artifact(key, suffix)
+    if path is None:
+        return None
+    try:
+        with open(path, 'rb') as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+def store_artifact(key: str, suffix: str, data: bytes) -> str:
+    """Stores generated bytes as an artifact and returns its path."""
+    path = artifact_path(key, suffix)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_atomic(path, data)
+    evict_artifacts_if_due()
+    return path
+
+def store_artifact_file(key: str, suffix: str, source_path: str) -> str:
+    """Moves a generated file into the store and returns its new path."""
+    path = artifact_path(key, suffix)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(source_path, path)
+    evict_artifacts_if_due()
+    return path
+
+async def astream_into_artifact(chunks, key: str, suffix: str):
+    """
+    Passes on the bytes of the async iterable `chunks` while writing them
+    to a temporary file, which becomes the artifact once `chunks` is
+    exhausted. If the stream fails or is abandoned part way, or yields no
+    bytes at all, nothing is stored.
+    """
+    path = artifact_path(key, suffix)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            async for chunk in chunks:
+                tmp.write(chunk)
+                size += len(chunk)
+                yield chunk
+        if size:
+            os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    await sync_to_async(evict_artifacts_if_due, thread_sensitive=False)()
+
+def evict_artifacts_if_due() -> int:
+    """
+        Runs evict_artifacts if this process has not done so in the last
+        ARTIFACTS_EVICT_INTERVAL seconds, since it walks the whole store.
+        The store can outgrow ARTIFACTS_MAX_BYTES by what is written in
+        between.
+
+        Returns:
+            int: The number of artifacts deleted.
+    """
+    global _last_eviction
+    with _eviction_lock:
+        now = time.monotonic()
+        if _last_eviction and now - _last_eviction < settings.ARTIFACTS_EVICT_INTERVAL:
+            return 0
+        _last_eviction = now
+    return evict_artifacts()
+
+def evict_artifacts(max_bytes: int = None) -> int:
+    """
+        Deletes least recently used artifacts until the store fits in
+        `max_bytes` (ARTIFACTS_MAX_BYTES by default).
+
+        Returns:
+            int: The number of artifacts deleted.
+    """
+    if max_bytes is None:
+        max_bytes = settings.ARTIFACTS_MAX_BYTES
+    entries = []
+    total = 0
+    for root, _, files in os.walk(settings.ARTIFACTS_ROOT):
+        for name in files:
+            if name.startswith(".tmp-"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+            total += stat.st_size
+    if total <= max_bytes:
+        return 0
+
+    deleted = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        deleted += 1
+    return deleted
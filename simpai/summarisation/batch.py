@@ -0,0 +1,137 @@
+import asyncio
+import io
+import logging
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from helpers import metrics
+
+from .artifacts import artifact_key, read_artifact, store_artifact
+from .pdfgen import RENDERER_VERSION, render_pdf
+from .pool import submit
+from .textstore import file_sha256, get_document, load_document
+from .utils import asummarize_pages, prompt_key_or_default
+
+logger = logging.getLogger(__name__)
+
+# Version of the stored summary text, part of its artifact key
+SUMMARY_TEXT_VERSION = 1
+
+# Bounds the API calls of all batches running on an event loop
+_limits = weakref.WeakKeyDictionary()
+
+
+def _batch_limit():
+    """
+    The semaphore shared by every batch on the running event loop: under
+    uvicorn, every batch of the worker process.
+    """
+    loop = asyncio.get_running_loop()
+    limit = _limits.get(loop)
+    if limit is None:
+        limit = _limits[loop] = asyncio.Semaphore(settings.SUMMARY_MAX_CONCURRENCY)
+    return limit
+
+def _extract(file_path, endpoint):
+    # Runs in the shared process pool; the text store is shared through
+    # the disk
+    with metrics.endpoint(endpoint):
+        return get_document(file_path).digest
+
+async def _aget_document(file_path):
+    # submit() starts the pool on first use, which is blocking work
+    future = await sync_to_async(submit, thread_sensitive=False)(_extract, file_path, metrics.current_endpoint())
+    digest = await asyncio.wrap_future(future)
+    return await sync_to_async(load_document, thread_sensitive=False)(digest)
+
+async def asummarize_file(uploaded_file, prompt_key, limit, with_pdf=False):
+    """
+    Summarises one uploaded file for a batch, reusing a stored summary
+    (and PDF) of the same content and prompt when there is one.
+
+    Args:
+        uploaded_file (UploadedFile): The file to summarise.
+        prompt_key (str): The summarisation prompt.
+        limit (asyncio.Semaphore): Bounds the API calls of all batches.
+        with_pdf (bool): Whether to render the summary as a PDF too.
+
+    Returns:
+        dict: `summary` text, plus `pdf` bytes if asked for.
+    """
+    file_path = uploaded_file.file.path
+    prompt_key = prompt_key_or_default(prompt_key)
+    digest = await sync_to_async(file_sha256, thread_sensitive=False)(file_path)
+
+    text_key = artifact_key(digest, "summary_text", prompt_key, SUMMARY_TEXT_VERSION)
+    text = await sync_to_async(read_artifact, thread_sensitive=False)(text_key, ".txt")
+    if text is not None:
+        summary = text.decode('utf-8')
+    else:
+        document = await _aget_document(file_path)
+        summary = await asummarize_pages(document.iter_pages(), prompt_key, limit=limit)
+        await sync_to_async(store_artifact, thread_sensitive=False)(text_key, ".txt", summary.encode('utf-8'))
+    result = {"summary": summary}
+
+    if with_pdf:
+        # The same key as SummarizeView, so either one reuses the other's PDF
+        pdf_key = artifact_key(digest, "summary_pdf", prompt_key, RENDERER_VERSION)
+        result["pdf"] = await sync_to_async(read_artifact, thread_sensitive=False)(pdf_key, ".pdf")
+        if result["pdf"] is None:
+            result["pdf"] = (await sync_to_async(render_pdf, thread_sensitive=False)(summary)).getvalue()
+            await sync_to_async(store_artifact, thread_sensitive=False)(pdf_key, ".pdf", result["pdf"])
+    return result
+
+async def abatch_summaries(uploaded_files, prompt_key, with_pdf=False):
+    """
+    Summarises several files at once and yields each result as soon as it
+    is ready, so a batch takes about as long as its slowest file.
+
+    Extraction runs in a shared process pool, and the API calls of all
+    batches running in this process together are bounded by
+    SUMMARY_MAX_CONCURRENCY.
+
+    Yields:
+        tuple: (uploaded_file, result dict or the exception it raised).
+    """
+    limit = _batch_limit()
+
+    async def run(uploaded_file):
+        try:
+            return uploaded_file, await asummarize_file(uploaded_file, prompt_key, limit, with_pdf)
+        except Exception as e:
+            logger.error(f"Batch summary of file {uploaded_file.pk} failed: {e}")
+            return uploaded_file, e
+
+    tasks = [asyncio.create_task(run(uploaded_file)) for uploaded_file in uploaded_files]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # The client went away, or the caller stopped early
+        for task in tasks:
+            task.cancel()
+
+
+class ZipBuffer(io.RawIOBase):
+    """
+    A write-only file for ZipFile that hands out what has been written so
+    far, so a zip can be streamed entry by entry. ZipFile sees that it
+    cannot seek and writes sizes after each entry instead.
+    """
+
+    def __init__(self):
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
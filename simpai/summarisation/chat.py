@@ -0,0 +1,166 @@
+from contextlib import aclosing
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from helpers.llm import achat_completion, astream_chat_completion
+from jobs.models import Job, JobStatus
+from jobs.queue import enqueue
+
+from .models import ChatMessage, ChatSession
+from .utils import GPT_CHAT_SYSTEM_PROMPT
+
+
+COMPACT_INSTRUCTION = (
+    "You keep a running summary of a conversation between a user and an assistant about a document. "
+    "Update the summary with the new messages. Keep the facts, answers and open questions that a later "
+    "question might refer back to, and drop everything else. Reply with the updated summary only, "
+    "in at most {words} words."
+)
+
+# Compaction can wait behind jobs a user is waiting on
+COMPACTION_PRIORITY = -10
+
+
+def _history_limit():
+    # Messages past CHAT_RECENT_MESSAGES wait for the next compaction, which
+    # starts once CHAT_COMPACT_BATCH of them have built up
+    return settings.CHAT_RECENT_MESSAGES + settings.CHAT_COMPACT_BATCH
+
+async def aget_session(user, uploaded_file) -> ChatSession:
+    try:
+        session, _ = await ChatSession.objects.aget_or_create(user=user, uploaded_file=uploaded_file)
+    except IntegrityError:
+        # A concurrent request created it in between
+        session = await ChatSession.objects.aget(user=user, uploaded_file=uploaded_file)
+    return session
+
+async def arecent_messages(session) -> list:
+    """Returns the messages not yet compacted, oldest first, up to a fixed number."""
+    recent = session.messages.filter(compacted=False).order_by('-id')[:_history_limit()]
+    return [message async for message in recent][::-1]
+
+def build_chat_messages(context, question, summary, history):
+    """
+    Builds the prompt of one chat turn: the summary of compacted messages,
+    the recent messages verbatim, and the question with the passages
+    retrieved for it. Only the current question carries document text.
+    """
+    messages = [{"role": "system", "content": GPT_CHAT_SYSTEM_PROMPT}]
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the conversation so far:\n{summary}"})
+    messages += [{"role": message.role, "content": message.content} for message in history]
+    messages.append({"role": "user", "content": f"Text:\n{context}\n\nQuestion:\n{question}"})
+    return messages
+
+async def astream_chat_turn(session, context, question, history):
+    """
+    Streams the answer to a question in a chat session. Once the answer is
+    complete the question and answer are saved, and older messages are
+    compacted in the background if enough have built up.
+
+    Yields:
+        str: Pieces of the answer as DeepSeek generates them.
+    """
+    messages = build_chat_messages(context, question, session.summary, history)
+    parts = []
+    async with aclosing(astream_chat_completion(messages)) as deltas:
+        async for delta in deltas:
+            parts.append(delta)
+            yield delta
+
+    await ChatMessage.objects.abulk_create([
+        ChatMessage(session=session, role="user", content=question),
+        ChatMessage(session=session, role="assistant", content="".join(parts)),
+    ])
+    await session.asave(update_fields=["updated_at"])
+    await aschedule_compaction(session.pk)
+
+def _compaction_lease():
+    # A claim older than the longest model call is from a process that died
+    return timedelta(seconds=settings.LLM_TIMEOUT * 2)
+
+async def _claim_compaction(session_id) -> bool:
+    """Claims a session for compaction, unless another process has claimed it."""
+    now = timezone.now()
+    return await ChatSession.objects.filter(
+        Q(compacting_since__isnull=True) | Q(compacting_since__lt=now - _compaction_lease()),
+        pk=session_id,
+    ).aupdate(compacting_since=now) == 1
+
+async def _release_compaction(session_id):
+    await ChatSession.objects.filter(pk=session_id).aupdate(compacting_since=None)
+
+@sync_to_async
+def _save_compaction(session_id, summary, message_ids) -> bool:
+    # Only if every message is still uncompacted, so none is ever folded
+    # into the summary twice (e.g. by a process whose claim expired)
+    with transaction.atomic():
+        session = ChatSession.objects.select_for_update().get(pk=session_id)
+        if ChatMessage.objects.filter(id__in=message_ids, compacted=False).update(compacted=True) != len(message_ids):
+            transaction.set_rollback(True)
+            return False
+        session.summary = summary
+        session.save(update_fields=["summary"])
+    return True
+
+async def _messages_to_compact(session_id, force):
+    keep = settings.CHAT_RECENT_MESSAGES
+    pending = [
+        message async for message in
+        ChatMessage.objects.filter(session_id=session_id, compacted=False).order_by('id')
+    ]
+    old = pending[:max(len(pending) - keep, 0)]
+    if not old or (len(old) < settings.CHAT_COMPACT_BATCH and not force):
+        return []
+    return old
+
+async def compact_session(session_id, force=False) -> bool:
+    """
+    Folds all but the latest CHAT_RECENT_MESSAGES messages of a session
+    into its summary. Unless `force` is set, nothing happens until at
+    least CHAT_COMPACT_BATCH messages are waiting, so the model is called
+    once per few turns rather than every turn.
+
+    The session is claimed in the database before the model is called, so
+    when several processes try to compact it at once only one does.
+
+    Returns:
+        bool: Whether the session was compacted.
+    """
+    if not await _messages_to_compact(session_id, force) or not await _claim_compaction(session_id):
+        return False
+    try:
+        # Read again under the claim: another process may have just
+        # compacted some of them
+        old = await _messages_to_compact(session_id, force)
+        if not old:
+            return False
+        session = await ChatSession.objects.aget(pk=session_id)
+        transcript = "\n\n".join(f"{message.role.capitalize()}: {message.content}" for message in old)
+        summary = await achat_completion([
+            {"role": "system", "content": COMPACT_INSTRUCTION.format(words=settings.CHAT_SUMMARY_TOKENS * 3 // 4)},
+            {"role": "user", "content": f"Summary so far:\n{session.summary or '(empty)'}\n\nNew messages:\n{transcript}"},
+        ])
+        # The model may overshoot; the summary is part of every prompt, so cap it
+        summary = summary.strip()[:settings.CHAT_SUMMARY_TOKENS * 6]
+        return await _save_compaction(session_id, summary, [message.id for message in old])
+    finally:
+        await _release_compaction(session_id)
+
+async def aschedule_compaction(session_id):
+    """
+    Queues a compaction of the session as a background job, if enough
+    messages are waiting for one and none is queued yet. A task on the
+    request's event loop would be dropped when a sync server tears that
+    loop down after the response.
+    """
+    if not await _messages_to_compact(session_id, False):
+        return
+    queued = Job.objects.filter(kind="compact_chat", status=JobStatus.QUEUED, payload__session_id=session_id)
+    if not await queued.aexists():
+        await sync_to_async(enqueue)("compact_chat", {"session_id": session_id}, priority=COMPACTION_PRIORITY)
@@ -0,0 +1,211 @@
+import re
+from collections import deque
+from typing import NamedTuple
+
+
+DEFAULT_MAX_TOKENS = 15000
+
+# A chunk that has reached this share of its budget is closed at the next
+# paragraph break rather than filled up to the limit mid-paragraph.
+PARAGRAPH_BREAK_RATIO = 0.8
+
+# Sentence ends, or a blank line between paragraphs.
+_BOUNDARY_RE = re.compile(r"(?<=[.!?])\s+|[ \t]*\n[ \t]*\n\s*")
+_WORD_RE = re.compile(r"\S+")
+# BPE vocabularies average about four characters per English token, with
+# punctuation mostly tokenised on its own.
+_TOKEN_RE = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+class Chunk(NamedTuple):
+    text: str
+    start: int
+    end: int
+    tokens: int
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of LLM tokens in a piece of text without calling
+    a tokenizer: every run of up to four word characters and every
+    punctuation mark counts as one token.
+    """
+    return len(_TOKEN_RE.findall(text))
+
+def _iter_words(text, start, end, max_tokens):
+    """
+    Yields (start, end, tokens) for every word of `text[start:end]`.
+
+    Words longer than `max_tokens`, such as long URLs or base64 blobs, are
+    cut between tokens into pieces that fit.
+    """
+    for word in _WORD_RE.finditer(text, start, end):
+        word_tokens = estimate_tokens(word.group())
+        if word_tokens <= max_tokens:
+            yield word.start(), word.end(), word_tokens
+            continue
+        # Every character of a word belongs to a token, so cutting after
+        # every max_tokens-th token leaves nothing out
+        piece_start = word.start()
+        piece_tokens = 0
+        for token in _TOKEN_RE.finditer(text, word.start(), word.end()):
+            piece_tokens += 1
+            if piece_tokens == max_tokens:
+                yield piece_start, token.end(), piece_tokens
+                piece_start = token.end()
+                piece_tokens = 0
+        if piece_tokens:
+            yield piece_start, word.end(), piece_tokens
+
+def _iter_units(text, max_tokens):
+    """
+    Yields (start, end, tokens, paragraph_end) for every sentence of `text`.
+
+    Sentences longer than `max_tokens` are cut into word runs that fit,
+    and words longer than that into pieces of a word.
+    """
+    start = len(text) - len(text.lstrip())
+    text_end = len(text.rstrip())
+    boundaries = _BOUNDARY_RE.finditer(text, start)
+    while start < text_end:
+        match = next(boundaries, None)
+        end = match.start() if match else text_end
+        paragraph_end = match is None or match.group().count("\n") > 1
+
+        if end > start:
+            tokens = estimate_tokens(text[start:end])
+            if tokens <= max_tokens:
+                yield start, end, tokens, paragraph_end
+            else:
+                piece_start = start
+                piece_end = start
+                piece_tokens = 0
+                for word_start, word_end, word_tokens in _iter_words(text, start, end, max_tokens):
+                    if piece_tokens and piece_tokens + word_tokens > max_tokens:
+                        yield piece_start, piece_end, piece_tokens, False
+                        piece_start = word_start
+                        piece_tokens = 0
+                    piece_end = word_end
+                    piece_tokens += word_tokens
+                if piece_tokens:
+                    yield piece_start, piece_end, piece_tokens, paragraph_end
+
+        start = match.end() if match else text_end
+
+def _make_chunk(text, window, tokens):
+    return Chunk(text[window[0][0]:window[-1][1]], window[0][0], window[-1][1], tokens)
+
+def _iter_text_chunks(text, max_tokens, overlap_tokens):
+    window = deque()  # (start, end, tokens) of the sentences in the current chunk
+    window_tokens = 0
+    fresh = False  # whether the window holds anything not already emitted
+
+    def close():
+        nonlocal window_tokens, fresh
+        chunk = _make_chunk(text, window, window_tokens)
+        # Keep the trailing sentences that fit in the overlap budget.
+        kept = 0
+        kept_tokens = 0
+        for _, _, tokens in reversed(window):
+            if kept_tokens + tokens > overlap_tokens:
+                break
+            kept += 1
+            kept_tokens += tokens
+        for _ in range(len(window) - kept):
+            window.popleft()
+        window_tokens = kept_tokens
+        fresh = False
+        return chunk
+
+    for start, end, tokens, paragraph_end in _iter_units(text, max_tokens):
+        if fresh and window_tokens + tokens > max_tokens:
+            yield close()
+        while window and window_tokens + tokens > max_tokens:
+            window_tokens -= window.popleft()[2]
+
+        window.append((start, end, tokens))
+        window_tokens += tokens
+        fresh = True
+
+        if paragraph_end and window_tokens >= max_tokens * PARAGRAPH_BREAK_RATIO:
+            yield close()
+
+    if fresh:
+        yield _make_chunk(text, window, window_tokens)
+
+def chunk_text(text: str, max_tokens: int = DEFAULT_MAX_TOKENS, overlap_tokens: int = 0) -> list:
+    """
+    Splits text into chunks of at most `max_tokens` estimated tokens.
+
+    Chunks end on sentence boundaries, preferring paragraph breaks once a
+    chunk is nearly full, and only fall back to word boundaries for
+    sentences that are too long on their own, and to cutting words that
+    are longer than a chunk. The text is scanned once.
+
+    Args:
+        text (str): The text to split.
+        max_tokens (int): The maximum number of tokens per chunk.
+        overlap_tokens (int): How many tokens of trailing sentences from
+            each chunk to repeat at the start of the next one.
+
+    Returns:
+        list: Chunk tuples of (text, start, end, tokens), where
+        `text == source[start:end]`.
+    """
+    return list(_iter_text_chunks(text, max_tokens, overlap_tokens))
+
+def iter_chunks(segments, max_tokens: int = DEFAULT_MAX_TOKENS, overlap_tokens: int = 0):
+    """
+    Streaming counterpart of chunk_text.
+
+    Consumes text segments (such as the pages yielded by iter_text) and
+    yields chunks as soon as they are complete, holding only a window of a
+    couple of chunks in memory. Offsets are relative to the concatenation
+    of all segments.
+
+    Args:
+        segments (iterable): The text to split, as a stream of strings.
+        max_tokens (int): The maximum number of tokens per chunk.
+        overlap_tokens (int): Tokens of overlap between consecutive chunks.
+
+    Yields:
+        Chunk: The next chunk.
+    """
+    # Roughly two chunks' worth of characters per window.
+    window_chars = max_tokens * 8
+    parts = []
+    size = 0
+    base = 0
+    carried = 0  # length of the tail carried over from the last window
+
+    for segment in segments:
+        parts.append(segment)
+        size += len(segment)
+        # Sparse text (padded pages, tab-separated exports) can take more
+        # characters per chunk than a window holds, and the whole window is
+        # then carried over. Waiting for at least as much new text as was
+        # carried keeps the number of rescans of any character bounded.
+        if size - carried < max(window_chars, carried):
+            continue
+
+        buffer = "".join(parts)
+        last = None
+        for chunk in _iter_text_chunks(buffer, max_tokens, overlap_tokens):
+            if last is not None:
+                yield Chunk(last.text, last.start + base, last.end + base, last.tokens)
+            last = chunk
+        if last is None:
+            parts = []
+            size = carried = 0
+            base += len(buffer)
+            continue
+
+        # The last chunk may end on a sentence cut short by the window, so it
+        # is chunked again together with the text that follows it.
+        parts = [buffer[last.start:]]
+        size = carried = len(parts[0])
+        base += last.start
+
+    buffer = "".join(parts)
+    for chunk in _iter_text_chunks(buffer, max_tokens, overlap_tokens):
+        yield Chunk(chunk.text, chunk.start + base, chunk.end + base, chunk.tokens)
@@ -0,0 +1,117 @@
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+
+BODY = f"{_W}body"
+PARAGRAPH = f"{_W}p"
+TEXT = f"{_W}t"
+ROW = f"{_W}tr"
+CELL = f"{_W}tc"
+# Run content that stands for a character
+_CHARACTERS = {
+    f"{_W}tab": "\t",
+    f"{_W}br": "\n",
+    f"{_W}cr": "\n",
+    f"{_W}noBreakHyphen": "-",
+}
+# Property elements, whose w:tab children are tab stops rather than tabs
+_PROPERTIES = {f"{_W}pPr", f"{_W}rPr", f"{_W}tblPr", f"{_W}trPr", f"{_W}tcPr", f"{_W}sectPr"}
+# The VML copy of a drawing (e.g. a text box) that Word writes alongside it
+_FALLBACK = f"{_MC}Fallback"
+
+DOCUMENT_PART = "word/document.xml"
+
+
+def iter_docx_text(file_path: str):
+    """
+        Yields the text of a DOCX in document order: each paragraph, and
+        each table cell, as one unit.
+
+        word/document.xml is decompressed from the zip and parsed as a
+        stream, and every element is discarded once its text has been
+        taken, so memory stays flat however long the document is.
+        Paragraphs end in a line break; cells end in a tab, or a line
+        break at the end of their row, so tables keep their shape. Cells
+        of nested tables are folded into the cell that contains them.
+
+        Args:
+            file_path (str): The path to the DOCX file.
+
+        Yields:
+            tuple: (unit_number, text) for each unit, zero-based.
+    """
+    with zipfile.ZipFile(file_path) as archive, archive.open(DOCUMENT_PART) as document:
+        # Text pieces of each open paragraph (text boxes nest them), and
+        # paragraph texts of each open table cell
+        paragraphs = []
+        cells = []
+        # The last cell of the current row, held back until it is known
+        # whether the row goes on
+        pending = None
+        properties = 0
+        fallback = 0
+        depth = 0
+        body = None
+        number = 0
+
+        for event, element in iterparse(document, events=("start", "end")):
+            tag = element.tag
+            if event == "start":
+                depth += 1
+                if tag == PARAGRAPH:
+                    paragraphs.append([])
+                elif tag == CELL:
+                    cells.append([])
+                elif tag in _PROPERTIES:
+                    properties += 1
+                elif tag == _FALLBACK:
+                    fallback += 1
+                elif tag == BODY:
+                    body = element
+                continue
+
+            depth -= 1
+            if tag == TEXT:
+                if paragraphs and not fallback:
+                    paragraphs[-1].append(element.text or "")
+            elif tag in _CHARACTERS:
+                if paragraphs and not fallback and not properties:
+                    paragraphs[-1].append(_CHARACTERS[tag])
+            elif tag in _PROPERTIES:
+                properties -= 1
+            elif tag == _FALLBACK:
+                fallback -= 1
+            elif tag == PARAGRAPH:
+                text = "".join(paragraphs.pop())
+                element.clear()
+                if paragraphs:
+                    # A text box inside a paragraph
+                    if text:
+                        paragraphs[-1].append(text + "\n")
+                elif cells:
+                    cells[-1].append(text)
+                else:
+                    yield number, text + "\n"
+                    number += 1
+            elif tag == CELL:
+                text = " ".join(part for part in cells.pop() if part)
+                element.clear()
+                if cells:
+                    cells[-1].append(text)
+                else:
+                    if pending is not None:
+                        yield number, pending + "\t"
+                        number += 1
+                    pending = text
+            elif tag == ROW:
+                element.clear()
+                if not cells and pending is not None:
+                    yield number, pending + "\n"
+                    number += 1
+                    pending = None
+
+            if depth == 2 and body is not None:
+                # A whole block of the body (paragraph, table...) is done
+                body.clear()
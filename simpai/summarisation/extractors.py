@@ -0,0 +1,436 @@
+import codecs
+import csv
+import logging
+import mmap
+import os
+import re
+import time
+from html.parser import HTMLParser
+
+import magic
+from charset_normalizer import from_bytes
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Part of where the text store keeps a document's text and everything
+# derived from it; bump it whenever an extractor's output changes
+EXTRACTION_VERSION = 3
+
+# Text files are decoded in blocks of about this many bytes
+TEXT_BLOCK_SIZE = 64 * 1024
+# Bytes read to guess the encoding of a text file without a BOM
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# libmagic reports several text formats as text/plain; the extension
+# then tells them apart
+_TEXT_EXTENSIONS = {
+    ".md": "text/markdown",
+    ".markdown": "text/markdown",
+    ".csv": "text/csv",
+    ".html": "text/html",
+    ".htm": "text/html",
+    ".rtf": "text/rtf",
+}
+
+
+class UnsupportedFormat(ValueError):
+    """A file that no registered extractor can read."""
+
+
+class Extractor:
+    """
+    Reads the text out of one kind of file.
+
+    `iterate` yields (unit_number, text) pairs, a unit being a page, a
+    paragraph or a block of lines, so callers can stream a document.
+    `iter_pages` yields (page_number, text) pairs by page instead, as
+    the text store keeps them: formats without fixed pagination are a
+    single page, whose units all carry page number 0.
+    """
+
+    def __init__(self, name, iterate, pages=None):
+        self.name = name
+        self._iterate = iterate
+        self._pages = pages
+
+    def iterate(self, file_path):
+        return _measured(self.name, file_path, self._iterate(file_path))
+
+    def iter_pages(self, file_path, digest=None):
+        if self._pages is not None:
+            pieces = self._pages(file_path, digest)
+        else:
+            pieces = self._single_page(file_path)
+        return _measured(self.name, file_path, pieces)
+
+    def _single_page(self, file_path):
+        # An empty document still has its one page
+        yield 0, ""
+        for _, text in self._iterate(file_path):
+            yield 0, text
+
+
+# Media type -> Extractor
+EXTRACTORS = {}
+# File extension -> media type, for files libmagic cannot place
+_EXTENSIONS = {}
+
+
+def register_extractor(name, mime_types, extensions, pages=None):
+    """
+    Registers `iterate` (the decorated function) as the extractor of the
+    given media types and extensions.
+
+    Args:
+        name (str): Short name, used in metrics.
+        mime_types (list): Media types, as sniffed by libmagic.
+        extensions (list): File extensions, with the dot, used when
+            sniffing is inconclusive.
+        pages (callable): Optional `(file_path, digest)` iterator of
+            (page_number, text) pairs, one per page, for paginated formats;
+            by default the units yielded by `iterate` make up one page.
+    """
+    def decorator(iterate):
+        extractor = Extractor(name, iterate, pages)
+        for mime_type in mime_types:
+            EXTRACTORS[mime_type] = extractor
+        for extension in extensions:
+            _EXTENSIONS[extension] = mime_types[0]
+        return iterate
+    return decorator
+
+def sniff(file_path: str) -> str:
+    """
+    Returns the media type of a file from its leading bytes, refined by
+    its extension where the bytes alone are ambiguous.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    try:
+        mime_type = magic.from_file(file_path, mime=True)
+    except (magic.MagicException, OSError) as e:
+        logger.warning(f"Could not sniff {file_path}: {e}")
+        mime_type = "application/octet-stream"
+
+    if mime_type == "text/plain":
+        return _TEXT_EXTENSIONS.get(extension, mime_type)
+    if mime_type not in EXTRACTORS:
+        # e.g. a DOCX that an older libmagic only knows as application/zip
+        return _EXTENSIONS.get(extension, mime_type)
+    return mime_type
+
+def get_extractor(file_path: str) -> Extractor:
+    """
+    Returns the extractor for a file.
+
+    Raises:
+        UnsupportedFormat: If no extractor reads the file's format.
+    """
+    mime_type = sniff(file_path)
+    try:
+        return EXTRACTORS[mime_type]
+    except KeyError:
+        raise UnsupportedFormat(f"Unsupported file format: {mime_type}.")
+
+def log_throughput(name, file_path, size, seconds):
+    """The default EXTRACTION_METRICS_HOOK: logs the rate at debug level."""
+    rate = size / seconds / 1e6 if seconds > 0 else float('inf')
+    logger.debug(f"{name} extracted {size} bytes from {file_path} in {seconds:.3f} s ({rate:.1f} MB/s)")
+
+def report_throughput(name, file_path, seconds):
+    """
+    Passes an extraction's input size and duration to
+    EXTRACTION_METRICS_HOOK. A failing hook never fails the extraction.
+    """
+    try:
+        size = os.path.getsize(file_path)
+        import_string(settings.EXTRACTION_METRICS_HOOK)(name, file_path, size, seconds)
+    except Exception:
+        logger.exception("Extraction metrics hook failed")
+
+def _measured(name, file_path, units):
+    # Time spent by the consumer between units is counted too; iterate()
+    # is meant to be drained straight away
+    start = time.perf_counter()
+    yield from units
+    report_throughput(name, file_path, time.perf_counter() - start)
+
+
+def detect_encoding(data) -> str:
+    """
+    Guesses the encoding of text from its first bytes: a BOM if there is
+    one, UTF-8 if the sample decodes as UTF-8, or else charset-normalizer's
+    best guess.
+
+    Args:
+        data: The file's bytes, e.g. a memory map of it.
+
+    Returns:
+        str: A codec name.
+    """
+    for bom, encoding in _BOMS:
+        if data[:len(bom)] == bom:
+            return encoding
+    sample = bytes(data[:ENCODING_SAMPLE_SIZE])
+    try:
+        # The sample may end in the middle of a character
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    matches = from_bytes(sample)
+    best = matches.best()
+    if best is None:
+        return 'latin-1'
+    # Short or repetitive samples often fit several single-byte code pages
+    # equally well; Windows-1252 is by far the likeliest of them
+    tied = {match.encoding for match in matches if match.chaos == best.chaos}
+    return 'cp1252' if 'cp1252' in tied else best.encoding
+
+def iter_decoded(file_path: str, block_size: int = TEXT_BLOCK_SIZE):
+    """
+    Yields the text of a file in decoded blocks.
+
+    The file is memory-mapped, so only the block being decoded is copied
+    out of the page cache, and every byte is decoded exactly once.
+    """
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            decoder = codecs.getincrementaldecoder(detect_encoding(data))(errors='replace')
+            for offset in range(0, len(data), block_size):
+                text = decoder.decode(data[offset:offset + block_size])
+                if text:
+                    yield text
+            text = decoder.decode(b"", final=True)
+            if text:
+                yield text
+
+def iter_lines(file_path: str):
+    """Yields the lines of a text file, line endings included."""
+    rest = ""
+    for block in iter_decoded(file_path):
+        lines = (rest + block).splitlines(keepends=True)
+        # The last line may continue in the next block
+        rest = lines.pop() if lines else ""
+        yield from lines
+    if rest:
+        yield rest
+
+@register_extractor("text", ["text/plain", "text/markdown", "text/x-markdown"], [".txt", ".md", ".markdown"])
+def iter_text_blocks(file_path: str, block_size: int = TEXT_BLOCK_SIZE):
+    """
+    Yields the text of a plain text or Markdown file in blocks of whole
+    lines.
+
+    Yields:
+        tuple: (block_number, text) for each block, zero-based.
+    """
+    number = 0
+    block = []
+    size = 0
+    for line in iter_lines(file_path):
+        block.append(line)
+        size += len(line)
+        if size >= block_size:
+            yield number, "".join(block)
+            number += 1
+            block = []
+            size = 0
+    if block:
+        yield number, "".join(block)
+
+@register_extractor("csv", ["text/csv"], [".csv"])
+def iter_csv_rows(file_path: str, rows_per_block: int = 500):
+    """
+    Yields the rows of a CSV file as tab-separated lines, in blocks.
+
+    Yields:
+        tuple: (block_number, text) for each block of rows, zero-based.
+    """
+    block = []
+    number = 0
+    for row in csv.reader(iter_lines(file_path)):
+        block.append("\t".join(row) + "\n")
+        if len(block) >= rows_per_block:
+            yield number, "".join(block)
+            number += 1
+            block = []
+    if block:
+        yield number, "".join(block)
+
+
+class _HTMLText(HTMLParser):
+    """Collects the visible text of an HTML document as it is fed."""
+
+    SKIP = {"script", "style", "head", "template", "noscript"}
+    BREAKS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6",
+              "section", "article", "blockquote", "pre", "table", "ul", "ol"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skipping += 1
+        elif tag in self.BREAKS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self._skipping = max(self._skipping - 1, 0)
+        elif tag in self.BREAKS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self.parts.append(data)
+
+    def take(self) -> str:
+        text = "".join(self.parts)
+        self.parts.clear()
+        return re.sub(r"\n\s*\n\s*", "\n\n", text)
+
+@register_extractor("html", ["text/html", "application/xhtml+xml"], [".html", ".htm"])
+def iter_html_text(file_path: str):
+    """
+    Yields the visible text of an HTML file, parsed incrementally.
+
+    Yields:
+        tuple: (block_number, text) for each decoded block, zero-based.
+    """
+    parser = _HTMLText()
+    number = 0
+    for block in iter_decoded(file_path):
+        parser.feed(block)
+        text = parser.take()
+        if text:
+            yield number, text
+            number += 1
+    parser.close()
+    text = parser.take()
+    if text:
+        yield number, text
+
+
+# Control words, hex escapes, group delimiters and runs of plain text
+_RTF_TOKEN_RE = re.compile(
+    rb"\\([a-zA-Z]+)(-?\d+)? ?|\\'([0-9a-fA-F]{2})|\\(.)|([{}])|([^\\{}\r\n]+)|[\r\n]+",
+    re.DOTALL,
+)
+# Groups whose content is not document text
+_RTF_DESTINATIONS = {
+    b"fonttbl", b"colortbl", b"stylesheet", b"info", b"pict", b"object", b"header",
+    b"footer", b"headerl", b"headerr", b"footerl", b"footerr", b"listtable",
+    b"listoverridetable", b"rsidtbl", b"generator", b"themedata", b"datastore",
+}
+_RTF_BREAKS = {b"par": "\n", b"line": "\n", b"row": "\n", b"sect": "\n", b"page": "\n",
+               b"tab": "\t", b"cell": "\t", b"emdash": "\u2014", b"endash": "\u2013",
+               b"lquote": "\u2018", b"rquote": "\u2019", b"ldblquote": "\u201c", b"rdblquote": "\u201d"}
+
+def _rtf_codepage(arg, default):
+    try:
+        return codecs.lookup(f"cp{int(arg)}").name
+    except LookupError:
+        return default
+
+def _is_high_surrogate(char):
+    return "\ud800" <= char <= "\udbff"
+
+def _join_surrogates(text):
+    """
+    Combines the UTF-16 surrogate pairs that \\uN escapes spell characters
+    outside the BMP with (e.g. emoji) into those characters, and replaces
+    unpaired halves, which cannot be encoded.
+    """
+    return text.encode('utf-16', 'surrogatepass').decode('utf-16', 'replace')
+
+@register_extractor("rtf", ["text/rtf", "application/rtf"], [".rtf"])
+def iter_rtf_text(file_path: str, block_size: int = TEXT_BLOCK_SIZE):
+    """
+    Yields the text of an RTF file.
+
+    The memory-mapped file is tokenised in place, so it is never read into
+    memory whole. Hex escapes are decoded with the document's \\ansicpg
+    code page, and \\uN escapes skip their fallback characters.
+
+    Yields:
+        tuple: (block_number, text) for each block, zero-based.
+    """
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            codepage = 'cp1252'
+            # (skipping, characters to skip after \uN) of each open group
+            stack = []
+            skipping = False
+            uc = 1
+            pending_skip = 0
+            parts = []
+            size = 0
+            number = 0
+            for match in _RTF_TOKEN_RE.finditer(data):
+                word, arg, hex_code, symbol, brace, text = match.groups()
+                out = None
+                if brace == b"{":
+                    stack.append((skipping, uc))
+                elif brace == b"}":
+                    skipping, uc = stack.pop() if stack else (False, 1)
+                elif pending_skip and (text or hex_code or symbol is not None):
+                    # Fallback characters of a \uN escape
+                    if text and len(text) > pending_skip:
+                        out = text[pending_skip:].decode(codepage, errors='replace')
+                        pending_skip = 0
+                    else:
+                        pending_skip -= len(text) if text else 1
+                elif word is not None:
+                    if word in _RTF_DESTINATIONS:
+                        skipping = True
+                    elif word == b"ansicpg" and arg:
+                        codepage = _rtf_codepage(arg, codepage)
+                    elif word == b"uc" and arg:
+                        uc = int(arg)
+                    elif word == b"u" and arg:
+                        out = chr(int(arg) % 0x10000)
+                        pending_skip = uc
+                    else:
+                        out = _RTF_BREAKS.get(word)
+                elif symbol is not None:
+                    if symbol == b"*":
+                        skipping = True
+                    elif symbol in b"\\{}":
+                        out = symbol.decode('ascii')
+                    elif symbol == b"~":
+                        out = "\u00a0"
+                    elif symbol in b"\r\n":
+                        # A backslash before a line break is a paragraph break
+                        out = "\n"
+                elif hex_code is not None:
+                    out = bytes([int(hex_code, 16)]).decode(codepage, errors='replace')
+                elif text is not None:
+                    out = text.decode(codepage, errors='replace')
+
+                if out and not skipping:
+                    parts.append(out)
+                    size += len(out)
+                    # Not between the two halves of a surrogate pair
+                    if size >= block_size and not _is_high_surrogate(out[-1]):
+                        yield number, _join_surrogates("".join(parts))
+                        number += 1
+                        parts = []
+                        size = 0
+            if parts:
+                yield number, _join_surrogates("".join(parts))
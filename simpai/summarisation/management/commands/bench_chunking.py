@@ -0,0 +1,72 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from summarisation.chunking import DEFAULT_MAX_TOKENS, chunk_text, estimate_tokens, iter_chunks
+
+WORDS = (
+    "the of and to in is that for it as with was on be by this are revenue "
+    "quarter growth contract agreement party obligations pursuant notwithstanding "
+    "indemnification termination confidentiality analysis results methodology"
+).split()
+
+
+def synthetic_text(size_bytes, seed=0):
+    rng = random.Random(seed)
+    paragraphs = []
+    size = 0
+    while size < size_bytes:
+        sentences = []
+        for _ in range(rng.randint(2, 8)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(5, 35))]
+            sentences.append(" ".join(words).capitalize() + rng.choice(".!?"))
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+class Command(BaseCommand):
+    help = 'Measure chunking throughput on multi-megabyte inputs'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", default=None, help="Chunk this UTF-8 text file instead of synthetic text")
+        parser.add_argument("--size-mb", default=4, type=float)
+        parser.add_argument("--max-tokens", default=DEFAULT_MAX_TOKENS, type=int)
+        parser.add_argument("--overlap", default=0, type=int)
+        parser.add_argument("--repeat", default=3, type=int)
+
+    def handle(self, *args, **options):
+        # python manage.py bench_chunking --size-mb 8 --max-tokens 4000 --overlap 200
+        if options["file"]:
+            with open(options["file"], encoding="utf-8", errors="replace") as file:
+                text = file.read()
+        else:
+            text = synthetic_text(int(options["size_mb"] * 1024 * 1024))
+        max_tokens = options["max_tokens"]
+        overlap = options["overlap"]
+        megabytes = len(text.encode("utf-8")) / (1024 * 1024)
+
+        start = time.perf_counter()
+        tokens = estimate_tokens(text)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"input: {megabytes:.2f} MB, ~{tokens} tokens")
+        self.stdout.write(f"estimate_tokens: {megabytes / elapsed:.1f} MB/s")
+
+        pages = [text[i:i + 4000] for i in range(0, len(text), 4000)]
+        for name, run in (
+            ("chunk_text", lambda: chunk_text(text, max_tokens, overlap)),
+            ("iter_chunks", lambda: list(iter_chunks(pages, max_tokens, overlap))),
+        ):
+            timings = []
+            for _ in range(options["repeat"]):
+                start = time.perf_counter()
+                chunks = run()
+                timings.append(time.perf_counter() - start)
+            best = min(timings)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{name}: {len(chunks)} chunks, best {best * 1000:.0f} ms, {megabytes / best:.1f} MB/s"
+                )
+            )
@@ -0,0 +1,135 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+import zipfile
+from xml.sax.saxutils import escape
+
+import docx
+from django.core.management.base import BaseCommand
+
+from summarisation.docxtext import DOCUMENT_PART, iter_docx_text
+from summarisation.management.commands.bench_chunking import WORDS
+
+_NAMESPACE = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+
+def _paragraph(text):
+    return f'<w:p><w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>'
+
+def write_synthetic_docx(path, pages, seed=0):
+    """
+    Writes a DOCX of about `pages` pages: mostly paragraphs, with a small
+    table every few pages. document.xml is written directly, since building
+    a document this size through python-docx takes minutes.
+    """
+    rng = random.Random(seed)
+
+    def sentence():
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 24))).capitalize() + "."
+
+    # Everything but the body comes from python-docx's default template
+    with tempfile.TemporaryDirectory() as directory:
+        template = os.path.join(directory, "template.docx")
+        docx.Document().save(template)
+        with zipfile.ZipFile(template) as source, zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as target:
+            for item in source.infolist():
+                if item.filename != DOCUMENT_PART:
+                    target.writestr(item, source.read(item))
+            with target.open(DOCUMENT_PART, 'w') as document:
+                document.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                               f'<w:document xmlns:w="{_NAMESPACE}"><w:body>'.encode('utf-8'))
+                for page in range(pages):
+                    # About 500 words a page
+                    for _ in range(6):
+                        body = " ".join(sentence() for _ in range(5))
+                        document.write(_paragraph(body).encode('utf-8'))
+                    if page % 5 == 0:
+                        rows = "".join(
+                            "<w:tr>" + "".join(f"<w:tc>{_paragraph(sentence())}</w:tc>" for _ in range(3)) + "</w:tr>"
+                            for _ in range(4)
+                        )
+                        document.write(f"<w:tbl>{rows}</w:tbl>".encode('utf-8'))
+                document.write(b"<w:sectPr/></w:body></w:document>")
+
+
+def extract_via_python_docx(path):
+    # The previous implementation: the whole DOM, paragraphs only
+    doc = docx.Document(path)
+    text = ""
+    for para in doc.paragraphs:
+        text += para.text
+    return len(text)
+
+def extract_streaming(path):
+    return len("".join(text for _, text in iter_docx_text(path)))
+
+def consume_streaming(path):
+    # As the chunker consumes iter_text: no unit outlives its chunk
+    return sum(len(text) for _, text in iter_docx_text(path))
+
+def _rss():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def _measure(function, path):
+    """Runs `function`, which returns the number of characters extracted."""
+    # Runs in a fresh process, so memory freed by earlier runs but kept by
+    # the allocator does not hide this one's growth. The resident set is
+    # sampled, since lxml allocates outside tracemalloc's view
+    before = _rss()
+    peak = [before]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.005):
+            peak[0] = max(peak[0], _rss())
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    start = time.perf_counter()
+    try:
+        chars = function(path)
+    finally:
+        seconds = time.perf_counter() - start
+        done.set()
+        sampler.join()
+    peak[0] = max(peak[0], _rss())
+    return seconds, chars, (peak[0] - before) / 1024 / 1024
+
+
+class Command(BaseCommand):
+    help = 'Measure DOCX text extraction time and memory on long documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", default=None, help="Extract this DOCX instead of a synthetic one")
+        parser.add_argument("--pages", default=1000, type=int)
+        parser.add_argument("--repeat", default=3, type=int)
+
+    def handle(self, *args, **options):
+        # python manage.py bench_docx --pages 1000 --repeat 3
+        with tempfile.TemporaryDirectory() as directory:
+            path = options["file"]
+            if path is None:
+                path = os.path.join(directory, "bench.docx")
+                write_synthetic_docx(path, options["pages"])
+            self.stdout.write(f"input: {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+
+            context = multiprocessing.get_context("fork")
+            for name, function in (
+                ("python-docx", extract_via_python_docx),
+                ("iterparse", extract_streaming),
+                ("iterparse, streamed", consume_streaming),
+            ):
+                runs = []
+                for _ in range(options["repeat"]):
+                    with context.Pool(1) as pool:
+                        runs.append(pool.apply(_measure, (function, path)))
+                seconds = min(run[0] for run in runs)
+                chars = runs[0][1]
+                memory = max(run[2] for run in runs)
+                self.stdout.write(self.style.SUCCESS(
+                    f"{name}: best {seconds:.2f} s, {chars} chars, peak memory +{memory:.0f} MB"
+                ))
@@ -0,0 +1,81 @@
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from PyPDF2 import PdfReader
+
+from summarisation.management.commands.bench_chunking import WORDS
+from summarisation.pdfgen import _styles, build_story, generate_pdf, render_pdf
+
+
+def synthetic_summary(sections, seed=0):
+    """A markdown-like summary shaped like the model's output."""
+    rng = random.Random(seed)
+
+    def sentence():
+        words = [rng.choice(WORDS) for _ in range(rng.randint(6, 24))]
+        if rng.random() < 0.3:
+            i = rng.randrange(len(words))
+            words[i] = f"**{words[i]}**"
+        return " ".join(words).capitalize() + "."
+
+    lines = ["# Summary"]
+    for number in range(sections):
+        lines.append(f"## Section {number + 1}")
+        for _ in range(rng.randint(1, 3)):
+            lines.append(" ".join(sentence() for _ in range(rng.randint(3, 6))))
+        lines.append("")
+        for _ in range(rng.randint(2, 5)):
+            lines.append(f"- {sentence()}")
+        for _ in range(rng.randint(0, 3)):
+            lines.append(f"1. {sentence()}")
+    return "\n".join(lines)
+
+
+def render_via_file(summary):
+    # The previous view path: write a file, read it back, delete it
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        generate_pdf(summary, path)
+        with open(path, 'rb') as file:
+            return file.read()
+    finally:
+        os.remove(path)
+
+
+class Command(BaseCommand):
+    help = 'Measure PDF rendering throughput of summary reports'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sections", default=40, type=int)
+        parser.add_argument("--repeat", default=5, type=int)
+
+    def handle(self, *args, **options):
+        # python manage.py bench_pdfgen --sections 100 --repeat 10
+        summary = synthetic_summary(options["sections"])
+        pages = len(PdfReader(render_pdf(summary)).pages)
+        self.stdout.write(f"input: {len(summary) / 1024:.0f} KB, {pages} pages")
+
+        start = time.perf_counter()
+        for _ in range(options["repeat"]):
+            _styles.__wrapped__()
+        styles_ms = (time.perf_counter() - start) / options["repeat"] * 1000
+        self.stdout.write(f"stylesheet build: {styles_ms:.2f} ms (now once per process)")
+
+        for name, run in (
+            ("build_story", lambda: build_story(summary)),
+            ("render_pdf", lambda: render_pdf(summary)),
+            ("generate_pdf via file", lambda: render_via_file(summary)),
+        ):
+            timings = []
+            for _ in range(options["repeat"]):
+                start = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - start)
+            best = min(timings)
+            self.stdout.write(
+                self.style.SUCCESS(f"{name}: best {best * 1000:.1f} ms, {pages / best:.1f} pages/s")
+            )
@@ -0,0 +1,83 @@
+import os
+import re
+import tempfile
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PyPDF2 import PdfReader
+
+from summarisation.management.commands.bench_pdfgen import synthetic_summary
+from summarisation.pdfgen import generate_pdf
+from summarisation.utils import _extract_text_layer_pypdf2, _iter_pages_pdftotext, _pdftotext_path
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def word_f1(expected, actual):
+    """
+    Word-level F1 of extracted text against the source: words that were
+    merged, split or dropped by the extractor all lower it.
+    """
+    expected = Counter(word.lower() for word in _WORD_RE.findall(expected))
+    actual = Counter(word.lower() for word in _WORD_RE.findall(actual))
+    common = sum((expected & actual).values())
+    if not common:
+        return 0.0
+    precision = common / sum(actual.values())
+    recall = common / sum(expected.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+class Command(BaseCommand):
+    help = 'Compare PDF text engines on throughput and text fidelity'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", action="append", default=[],
+                            help="Add this PDF to the corpus; may be repeated. Its text has no known "
+                                 "source, so only throughput is reported for it")
+        parser.add_argument("--sections", default="10,50,200",
+                            help="Sizes of the synthetic summary reports in the corpus")
+        parser.add_argument("--workers", default=settings.PDF_EXTRACT_WORKERS, type=int,
+                            help="Processes PyPDF2 extracts with, as PDF_EXTRACT_WORKERS")
+        parser.add_argument("--repeat", default=3, type=int)
+
+    def handle(self, *args, **options):
+        # python manage.py bench_pdftext --sections 10,100,400 --file contract.pdf
+        # The readers get_document uses for the text layer: pdftotext in
+        # one process, PyPDF2 split across the extraction pool
+        engines = {
+            "pdftotext": _iter_pages_pdftotext,
+            "pypdf2": lambda path: _extract_text_layer_pypdf2(path, options["workers"]),
+        }
+        if not _pdftotext_path():
+            self.stdout.write(self.style.WARNING("pdftotext is not installed (poppler-utils); only PyPDF2 is measured"))
+            del engines["pdftotext"]
+
+        with tempfile.TemporaryDirectory() as directory:
+            # (label, path, source text or None)
+            corpus = []
+            for sections in map(int, options["sections"].split(",")):
+                summary = synthetic_summary(sections)
+                path = os.path.join(directory, f"report-{sections}.pdf")
+                generate_pdf(summary, path)
+                corpus.append((f"report, {sections} sections", path, summary))
+            corpus += [(os.path.basename(path), path, None) for path in options["file"]]
+
+            for label, path, source in corpus:
+                with open(path, 'rb') as file:
+                    pages = len(PdfReader(file).pages)
+                self.stdout.write(f"{label}: {pages} pages, {os.path.getsize(path) / 1024:.0f} KB")
+
+                for name, iterate in engines.items():
+                    timings = []
+                    for _ in range(options["repeat"]):
+                        start = time.perf_counter()
+                        text = "".join(iterate(path))
+                        timings.append(time.perf_counter() - start)
+                    best = min(timings)
+                    fidelity = f", word F1 {word_f1(source, text):.3f}" if source is not None else ""
+                    self.stdout.write(self.style.SUCCESS(
+                        f"  {name}: best {best * 1000:.0f} ms, {pages / best:.0f} pages/s{fidelity}"
+                    ))
@@ -0,0 +1,63 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from summarisation.management.commands.bench_chunking import WORDS
+from summarisation.summarizer import imap_ordered
+from summarisation.tts import split_segments
+
+
+class SimulatedBackend:
+    """
+    Stands in for gTTS without the network: gTTS makes one sequential
+    request per ~100 characters, so latency grows with segment length.
+    """
+    SECONDS_PER_REQUEST = 0.25
+
+    def synthesize(self, text):
+        time.sleep(self.SECONDS_PER_REQUEST * (len(text) // 100 + 1))
+        return b"\xff\xfb" + bytes(len(text))
+
+
+def synthetic_text(sentences, seed=0):
+    rng = random.Random(seed)
+    return " ".join(
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 24))).capitalize() + "."
+        for _ in range(sentences)
+    )
+
+
+class Command(BaseCommand):
+    help = 'Measure time to first audio and total time of text-to-speech'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sentences", default=200, type=int)
+        parser.add_argument("--segment-chars", default=400, type=int)
+        parser.add_argument("--workers", default="1,2,4,8")
+        parser.add_argument("--backend", default=None,
+                            help="Dotted path of a TTS backend; simulated by default")
+
+    def handle(self, *args, **options):
+        # python manage.py bench_tts --sentences 500 --workers 1,4,8
+        backend = import_string(options["backend"])() if options["backend"] else SimulatedBackend()
+        text = synthetic_text(options["sentences"])
+        segments = split_segments(text, options["segment_chars"])
+        self.stdout.write(f"input: {len(text)} chars, {len(segments)} segments")
+
+        def run(label, parts, workers):
+            start = time.perf_counter()
+            first = None
+            for _ in imap_ordered(backend.synthesize, parts, workers):
+                if first is None:
+                    first = time.perf_counter() - start
+            total = time.perf_counter() - start
+            self.stdout.write(
+                self.style.SUCCESS(f"{label}: first audio {first:.2f} s, total {total:.2f} s")
+            )
+
+        # The previous behaviour: the whole text in one blocking call
+        run("single call", [text], 1)
+        for workers in [int(n) for n in options["workers"].split(",")]:
+            run(f"segmented, {workers} workers", segments, workers)
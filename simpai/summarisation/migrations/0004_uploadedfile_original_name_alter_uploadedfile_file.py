@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:12
+
+import blobs.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summarisation', '0003_uploadedfile_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='original_name',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='uploadedfile',
+            name='file',
+            field=models.FileField(storage=blobs.storage.get_blob_storage, upload_to='uploads/'),
+        ),
+    ]
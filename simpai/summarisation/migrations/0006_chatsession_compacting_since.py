@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summarisation', '0005_chatsession_chatmessage_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='compacting_since',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,11 +1,77 @@
-from django.db import models
+import os
+
+from django.db import models, transaction
 from django.conf import settings
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from blobs.storage import get_blob_storage
 
 
 class UploadedFile(models.Model):
-    file = models.FileField(upload_to="uploads/")
+    # Stored once per distinct content; see blobs.storage.BlobStorage
+    file = models.FileField(upload_to="uploads/", storage=get_blob_storage)
+    original_name = models.CharField(max_length=255, blank=True, default="")
     user=models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return self.file.name
\ No newline at end of file
+        return self.original_name or self.file.name
+
+    def save(self, *args, **kwargs):
+        # Keep the name the file was uploaded under; the stored one is its hash
+        if self.file and not self.file._committed and not self.original_name:
+            self.original_name = os.path.basename(self.file.name)[:255]
+        super().save(*args, **kwargs)
+
+
+@receiver(post_delete, sender=UploadedFile)
+def release_uploaded_file_blob(sender, instance, **kwargs):
+    # Other uploads may share the file; the storage counts references
+    if instance.file:
+        transaction.on_commit(lambda: instance.file.delete(save=False))
+
+
+class ChatSession(models.Model):
+    """
+    The conversation of a user about one uploaded document.
+
+    Only the latest messages are sent to the model verbatim; older ones
+    are folded into `summary` by summarisation.chat.compact_session, so
+    the prompt stays the same size however long the conversation gets.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    uploaded_file = models.ForeignKey(UploadedFile, on_delete=models.CASCADE, related_name="chat_sessions")
+    summary = models.TextField(blank=True, default="")
+    # Set while a process compacts the session, so no other one does
+    compacting_since = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'uploaded_file'], name='unique_chat_per_file'),
+        ]
+
+    def __str__(self):
+        return f"Chat of {self.user} about {self.uploaded_file}"
+
+
+class ChatMessage(models.Model):
+    ROLE_CHOICES = [('user', 'User'), ('assistant', 'Assistant')]
+
+    session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name="messages")
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+    content = models.TextField()
+    # Whether the message has been folded into the session summary
+    compacted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['session', 'compacted', 'id'], name='chat_message_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.role}: {self.content[:50]}"
@@ -0,0 +1,145 @@
+import logging
+import os
+import tempfile
+from collections import deque
+
+import pytesseract
+from django.conf import settings
+from pdf2image import convert_from_path
+
+from helpers.metrics import count_cache, stage_timer
+
+from .pool import in_pool, submit
+
+logger = logging.getLogger(__name__)
+
+
+def needs_ocr(text: str) -> bool:
+    """Whether a page's text layer is missing, i.e. the page is a scan."""
+    return len(text.strip()) < settings.OCR_MIN_TEXT_CHARS
+
+def _cache_path(digest, page_number, dpi, lang):
+    return os.path.join(settings.OCR_CACHE_ROOT, digest[:2], digest, f"{dpi}-{lang}", f"{page_number}.txt")
+
+def _read_cached(digest, page_number, dpi, lang):
+    try:
+        with open(_cache_path(digest, page_number, dpi, lang), encoding='utf-8') as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+def _write_cached(digest, page_number, dpi, lang, text):
+    path = _cache_path(digest, page_number, dpi, lang)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    with os.fdopen(fd, 'w', encoding='utf-8') as tmp:
+        tmp.write(text)
+    os.replace(tmp_path, path)
+
+def _ocr_page(file_path: str, page_number: int, dpi: int, lang: str) -> str:
+    """
+        Rasterises one page of a PDF and reads its text with Tesseract.
+
+        Runs in the shared process pool; only the one page is rendered, so
+        memory stays bounded by a single page image.
+    """
+    images = convert_from_path(
+        file_path, dpi=dpi, first_page=page_number + 1, last_page=page_number + 1, grayscale=True
+    )
+    return "\n".join(pytesseract.image_to_string(image, lang=lang) for image in images)
+
+# Streamed pages are OCRed this many at a time, so memory stays bounded
+# while the scanned pages of a window are still read in parallel
+OCR_WINDOW_PAGES = 64
+
+
+def iter_ocr_missing_pages(file_path: str, pages, digest: str = None, max_workers: int = None):
+    """
+        Fills in the pages of a PDF that have no text layer by OCR, taking
+        the text of each page from an iterator and yielding it, or its OCR
+        text, in order. Pages are held back OCR_WINDOW_PAGES at a time.
+
+        Only pages for which needs_ocr() holds are rasterised, so a mixed
+        document pays for OCR on its scanned pages alone. Those pages are
+        OCRed in the shared process pool, or inline when this already is
+        one of its processes; results are cached per (document digest,
+        page, DPI, language), so a page is never OCRed twice. A page whose
+        OCR fails keeps its original text.
+
+        Args:
+            file_path (str): The path to the PDF file.
+            pages (iterable): The extracted text of each page.
+            digest (str): SHA-256 of the file; without it nothing is cached.
+            max_workers (int): Upper bound on pages OCRed at once. Defaults
+                to OCR_WORKERS.
+
+        Yields:
+            str: The text of each page, OCR text for scanned pages.
+    """
+    window = []
+    first = 0
+    for text in pages:
+        window.append(text)
+        if len(window) >= OCR_WINDOW_PAGES:
+            yield from _ocr_window(file_path, window, first, digest, max_workers)
+            first += len(window)
+            window = []
+    if window:
+        yield from _ocr_window(file_path, window, first, digest, max_workers)
+
+def _ocr_window(file_path, pages, first, digest, max_workers):
+    """OCRs the scanned pages among `pages`, pages `first` onwards of the PDF, in place."""
+    if not settings.OCR_ENABLED:
+        return pages
+    dpi, lang = settings.OCR_DPI, settings.OCR_LANG
+
+    todo = []
+    for index, text in enumerate(pages):
+        if not needs_ocr(text):
+            continue
+        number = first + index
+        cached = _read_cached(digest, number, dpi, lang) if digest else None
+        if digest:
+            count_cache("ocr", cached is not None)
+        if cached is None:
+            todo.append(number)
+        else:
+            pages[index] = cached
+    if not todo:
+        return pages
+
+    max_workers = min(max_workers or settings.OCR_WORKERS, len(todo))
+    logger.info(f"OCR of {len(todo)} of the {len(pages)} pages from page {first + 1} in {file_path}")
+
+    def record(number, text):
+        pages[number - first] = text
+        if digest:
+            _write_cached(digest, number, dpi, lang, text)
+
+    with stage_timer("ocr"):
+        if max_workers <= 1 or in_pool():
+            for number in todo:
+                try:
+                    record(number, _ocr_page(file_path, number, dpi, lang))
+                except Exception as e:
+                    logger.warning(f"OCR failed on page {number + 1} of {file_path}: {e}")
+            return pages
+
+        # At most max_workers pages are queued at once, leaving the rest
+        # of the shared pool to other documents
+        todo = deque(todo)
+        pending = deque()
+        try:
+            while todo or pending:
+                while todo and len(pending) < max_workers:
+                    number = todo.popleft()
+                    pending.append((number, submit(_ocr_page, file_path, number, dpi, lang)))
+                number, future = pending.popleft()
+                try:
+                    record(number, future.result())
+                except Exception as e:
+                    logger.warning(f"OCR failed on page {number + 1} of {file_path}: {e}")
+        finally:
+            for _, future in pending:
+                future.cancel()
+        return pages
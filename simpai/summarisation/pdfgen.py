@@ -3,14 +3,26 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, ListFlowable, ListItem
 from reportlab.lib.enums import TA_JUSTIFY
 from reportlab.lib import colors
+from functools import lru_cache
+import io
 import os
+import re
 
-def generate_pdf(summary, output_path):
-    # Ensure the output directory exists
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+from helpers.metrics import timed
+
+# Part of the artifact cache key of rendered PDFs; bump it whenever the
+# output of build_story or the styles change
+RENDERER_VERSION = 1
 
-    # Create a PDF document
-    doc = SimpleDocTemplate(output_path, pagesize=letter)
+# One pass over each line decides its kind from the prefix
+_LINE_RE = re.compile(r"(?P<heading2>##)|(?P<heading1>#)|(?P<bullet>[-*] )|(?P<numbered>1\. )")
+# **bold** spans; an unclosed ** bolds the rest of the line
+_BOLD_RE = re.compile(r"\*\*(.*?)(?:\*\*|$)")
+
+
+@lru_cache(maxsize=1)
+def _styles():
+    """Builds the report stylesheet once per process; it is only read afterwards."""
     styles = getSampleStyleSheet()
 
     # Modify existing styles for better formatting
@@ -54,99 +66,79 @@ def generate_pdf(summary, output_path):
         parent=styles['BodyText'],
         fontName='Helvetica-Bold',
     ))
+    return styles
 
-    story = []
+def _bold(text):
+    if '**' not in text:
+        return text
+    return _BOLD_RE.sub(r"<b>\1</b>", text)
 
-    # Add a title
-    title = Paragraph("Summary Report", styles['Title'])
-    story.append(title)
-    story.append(Spacer(1, 12))
+def build_story(summary, title="Summary Report"):
+    """
+    Turns the model's markdown-like summary into reportlab flowables.
 
-    # Split the summary into lines
-    lines = summary.split('\n')
+    Supports `#` and `##` headings, `-`/`*` bullets, `1.` numbered items
+    and **bold** spans; every other non-empty line is a paragraph.
+    """
+    styles = _styles()
+    story = [Paragraph(title, styles['Title']), Spacer(1, 12)]
 
-    # Process each line
     bullet_items = []  # Store list items temporarily
     numbered_items = []  # Store numbered list items temporarily
-    for line in lines:
+
+    def flush_lists():
+        nonlocal bullet_items, numbered_items
+        if bullet_items:
+            story.append(ListFlowable(bullet_items, bulletType='bullet'))
+            bullet_items = []
+        if numbered_items:
+            story.append(ListFlowable(numbered_items, bulletType='1'))
+            numbered_items = []
+
+    for line in summary.split('\n'):
         line = line.strip()
         if not line:
             continue  # Skip empty lines
 
-        if line.startswith('##'):
-            # Heading level 2
-            if bullet_items:
-                story.append(ListFlowable(bullet_items, bulletType='bullet'))
-                bullet_items = []
-            if numbered_items:
-                story.append(ListFlowable(numbered_items, bulletType='1'))
-                numbered_items = []
-            story.append(Paragraph(line.strip('#').strip(), styles['Heading2']))
+        match = _LINE_RE.match(line)
+        kind = match.lastgroup if match else None
+        if kind == 'heading2' or kind == 'heading1':
+            flush_lists()
+            style = styles['Heading2'] if kind == 'heading2' else styles['Heading1']
+            story.append(Paragraph(line.strip('#').strip(), style))
             story.append(Spacer(1, 6))
-        elif line.startswith('#'):
-            # Heading level 1
-            if bullet_items:
-                story.append(ListFlowable(bullet_items, bulletType='bullet'))
-                bullet_items = []
-            if numbered_items:
-                story.append(ListFlowable(numbered_items, bulletType='1'))
-                numbered_items = []
-            story.append(Paragraph(line.strip('#').strip(), styles['Heading1']))
-            story.append(Spacer(1, 6))
-        elif line.startswith('- ') or line.startswith('* '):
-            # Bullet points
-            bullet = line[2:].strip()  # Remove the bullet
-            # Handle bold text within bullet points
-            if '**' in bullet:
-                parts = bullet.split('**')
-                formatted_bullet = []
-                for i, part in enumerate(parts):
-                    if i % 2 == 1:  # Odd indices are bold text
-                        formatted_bullet.append(f"<b>{part}</b>")
-                    else:
-                        formatted_bullet.append(part)
-                bullet = ''.join(formatted_bullet)
-            bullet_items.append(ListItem(Paragraph(bullet, styles['BulletText'])))
-        elif line.startswith('1. '):
-            # Numbered lists
-            numbered_item = line[3:].strip()  # Remove the number
-            # Handle bold text within numbered items
-            if '**' in numbered_item:
-                parts = numbered_item.split('**')
-                formatted_numbered_item = []
-                for i, part in enumerate(parts):
-                    if i % 2 == 1:  # Odd indices are bold text
-                        formatted_numbered_item.append(f"<b>{part}</b>")
-                    else:
-                        formatted_numbered_item.append(part)
-                numbered_item = ''.join(formatted_numbered_item)
-            numbered_items.append(ListItem(Paragraph(numbered_item, styles['BulletText'])))
+        elif kind == 'bullet':
+            bullet_items.append(ListItem(Paragraph(_bold(line[2:].strip()), styles['BulletText'])))
+        elif kind == 'numbered':
+            numbered_items.append(ListItem(Paragraph(_bold(line[3:].strip()), styles['BulletText'])))
         else:
-            # Regular paragraphs
-            if bullet_items:
-                story.append(ListFlowable(bullet_items, bulletType='bullet'))
-                bullet_items = []
-            if numbered_items:
-                story.append(ListFlowable(numbered_items, bulletType='1'))
-                numbered_items = []
-            # Handle bold text within paragraphs
-            if '**' in line:
-                parts = line.split('**')
-                formatted_line = []
-                for i, part in enumerate(parts):
-                    if i % 2 == 1:  # Odd indices are bold text
-                        formatted_line.append(f"<b>{part}</b>")
-                    else:
-                        formatted_line.append(part)
-                line = ''.join(formatted_line)
-            story.append(Paragraph(line, styles['BodyText']))
+            flush_lists()
+            story.append(Paragraph(_bold(line), styles['BodyText']))
             story.append(Spacer(1, 6))
 
     # Ensure any remaining bullets or numbered items are added
-    if bullet_items:
-        story.append(ListFlowable(bullet_items, bulletType='bullet'))
-    if numbered_items:
-        story.append(ListFlowable(numbered_items, bulletType='1'))
+    flush_lists()
+    return story
+
+@timed("pdf_render")
+def render_pdf(summary) -> io.BytesIO:
+    """
+    Renders a summary as a PDF in memory.
+
+    Args:
+        summary (str): The summary text.
+
+    Returns:
+        io.BytesIO: The PDF, positioned at the start.
+    """
+    buffer = io.BytesIO()
+    SimpleDocTemplate(buffer, pagesize=letter).build(build_story(summary))
+    buffer.seek(0)
+    return buffer
 
-    # Build the PDF
-    doc.build(story)
\ No newline at end of file
+@timed("pdf_render")
+def generate_pdf(summary, output_path):
+    """Renders a summary as a PDF file at `output_path`."""
+    # Ensure the output directory exists
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    SimpleDocTemplate(output_path, pagesize=letter).build(build_story(summary))
@@ -0,0 +1,67 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Set in the pool's own processes
+_in_pool = False
+
+
+def _init_process():
+    global _in_pool
+    _in_pool = True
+    django.setup()
+
+def in_pool() -> bool:
+    """
+    Whether this is one of the pool's processes. Work that would use the
+    pool runs inline there instead, so pools never nest.
+    """
+    return _in_pool
+
+def process_pool() -> ProcessPoolExecutor:
+    """
+    The process pool, shared by everything in this worker, that extracts
+    documents, reads PDF page ranges and OCRs scanned pages.
+
+    Its processes start from a fork server rather than a fork of this one:
+    forking a process that is already running an event loop and threads
+    can leave the child stuck on a lock some thread held.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            context = multiprocessing.get_context("forkserver")
+            # The fork server sets Django up once, so the pool's processes
+            # start ready instead of each importing the project
+            context.set_forkserver_preload(["simpai.wsgi"])
+            _pool = ProcessPoolExecutor(
+                max_workers=max(settings.PDF_EXTRACT_WORKERS, settings.OCR_WORKERS),
+                mp_context=context,
+                initializer=_init_process,
+            )
+        return _pool
+
+def submit(fn, *args):
+    """
+    Submits `fn(*args)` to the shared pool, replacing the pool first if one
+    of its processes died (e.g. out of memory).
+
+    Returns:
+        concurrent.futures.Future: The call's future.
+    """
+    global _pool
+    pool = process_pool()
+    try:
+        return pool.submit(fn, *args)
+    except BrokenProcessPool:
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        return process_pool().submit(fn, *args)
@@ -0,0 +1,201 @@
+import gzip
+import heapq
+import json
+import math
+import os
+import re
+from bisect import bisect_right
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+
+from .chunking import chunk_text
+from .textstore import write_atomic
+from .vectors import VECTORS_FILENAME, VectorIndex, load_vector_index
+
+
+INDEX_VERSION = 1
+INDEX_FILENAME = f"bm25.v{INDEX_VERSION}.json.gz"
+
+# Constant of reciprocal rank fusion; damps the weight of the very top ranks.
+RRF_K = 60
+
+_TERM_RE = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how i if in into is it its of on or "
+    "that the their there this to was were what when where which who why will with you".split()
+)
+
+
+def tokenize(text: str) -> list:
+    """Lower-cases text and splits it into index terms, dropping stopwords."""
+    return [term for term in _TERM_RE.findall(text.lower()) if term not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Inverted index over the passages of one document, scored with Okapi BM25.
+
+    Passages are stored as (start, end) offsets into the document text;
+    `postings` maps each term to [passage_id, term_frequency] pairs.
+    """
+
+    k1 = 1.5
+    b = 0.75
+
+    def __init__(self, passages, lengths, postings, total_tokens):
+        self.passages = passages
+        self.lengths = lengths
+        self.postings = postings
+        self.total_tokens = total_tokens
+        self.avgdl = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+    @classmethod
+    def build(cls, text, passage_tokens, overlap_tokens=0):
+        passages = []
+        lengths = []
+        postings = {}
+        total_tokens = 0
+        for chunk in chunk_text(text, passage_tokens, overlap_tokens):
+            passage_id = len(passages)
+            terms = Counter(tokenize(chunk.text))
+            for term, frequency in terms.items():
+                postings.setdefault(term, []).append([passage_id, frequency])
+            passages.append([chunk.start, chunk.end])
+            lengths.append(sum(terms.values()))
+            total_tokens += chunk.tokens
+        return cls(passages, lengths, postings, total_tokens)
+
+    def to_dict(self):
+        return {
+            "passages": self.passages,
+            "lengths": self.lengths,
+            "postings": self.postings,
+            "total_tokens": self.total_tokens,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["passages"], data["lengths"], data["postings"], data["total_tokens"])
+
+    def search(self, query: str, k: int) -> list:
+        """
+        Returns up to `k` (passage_id, score) pairs for the passages that
+        best match `query`, best first.
+        """
+        count = len(self.passages)
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for passage_id, frequency in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[passage_id] / self.avgdl)
+                scores[passage_id] = scores.get(passage_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+@lru_cache(maxsize=32)
+def _load_index(path):
+    # Raises FileNotFoundError for missing indexes, which lru_cache does not
+    # remember, so an index built by another worker is picked up later.
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        return BM25Index.from_dict(json.load(file))
+
+def get_index(document) -> BM25Index:
+    """
+        Returns the BM25 index of a stored document, building and saving it
+        alongside the document's extracted text on first use.
+
+        Args:
+            document (StoredDocument): The document from the text store.
+
+        Returns:
+            BM25Index: The passage index for the document.
+    """
+    path = os.path.join(document.path, INDEX_FILENAME)
+    try:
+        return _load_index(path)
+    except FileNotFoundError:
+        pass
+    index = BM25Index.build(
+        document.text,
+        settings.RETRIEVAL_PASSAGE_TOKENS,
+        settings.RETRIEVAL_PASSAGE_OVERLAP,
+    )
+    write_atomic(path, gzip.compress(json.dumps(index.to_dict()).encode('utf-8')))
+    return index
+
+def get_vector_index(document, index: BM25Index) -> VectorIndex:
+    """
+        Returns the dense vector index of a stored document, embedding the
+        passages of its BM25 index on first use. Row `i` of the vectors is
+        passage `i` of `index`.
+    """
+    path = os.path.join(document.path, VECTORS_FILENAME)
+    try:
+        return load_vector_index(path)
+    except FileNotFoundError:
+        pass
+    text = document.text
+    VectorIndex.build(path, [tokenize(text[start:end]) for start, end in index.passages])
+    return load_vector_index(path)
+
+def search_passages(document, question: str, k: int) -> list:
+    """
+        Returns the ids of the `k` passages that best match a question.
+
+        Lexical (BM25) and, when RETRIEVAL_DENSE is on, semantic (vector)
+        rankings are merged with reciprocal rank fusion, so a passage that
+        ranks well in either list is kept.
+    """
+    index = get_index(document)
+    rankings = [index.search(question, k * 2)]
+    if settings.RETRIEVAL_DENSE:
+        rankings.append(get_vector_index(document, index).search(tokenize(question), k * 2))
+
+    fused = {}
+    for ranking in rankings:
+        for rank, (passage_id, _) in enumerate(ranking):
+            fused[passage_id] = fused.get(passage_id, 0.0) + 1.0 / (RRF_K + rank)
+    return heapq.nlargest(k, fused, key=fused.get)
+
+def format_passages(document, passage_spans) -> str:
+    """
+        Joins passages into a prompt context, in document order, each
+        labelled with the page it starts on.
+    """
+    sections = []
+    for start, end in sorted(passage_spans):
+        page = bisect_right(document.page_offsets, start)
+        sections.append(f"[Page {page}]\n{document.text[start:end]}")
+    return "\n\n".join(sections)
+
+def build_context(document, question: str, k: int = None) -> str:
+    """
+        Returns the document text to send to the model for a question.
+
+        Short documents are sent whole. For longer ones only the `k`
+        passages that best match the question are sent.
+
+        Args:
+            document (StoredDocument): The document from the text store.
+            question (str): The user's question.
+            k (int): Number of passages to send. Defaults to RETRIEVAL_TOP_K.
+
+        Returns:
+            str: The text to put in the prompt.
+    """
+    if k is None:
+        k = settings.RETRIEVAL_TOP_K
+    index = get_index(document)
+    if index.total_tokens <= settings.RETRIEVAL_FULL_TEXT_TOKENS:
+        return document.text
+
+    passage_ids = search_passages(document, question, k)
+    if not passage_ids:
+        # Nothing in the question matched: fall back to the opening passages.
+        passage_ids = range(min(k, len(index.passages)))
+    return format_passages(document, [index.passages[passage_id] for passage_id in passage_ids])
@@ -1,7 +1,20 @@
 from rest_framework import serializers
-from summarisation.models import UploadedFile
+from summarisation.models import UploadedFile, ChatSession, ChatMessage
 
 class UploadedFileSerializer(serializers.ModelSerializer):
     class Meta:
         model = UploadedFile
-        fields = ['id', 'file', 'uploaded_at']
\ No newline at end of file
+        fields = ['id', 'file', 'original_name', 'uploaded_at']
+        read_only_fields = ['original_name']
+
+class ChatMessageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChatMessage
+        fields = ['role', 'content', 'created_at']
+
+class ChatSessionSerializer(serializers.ModelSerializer):
+    messages = ChatMessageSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ChatSession
+        fields = ['id', 'summary', 'messages', 'created_at', 'updated_at']
@@ -0,0 +1,181 @@
+import asyncio
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+
+from .chunking import estimate_tokens
+
+
+REDUCE_INSTRUCTION = (
+    "The following are summaries of consecutive sections of one document, in order. "
+    "Merge them into a single coherent summary without repeating points."
+)
+
+
+def imap_ordered(func, items, max_workers):
+    """
+    Applies `func` to every item on a thread pool and yields the results
+    in input order, each as soon as it and all before it are done.
+
+    Items are pulled from `items` lazily, with at most twice `max_workers`
+    calls queued at once, so a streamed input is never fully buffered. If
+    any call fails, or the caller stops iterating, the queued calls are
+    cancelled.
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = deque()
+    try:
+        for item in items:
+            # Each call sees the caller's context (e.g. its metrics label),
+            # as it would on a thread of sync_to_async
+            pending.append(executor.submit(contextvars.copy_context().run, func, item))
+            if len(pending) >= max_workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    except BaseException:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+
+def map_ordered(func, items, max_workers):
+    """Like imap_ordered, but returns all the results as a list."""
+    return list(imap_ordered(func, items, max_workers))
+
+def _group_within_budget(texts, max_tokens):
+    """Groups consecutive texts so each group fits in `max_tokens`."""
+    groups = []
+    current = []
+    current_tokens = 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if current and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current = []
+            current_tokens = 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+def _next_level(summaries, max_tokens):
+    """Groups the summaries of one level for the reduce calls of the next."""
+    groups = _group_within_budget(summaries, max_tokens)
+    if len(groups) == len(summaries):
+        # Every summary fills the budget on its own; pair them up so
+        # each level still halves the number of summaries.
+        groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+    return groups
+
+def _reduce_input(group, prompt):
+    return f"{REDUCE_INSTRUCTION} {prompt}\n\n" + "\n\n".join(group)
+
+def _reduce(group, summarize, prompt):
+    if len(group) == 1:
+        return group[0]
+    return summarize(_reduce_input(group, prompt))
+
+def map_reduce_summarize(chunks, summarize, prompt, max_tokens, max_workers):
+    """
+    Summarises a document chunk by chunk, then merges the partial summaries.
+
+    The map step summarises every chunk concurrently, with at most
+    `max_workers` calls in flight. Partial summaries are merged with one
+    reduce call when they fit in `max_tokens` together; otherwise they are
+    merged in consecutive groups that do, level by level, until a single
+    summary remains. Grouping only ever joins neighbouring summaries, so
+    the output follows document order regardless of completion order.
+
+    Args:
+        chunks (iterable): The chunk texts, in document order.
+        summarize (callable): Sends one user message to the model and
+            returns its reply.
+        prompt (str): The summarisation instruction.
+        max_tokens (int): Token budget of a single reduce input.
+        max_workers (int): The maximum number of concurrent calls.
+
+    Returns:
+        str: The summary of the whole document.
+    """
+    summaries = map_ordered(lambda chunk: summarize(f"{prompt}\n{chunk}"), chunks, max_workers)
+    if not summaries:
+        return ""
+
+    while len(summaries) > 1:
+        groups = _next_level(summaries, max_tokens)
+        summaries = map_ordered(lambda group: _reduce(group, summarize, prompt), groups, max_workers)
+
+    return summaries[0]
+
+
+async def _aiter_in_thread(items):
+    """
+    Pulls items from a blocking iterator on a worker thread. The iterator
+    must not use the ORM: it runs on the executor's threads, not the one
+    thread sync_to_async keeps for database work.
+    """
+    iterator = iter(items)
+    done = object()
+    next_item = sync_to_async(next, thread_sensitive=False)
+    while (item := await next_item(iterator, done)) is not done:
+        yield item
+
+async def aimap_ordered(func, items, max_workers):
+    """
+    Async counterpart of imap_ordered: awaits the coroutine function `func`
+    on every item of the async iterable `items`, with at most
+    `max_workers` calls running at once, and yields the results in input
+    order.
+    """
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def call(item):
+        async with semaphore:
+            return await func(item)
+
+    pending = deque()
+    try:
+        async for item in items:
+            pending.append(asyncio.create_task(call(item)))
+            if len(pending) >= max_workers * 2:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def amap_ordered(func, items, max_workers):
+    """
+    Async counterpart of map_ordered: awaits the coroutine function `func`
+    on every item, with at most `max_workers` calls running at once, and
+    returns the results in input order.
+
+    `items` is a blocking iterable and is pulled on a worker thread, so
+    reading and chunking a document does not hold up the event loop.
+    """
+    return [result async for result in aimap_ordered(func, _aiter_in_thread(items), max_workers)]
+
+async def _areduce(group, summarize, prompt):
+    if len(group) == 1:
+        return group[0]
+    return await summarize(_reduce_input(group, prompt))
+
+async def amap_reduce_summarize(chunks, summarize, prompt, max_tokens, max_workers):
+    """
+    Async counterpart of map_reduce_summarize, where `summarize` is a
+    coroutine function. Model calls run concurrently on the event loop
+    instead of on a thread pool.
+    """
+    summaries = await amap_ordered(lambda chunk: summarize(f"{prompt}\n{chunk}"), chunks, max_workers)
+    if not summaries:
+        return ""
+
+    while len(summaries) > 1:
+        groups = _next_level(summaries, max_tokens)
+        summaries = await amap_ordered(lambda group: _areduce(group, summarize, prompt), groups, max_workers)
+
+    return summaries[0]
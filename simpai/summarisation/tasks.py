@@ -0,0 +1,109 @@
+import uuid
+
+from asgiref.sync import async_to_sync
+
+from jobs.queue import PermanentJobError, register
+
+from .artifacts import artifact_key, read_artifact, store_artifact
+from .chat import compact_session
+from .models import UploadedFile
+from .pdfgen import RENDERER_VERSION, render_pdf
+from .textstore import get_document
+from .tts import save_speech
+from .utils import prompt_key_or_default, summarize_pages
+
+
+def _uploaded_file(job):
+    try:
+        return UploadedFile.objects.get(id=job.payload["file_id"], user_id=job.user_id)
+    except UploadedFile.DoesNotExist:
+        raise PermanentJobError("File not found or access denied.")
+
+def _pages_with_progress(job, document, start, end, message):
+    """
+    Yields the document's pages, moving the job's progress from `start`
+    towards `end` as the summariser pulls them.
+    """
+    page_count = max(document.page_count, 1)
+    for page_number, text in document.iter_pages():
+        job.set_progress(start + (end - start) * (page_number + 1) / page_count, message)
+        yield page_number, text
+
+def _summary_pdf(job, document, prompt_key):
+    """
+    Returns the summary PDF of a document as bytes: the one SummarizeView
+    or an earlier job stored for the same content and prompt, or a freshly
+    rendered one, which is stored for them in turn.
+    """
+    key = artifact_key(document.digest, "summary_pdf", prompt_key, RENDERER_VERSION)
+    pdf = read_artifact(key, ".pdf")
+    if pdf is not None:
+        return pdf
+
+    pages = _pages_with_progress(job, document, 0.05, 0.85, "Summarising")
+    summary = summarize_pages(pages, prompt_key)
+
+    job.set_progress(0.9, "Building PDF")
+    pdf = render_pdf(summary).getvalue()
+    store_artifact(key, ".pdf", pdf)
+    return pdf
+
+@register("summarize")
+def summarize_document(job):
+    """
+    Summarises an uploaded document into a PDF.
+
+    Payload:
+        file_id (int): The UploadedFile to summarise.
+        prompt_key (str): The summarisation prompt. Defaults to simple_summary.
+    """
+    uploaded_file = _uploaded_file(job)
+    job.set_progress(0.0, "Extracting text")
+    document = get_document(uploaded_file.file.path)
+
+    pdf = _summary_pdf(job, document, prompt_key_or_default(job.payload.get("prompt_key")))
+    with open(job.result_path("summary.pdf"), 'wb') as file:
+        file.write(pdf)
+    return {"file": "summary.pdf", "filename": f"{uuid.uuid4()}_summary.pdf", "content_type": "application/pdf"}
+
+@register("audio")
+def generate_audio(job):
+    """
+    Reads an uploaded document, or its summary, out as an MP3.
+
+    Payload:
+        file_id (int): The UploadedFile to read.
+        source (str): "original" (default) or "summary".
+        prompt_key (str): The summarisation prompt, for summary audio.
+    """
+    uploaded_file = _uploaded_file(job)
+    job.set_progress(0.0, "Extracting text")
+    document = get_document(uploaded_file.file.path)
+
+    source = job.payload.get("source", "original")
+    if source == "summary":
+        pages = _pages_with_progress(job, document, 0.05, 0.6, "Summarising")
+        text = summarize_pages(pages, job.payload.get("prompt_key", "simple_summary"))
+    else:
+        text = document.text
+    if not text.strip():
+        raise PermanentJobError("There is no text to read out.")
+
+    job.set_progress(0.7, "Generating audio")
+    save_speech(
+        text,
+        job.result_path("audio.mp3"),
+        lambda done, total: job.set_progress(0.7 + 0.3 * done / total, "Generating audio"),
+    )
+    return {"file": "audio.mp3", "filename": f"{source}_audio.mp3", "content_type": "audio/mpeg"}
+
+@register("compact_chat")
+def compact_chat(job):
+    """
+    Folds the older messages of a chat session into its summary (see
+    chat.compact_session).
+
+    Payload:
+        session_id (int): The ChatSession to compact.
+    """
+    return {"compacted": async_to_sync(compact_session)(job.payload["session_id"])}
@@ -1,3 +1,64 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from helpers.http import conditional_file_response
+from summarisation import artifacts, chunking
+from summarisation.artifacts import read_artifact, store_artifact
+from summarisation.chunking import chunk_text, iter_chunks
+
+
+class IterChunksTests(SimpleTestCase):
+    def sparse_text(self, size):
+        # Far more than eight characters per estimated token, like a
+        # tab-separated export or a padded PDF page
+        row = "\t".join(f"{i:02d}" + " " * 30 for i in range(8)) + ".\n"
+        return row * (size // len(row))
+
+    def test_sparse_pages_match_chunk_text(self):
+        text = self.sparse_text(200_000)
+        pages = [text[i:i + 1024] for i in range(0, len(text), 1024)]
+        self.assertEqual(list(iter_chunks(pages, 1000)), chunk_text(text, 1000))
+
+    def test_sparse_pages_are_scanned_a_bounded_number_of_times(self):
+        text = self.sparse_text(400_000)
+        pages = [text[i:i + 1024] for i in range(0, len(text), 1024)]
+        scanned = []
+        original = chunking._iter_text_chunks
+
+        def counting(buffer, *args):
+            scanned.append(len(buffer))
+            return original(buffer, *args)
+
+        with mock.patch.object(chunking, "_iter_text_chunks", counting):
+            list(iter_chunks(pages, 1000))
+        self.assertLessEqual(sum(scanned), 3 * len(text))
+
+
+class EvictedArtifactTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        settings = override_settings(ARTIFACTS_ROOT=root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.path = store_artifact("ab" * 32, ".pdf", b"%PDF-summary")
+
+    def test_eviction_after_lookup_is_a_miss(self):
+        os.remove(self.path)
+        with mock.patch.object(artifacts, "get_artifact", return_value=self.path):
+            self.assertIsNone(read_artifact("ab" * 32, ".pdf"))
+
+    def test_missing_file_raises_before_responding(self):
+        os.remove(self.path)
+        with self.assertRaises(FileNotFoundError):
+            conditional_file_response(RequestFactory().get("/"), self.path, "application/pdf")
+
+    def test_eviction_after_responding_still_sends_the_file(self):
+        response = conditional_file_response(RequestFactory().get("/"), self.path, "application/pdf")
+        os.remove(self.path)
+        self.assertEqual(b"".join(response.streaming_content), b"%PDF-summary")
+        response.close()
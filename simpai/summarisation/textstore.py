@@ -0,0 +1,219 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from functools import lru_cache
+
+from django.conf import settings
+
+from blobs.storage import blob_digest
+from helpers.metrics import count_cache
+
+from .extractors import EXTRACTION_VERSION
+from .utils import iter_pages
+
+
+TEXT_FILENAME = "text.gz"
+INDEX_FILENAME = "pages.json"
+# Longest piece of a page iter_pages hands out at once, in characters
+PAGE_SLICE_CHARS = 64 * 1024
+
+
+@lru_cache(maxsize=256)
+def _hash_file(file_path, size, mtime_ns, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def file_sha256(file_path: str) -> str:
+    """
+        Returns the SHA-256 hex digest of a file's bytes.
+
+        Digests are memoised per (path, size, mtime) so repeated requests
+        against the same upload only read it once per process.
+
+        Args:
+            file_path (str): The path to the file.
+
+        Returns:
+            str: The hex digest of the file contents.
+    """
+    # Blobs are named after their digest, computed when they were uploaded
+    digest = blob_digest(file_path)
+    if digest:
+        return digest
+    stat = os.stat(file_path)
+    return _hash_file(file_path, stat.st_size, stat.st_mtime_ns)
+
+def document_dir(digest: str) -> str:
+    """
+        Returns the directory holding the stored text (and any other
+        derived data) for the document with the given digest, as
+        extracted by the current EXTRACTION_VERSION.
+    """
+    return os.path.join(settings.TEXTSTORE_ROOT, f"v{EXTRACTION_VERSION}", digest[:2], digest)
+
+def write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class StoredDocument:
+    """
+    Extracted text of one document, as kept in the text store.
+
+    `page_offsets` holds the start offset of every page in `text`, plus a
+    final entry equal to `len(text)`, so page `n` is
+    `text[page_offsets[n]:page_offsets[n + 1]]`.
+    """
+
+    def __init__(self, digest, page_offsets):
+        self.digest = digest
+        self.page_offsets = page_offsets
+        self._text = None
+
+    @property
+    def path(self):
+        return document_dir(self.digest)
+
+    @property
+    def page_count(self):
+        return len(self.page_offsets) - 1
+
+    @property
+    def text(self):
+        if self._text is None:
+            with self._open_text() as file:
+                self._text = file.read()
+        return self._text
+
+    def _open_text(self):
+        return gzip.open(os.path.join(self.path, TEXT_FILENAME), 'rt', encoding='utf-8', newline='')
+
+    def iter_pages(self, slice_chars=PAGE_SLICE_CHARS):
+        """
+        Yields (page_number, text) for every page, decompressing the
+        stored text incrementally instead of loading all of it.
+
+        Pages longer than `slice_chars`, such as the single page of a text
+        or DOCX file, come in several slices that share the page number,
+        so memory stays bounded whatever the size of the document.
+        """
+        if self._text is not None:
+            for number in range(self.page_count):
+                start, end = self.page_offsets[number], self.page_offsets[number + 1]
+                while True:
+                    yield number, self.text[start:min(start + slice_chars, end)]
+                    start += slice_chars
+                    if start >= end:
+                        break
+            return
+        with self._open_text() as file:
+            for number in range(self.page_count):
+                remaining = self.page_offsets[number + 1] - self.page_offsets[number]
+                while True:
+                    text = file.read(min(remaining, slice_chars))
+                    remaining -= len(text)
+                    yield number, text
+                    if not remaining or not text:
+                        break
+
+    def page(self, number):
+        """Returns the text of page `number` (zero-based)."""
+        return self.text[self.page_offsets[number]:self.page_offsets[number + 1]]
+
+
+def load_document(digest: str):
+    """
+        Loads a document from the text store.
+
+        Returns:
+            StoredDocument | None: The stored document, or None if the
+            digest has not been stored yet.
+    """
+    try:
+        with open(os.path.join(document_dir(digest), INDEX_FILENAME)) as file:
+            index = json.load(file)
+    except FileNotFoundError:
+        return None
+    return StoredDocument(digest, index["page_offsets"])
+
+def store_document(digest: str, pages) -> StoredDocument:
+    """
+        Compresses and stores the extracted pages of a document.
+
+        Text is compressed as it arrives, so `pages` can be a lazy
+        iterator and a page can arrive in pieces: peak memory does not
+        grow with the document. The text is written before the page
+        index, and both are moved into place atomically, so a document is
+        only visible to other workers once it is complete.
+
+        Args:
+            digest (str): The SHA-256 hex digest of the source file.
+            pages (iterable): (page_number, text) pairs in page order, as
+                yielded by utils.iter_pages; consecutive pieces of a page
+                share its number.
+    """
+    path = document_dir(digest)
+    os.makedirs(path, exist_ok=True)
+
+    page_offsets = [0]
+    fd, tmp_path = tempfile.mkstemp(dir=path, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            with gzip.open(raw, 'wt', encoding='utf-8', newline='', compresslevel=6) as file:
+                for number, text in pages:
+                    # Page `number` ends at page_offsets[number + 1]
+                    while len(page_offsets) < number + 2:
+                        page_offsets.append(page_offsets[-1])
+                    file.write(text)
+                    page_offsets[-1] += len(text)
+        os.replace(tmp_path, os.path.join(path, TEXT_FILENAME))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    write_atomic(os.path.join(path, INDEX_FILENAME), json.dumps({"page_offsets": page_offsets}).encode('utf-8'))
+    return StoredDocument(digest, page_offsets)
+
+def get_document(file_path: str) -> StoredDocument:
+    """
+        Returns the stored text of a file, extracting and storing it on
+        first use.
+
+        Args:
+            file_path (str): The path to the uploaded file.
+
+        Returns:
+            StoredDocument: The stored document for the file's contents.
+    """
+    digest = file_sha256(file_path)
+    document = load_document(digest)
+    count_cache("textstore", document is not None)
+    if document is None:
+        document = store_document(digest, iter_pages(file_path, digest))
+    return document
+
+def get_document_text(file_path: str) -> str:
+    """
+        Returns the extracted text of a file, reading it from the text
+        store instead of re-parsing the file whenever possible.
+
+        Args:
+            file_path (str): The path to the uploaded file.
+
+        Returns:
+            str: The extracted text from the file.
+    """
+    return get_document(file_path).text
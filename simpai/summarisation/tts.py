@@ -0,0 +1,151 @@
+import io
+import os
+import re
+import tempfile
+import textwrap
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+from gtts import gTTS
+
+from helpers.metrics import timed
+
+from .summarizer import aimap_ordered, imap_ordered
+
+# Part of the artifact cache key of generated audio; bump it whenever the
+# segmentation or a backend's output changes
+TTS_VERSION = 2
+
+# A sentence ends at . ! or ? followed by whitespace, or at a line break
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+|\s*\n\s*")
+
+
+class GTTSBackend:
+    """
+    Google Translate text-to-speech through gTTS.
+
+    A backend turns one segment of text into a complete MP3. It is called
+    from several threads at once, so it must not keep per-call state.
+    """
+
+    def __init__(self, lang='en'):
+        self.lang = lang
+
+    def synthesize(self, text) -> bytes:
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=self.lang).write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    """Returns the TTS_BACKEND instance of this process."""
+    return import_string(settings.TTS_BACKEND)()
+
+def audio_version():
+    """The version part of artifact keys for audio from the current backend."""
+    return f"{TTS_VERSION}:{settings.TTS_BACKEND}"
+
+@timed("tts")
+def synthesize(text) -> bytes:
+    """Synthesises one segment with the configured backend."""
+    return get_backend().synthesize(text)
+
+def split_segments(text, max_chars=None):
+    """
+    Splits text into segments of whole sentences, each at most `max_chars`
+    long (TTS_SEGMENT_CHARS by default). A sentence longer than that is cut
+    at word boundaries.
+
+    Args:
+        text (str): The text to read out.
+        max_chars (int): The longest segment.
+
+    Returns:
+        list: The segments, in reading order.
+    """
+    max_chars = max_chars or settings.TTS_SEGMENT_CHARS
+    segments = []
+    current = ""
+    for sentence in _SENTENCE_END_RE.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if current and len(current) + 1 + len(sentence) <= max_chars:
+            current = f"{current} {sentence}"
+            continue
+        if current:
+            segments.append(current)
+        if len(sentence) <= max_chars:
+            current = sentence
+        else:
+            *pieces, current = textwrap.wrap(sentence, max_chars)
+            segments.extend(pieces)
+    if current:
+        segments.append(current)
+    return segments
+
+def iter_speech(text, max_workers=None):
+    """
+    Synthesises text segment by segment, with up to `max_workers`
+    segments (TTS_MAX_CONCURRENCY by default) in flight at once.
+
+    MP3 is a sequence of self-contained frames, so the segments' MP3s
+    concatenate into one playable file; gTTS joins its own requests the
+    same way.
+
+    Yields:
+        bytes: Each segment's MP3, in reading order.
+    """
+    return imap_ordered(synthesize, split_segments(text), max_workers or settings.TTS_MAX_CONCURRENCY)
+
+async def aiter_speech(text, max_workers=None):
+    """
+    Async counterpart of iter_speech. The blocking backend calls run on
+    worker threads.
+
+    Yields:
+        bytes: Each segment's MP3, in reading order.
+    """
+    synthesize_async = sync_to_async(synthesize, thread_sensitive=False)
+
+    async def segments():
+        for segment in split_segments(text):
+            yield segment
+
+    async for audio in aimap_ordered(synthesize_async, segments(), max_workers or settings.TTS_MAX_CONCURRENCY):
+        yield audio
+
+def save_speech(text, path, on_segment=None):
+    """
+    Synthesises text into the MP3 file at `path`.
+
+    The file is written under a temporary name and renamed once complete,
+    so concurrent calls never see or overwrite each other's partial files.
+
+    Args:
+        text (str): The text to read out.
+        path (str): Where to write the MP3.
+        on_segment (callable): Called as `on_segment(done, total)` after
+            each segment is written.
+
+    Returns:
+        str: `path`.
+    """
+    segments = split_segments(text)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            audio = imap_ordered(synthesize, segments, settings.TTS_MAX_CONCURRENCY)
+            for done, data in enumerate(audio, start=1):
+                tmp.write(data)
+                if on_segment:
+                    on_segment(done, len(segments))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
@@ -1,198 +1,368 @@
 from PyPDF2 import PdfReader
-from openai import OpenAI
-from decouple import config
-from gtts import gTTS
-import os
+import io
+import logging
+import shutil
+import subprocess
 from django.conf import settings
-from decouple import config
-from docx import Document
+from blobs.storage import blob_digest
+from helpers.llm import achat_completion, chat_completion
+from helpers.metrics import timed_iter
+from collections import deque
+from contextlib import nullcontext
+from functools import lru_cache
+from .chunking import DEFAULT_MAX_TOKENS, iter_chunks
+from .docxtext import iter_docx_text
+from .extractors import get_extractor, register_extractor
+from .summarizer import amap_reduce_summarize, map_reduce_summarize
+from .ocr import iter_ocr_missing_pages
+from .pool import in_pool, submit
 
+logger = logging.getLogger(__name__)
 
 SUMMARIZATION_PROMPTS = {
     "professional_audience": "Condense this text into a summary suitable for a professional audience, retaining technical details.",
     "qa_format": "Summarize this document in a Q&A format with the most critical questions answered concisely.",
     "simple_summary": "Provide a simple and concise summary of this document.",
 }
+DEFAULT_PROMPT_KEY = "simple_summary"
 
 
-def split_text_into_chunks(text, max_tokens=60000):
+def prompt_key_or_default(prompt_key):
     """
-    Splits the text into chunks that fit within the token limit.
+    Returns `prompt_key` if it names a summarisation prompt, or the
+    default prompt's key, which is what an unknown key summarises with.
+    Cache keys are built from the result, so arbitrary strings cannot
+    fill the caches with copies of the same summary.
+    """
+    return prompt_key if prompt_key in SUMMARIZATION_PROMPTS else DEFAULT_PROMPT_KEY
 
-    Args:
-        text (str): The text to split.
-        max_tokens (int): The maximum number of tokens per chunk.
 
-    Returns:
-        list: A list of text chunks.
+def _extract_pdf_page_range(file_path: str, start: int, stop: int) -> list:
+    """
+        Extracts the text of pages `start` to `stop` (exclusive) of a PDF.
+
+        Runs inside extraction pool workers, so it opens its own reader.
+    """
+    with open(file_path, 'rb') as file:
+        reader = PdfReader(file)
+        return [reader.pages[number].extract_text() or "" for number in range(start, stop)]
+
+# Parallel PyPDF2 extraction hands workers at most this many pages at once
+PDF_RANGE_MAX_PAGES = 64
+
+def _split_page_ranges(page_count: int, parts: int, max_size: int = PDF_RANGE_MAX_PAGES) -> list:
+    step = min(-(-page_count // parts), max_size)
+    return [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
+def _iter_text_layer_pypdf2(file_path: str, max_workers: int):
+    with open(file_path, 'rb') as file:
+        page_count = len(PdfReader(file).pages)
+
+    # In a pool process (a batch extracting documents side by side) the
+    # pages are read inline rather than from a nested pool
+    if max_workers <= 1 or page_count < settings.PDF_EXTRACT_PARALLEL_MIN_PAGES or in_pool():
+        yield from _iter_pages_pypdf2(file_path)
+        return
+
+    # A few ranges per worker keeps the pool busy when page costs vary.
+    # At most two ranges per worker are queued at once, so pages of a long
+    # document do not pile up ahead of the consumer
+    ranges = _split_page_ranges(page_count, max_workers * 2)
+    pending = deque()
+    try:
+        for start, stop in ranges:
+            pending.append(submit(_extract_pdf_page_range, file_path, start, stop))
+            if len(pending) >= max_workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        # The pool is shared: only this document's queued ranges are dropped
+        for future in pending:
+            future.cancel()
+
+def _extract_text_layer_pypdf2(file_path: str, max_workers: int) -> list:
+    return list(_iter_text_layer_pypdf2(file_path, max_workers))
+
+def _iter_pages_pypdf2(file_path: str):
+    with open(file_path, 'rb') as file:
+        for page in PdfReader(file).pages:
+            yield page.extract_text() or ""
+
+def _iter_pages_pdftotext(file_path: str):
+    """
+        Streams the pages of a PDF out of poppler's pdftotext, which
+        separates pages with form feeds.
+
+        Raises:
+            subprocess.CalledProcessError: If pdftotext fails, e.g. on a
+                damaged or encrypted file.
+    """
+    process = subprocess.Popen(
+        [_pdftotext_path(), "-q", "-enc", "UTF-8", "-eol", "unix", file_path, "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    try:
+        output = io.TextIOWrapper(process.stdout, encoding='utf-8', errors='replace', newline='')
+        rest = ""
+        for block in iter(lambda: output.read(64 * 1024), ""):
+            *pages, rest = (rest + block).split("\f")
+            yield from pages
+        # Text after the last form feed would be a page pdftotext never
+        # finished; there is normally none
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, "pdftotext")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+
+@lru_cache(maxsize=None)
+def _pdftotext_path():
+    return shutil.which("pdftotext")
+
+def pdf_engine() -> str:
     """
-    words = text.split()
-    chunks = []
-    current_chunk = []
+        Returns the engine that extracts the text layer of PDFs.
+
+        PDF_TEXT_ENGINE names it, or is "auto" to use poppler's pdftotext
+        (several times faster than PyPDF2 and better at reading order)
+        when it is installed. In "auto" mode a document pdftotext cannot
+        read is retried with PyPDF2.
 
-    for word in words:
-        current_chunk.append(word)
-        if len(" ".join(current_chunk)) > max_tokens:
-            chunks.append(" ".join(current_chunk))
-            current_chunk = []
+        Returns:
+            str: "pdftotext" or "pypdf2".
+    """
+    engine = settings.PDF_TEXT_ENGINE
+    if engine == "auto":
+        return "pdftotext" if _pdftotext_path() else "pypdf2"
+    if engine not in PDF_ENGINES:
+        raise ValueError(f"Unknown PDF_TEXT_ENGINE {engine!r}.")
+    if engine == "pdftotext" and not _pdftotext_path():
+        raise ValueError("PDF_TEXT_ENGINE is pdftotext, but pdftotext is not installed.")
+    return engine
 
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
+def _iter_text_layer(file_path: str, max_workers: int):
+    engine = pdf_engine()
+    if engine == "pdftotext":
+        started = False
+        try:
+            for text in _iter_pages_pdftotext(file_path):
+                started = True
+                yield text
+            return
+        except (OSError, subprocess.SubprocessError) as e:
+            # Only a document that failed before its first page can still
+            # be read from the start by PyPDF2
+            if started or settings.PDF_TEXT_ENGINE != "auto":
+                raise
+            logger.warning(f"pdftotext could not read {file_path}, falling back to PyPDF2: {e}")
+    yield from _iter_text_layer_pypdf2(file_path, max_workers)
 
-    return chunks
+# Page-by-page readers of each engine PDF_TEXT_ENGINE can name
+PDF_ENGINES = {
+    "pdftotext": _iter_pages_pdftotext,
+    "pypdf2": _iter_pages_pypdf2,
+}
 
-def extract_text_from_pdf(file_path: str) -> str:
+def iter_pages_from_pdf(file_path: str, max_workers: int = None, digest: str = None):
     """
-        Extracts text from a given PDF file.
+        Yields the text of every page in a given PDF file as it is read,
+        so the document is never held in memory whole.
+
+        The text layer is read by the engine pdf_engine() picks. With
+        PyPDF2, documents with at least PDF_EXTRACT_PARALLEL_MIN_PAGES
+        pages are split into contiguous page ranges and read in the shared
+        process pool; smaller documents are read serially, where the pool
+        would cost more than it gains. Pages without a text layer (scans)
+        are then read by OCR.
 
         Args:
             file_path (str): The path to the PDF file.
+            max_workers (int): Upper bound on page ranges read at once.
+                Defaults to PDF_EXTRACT_WORKERS.
+            digest (str): SHA-256 of the file, under which OCR results
+                are cached.
 
-        Returns:
-            str: The extracted text from the PDF.
+        Yields:
+            tuple: (page_number, text) for each page, zero-based.
     """
+    if max_workers is None:
+        max_workers = settings.PDF_EXTRACT_WORKERS
 
     try:
-        with open(file_path, 'rb') as file:
-            reader = PdfReader(file)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text()
-            return text
+        pages = iter_ocr_missing_pages(file_path, _iter_text_layer(file_path, max_workers), digest)
+        yield from enumerate(pages)
     except Exception as e:
         raise ValueError(f"Failed to extract text from PDF: {e}")
-    
-def extract_text_from_docx(file_path: str) -> str:
+
+def iter_pages(file_path: str, digest: str = None):
+    """
+        Extracts text from a given file page by page, for the text store.
+
+        The extractor is chosen by the file's content (see
+        extractors.sniff), not its name.
+
+        Args:
+            file_path (str): The path to the file.
+            digest (str): SHA-256 of the file, if known; see
+                iter_pages_from_pdf.
+
+        Yields:
+            tuple: (page_number, text) for each page, or for each piece of
+                a page: an unpaginated document is one page, streamed as
+                the units its extractor reads.
+    """
+    try:
+        yield from get_extractor(file_path).iter_pages(file_path, digest)
+    except Exception as e:
+        raise ValueError(f"Failed to extract text from file: {e}")
+
+@register_extractor(
+    "pdf", ["application/pdf"], [".pdf"],
+    pages=lambda file_path, digest: iter_pages_from_pdf(file_path, digest=digest),
+)
+def iter_text_from_pdf(file_path: str):
     """
-        Extracts text from a given DOCX file.
+        Yields the text of a PDF one page at a time, OCR included: the
+        pages the text store gets from iter_pages_from_pdf.
+
+        Args:
+            file_path (str): The path to the PDF file.
+
+        Yields:
+            tuple: (page_number, text) for each page, zero-based.
+    """
+    # OCR results are cached under the digest, known without hashing for
+    # uploads kept as blobs
+    return iter_pages_from_pdf(file_path, digest=blob_digest(file_path))
+
+@register_extractor(
+    "docx", ["application/vnd.openxmlformats-officedocument.wordprocessingml.document"], [".docx"],
+)
+def iter_text_from_docx(file_path: str):
+    """
+        Yields the text of a DOCX one paragraph or table cell at a time,
+        streamed from the file (see docxtext.iter_docx_text).
 
         Args:
             file_path (str): The path to the DOCX file.
 
-        Returns:
-            str: The extracted text from the DOCX.
+        Yields:
+            tuple: (unit_number, text) for each paragraph or cell, zero-based.
     """
     try:
-        doc = Document(file_path)
-        text = ""
-        for para in doc.paragraphs:
-            text += para.text
-        return text
+        yield from iter_docx_text(file_path)
     except Exception as e:
         raise ValueError(f"Failed to extract text from DOCX: {e}")
 
-def extract_text(file_path: str) -> str:
+def iter_text(file_path: str):
     """
-        Extracts text from a given file.
+        Yields the text of a file one unit at a time (pages for PDF,
+        paragraphs for DOCX, blocks of lines or rows for text formats) so
+        callers never need the whole document in memory.
 
         Args:
             file_path (str): The path to the file.
 
-        Returns:
-            str: The extracted text from the file.
+        Yields:
+            tuple: (page_number, text) for each unit, zero-based.
     """
-    try:
-        if file_path.endswith(".pdf"):
-            return extract_text_from_pdf(file_path)
-        elif file_path.endswith(".docx"):
-            return extract_text_from_docx(file_path)
-        elif file_path.endswith(".txt"):
-            return extract_text_from_docx(file_path)
-        else:
-            raise ValueError("Unsupported file format. Only PDF and DOCX files are supported at the moment.")
-    except Exception as e:
-        raise ValueError(f"Failed to extract text from file: {e}")
+    return get_extractor(file_path).iterate(file_path)
+
+def _summarize_messages(content):
+    return [
+        {"role": "system", "content": "You are a helpful assistant that summarizes text."},
+        {"role": "user", "content": content},
+    ]
 
-def summarize_text(text, prompt_key="simple_summary", max_tokens=60000):
+def summarize_pages(pages, prompt_key="simple_summary", max_tokens=DEFAULT_MAX_TOKENS, max_workers=None, use_cache=True):
     """
-    Summarizes the given text using the DeepSeek API.
+    Summarizes a stream of document pages using the DeepSeek API.
+
+    Pages are chunked as they arrive and the chunks are summarised
+    concurrently, then merged into one summary (see map_reduce_summarize).
 
     Args:
-        text (str): The text to be summarized.
+        pages (iterable): (page_number, text) pairs, as yielded by iter_text.
         prompt_key (str): The key for the summarization prompt.
         max_tokens (int): The maximum number of tokens per chunk.
+        max_workers (int): The maximum number of concurrent API calls.
+            Defaults to SUMMARY_MAX_CONCURRENCY.
+        use_cache (bool): Whether to reuse cached replies for chunks that
+            were summarised before.
 
     Returns:
         str: The summarized text.
     """
+    if max_workers is None:
+        max_workers = settings.SUMMARY_MAX_CONCURRENCY
+
     try:
-        client = OpenAI(
-            api_key=config("DEEPSEEK_API_KEY"),
-            base_url="https://api.deepseek.com"
-        )
-        prompt = SUMMARIZATION_PROMPTS.get(prompt_key, SUMMARIZATION_PROMPTS["simple_summary"])
+        prompt = SUMMARIZATION_PROMPTS[prompt_key_or_default(prompt_key)]
+
+        def summarize(content):
+            return chat_completion(_summarize_messages(content), use_cache=use_cache).strip()
 
         # Split the text into chunks that fit within the token limit
-        chunks = split_text_into_chunks(text, max_tokens)
-
-        summaries = []
-        for chunk in chunks:
-            response = client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that summarizes text."},
-                    {"role": "user", "content": f"{prompt}\n{chunk}"},
-                ],
-                stream=False
-            )
-            summaries.append(response.choices[0].message.content.strip())
-
-        # Combine the summaries into a single summary
-        combined_summary = " ".join(summaries)
-        return combined_summary
+        chunks = timed_iter("chunking", (chunk.text for chunk in iter_chunks((text for _, text in pages), max_tokens)))
+
+        return map_reduce_summarize(chunks, summarize, prompt, max_tokens, max_workers)
 
     except Exception as e:
         raise ValueError(f"Failed to summarize text: {str(e)}")
-    
-def ask_question(text, custom_prompt):
-    try:
-        client = OpenAI(api_key=config("DEEPSEEK_API_KEY"), base_url="https://api.deepseek.com")
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that answers questions based on the provided text. If the question is unrelated to the text, respond with: 'This question is unrelated to the document or is not availbale in the document."},
-                {"role": "user", "content": f"Text:\n{text}\n\nQuestion:\n{custom_prompt}"},
-            ],
-            stream=False
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        return f"Error answering question: {str(e)}"
-    
-def text_to_speech(text, filename):
-    try:
-        tts = gTTS(text=text, lang='en')
-        audio_path = os.path.join(settings.MEDIA_ROOT, f"{filename}.mp3")
-        tts.save(audio_path)
-        return audio_path
-    except Exception as e:
-        raise ValueError(f"Failed to convert text to speech: {e}")
-    
 
-def gpt_chat(text, question):
+async def asummarize_pages(pages, prompt_key="simple_summary", max_tokens=DEFAULT_MAX_TOKENS, max_workers=None, use_cache=True, limit=None):
     """
-    Handles GPT-based chat interactions for user questions.
+    Async counterpart of summarize_pages, for async views.
+
+    Pages are read and chunked on a worker thread while the chunk
+    summaries are awaited concurrently on the event loop.
 
     Args:
-        text (str): The text or data context for the chat.
-        question (str): The user's question.
+        pages (iterable): (page_number, text) pairs, as yielded by iter_text.
+        prompt_key (str): The key for the summarization prompt.
+        max_tokens (int): The maximum number of tokens per chunk.
+        max_workers (int): The maximum number of concurrent API calls.
+            Defaults to SUMMARY_MAX_CONCURRENCY.
+        use_cache (bool): Whether to reuse cached replies for chunks that
+            were summarised before.
+        limit (asyncio.Semaphore): Shared with other summaries to bound
+            the API calls they make between them.
 
     Returns:
-        str: The GPT-generated response.
+        str: The summarized text.
     """
+    if max_workers is None:
+        max_workers = settings.SUMMARY_MAX_CONCURRENCY
+
     try:
-        client = OpenAI(
-            api_key=config("DEEPSEEK_API_KEY"),
-            base_url="https://api.deepseek.com"
-        )
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that answers questions based on the provided text. If the question is unrelated to the text, respond with: 'This question is unrelated to the document or is not available in the document.'"},
-                {"role": "user", "content": f"Text:\n{text}\n\nQuestion:\n{question}"},
-            ],
-            stream=False
-        )
-        return response.choices[0].message.content
+        prompt = SUMMARIZATION_PROMPTS[prompt_key_or_default(prompt_key)]
+
+        async def summarize(content):
+            async with limit or nullcontext():
+                return (await achat_completion(_summarize_messages(content), use_cache=use_cache)).strip()
+
+        chunks = timed_iter("chunking", (chunk.text for chunk in iter_chunks((text for _, text in pages), max_tokens)))
+
+        return await amap_reduce_summarize(chunks, summarize, prompt, max_tokens, max_workers)
+
     except Exception as e:
-        return f"Error answering question: {str(e)}"
\ No newline at end of file
+        raise ValueError(f"Failed to summarize text: {str(e)}")
+
+def _ask_question_messages(text, custom_prompt):
+    return [
+        {"role": "system", "content": "You are a helpful assistant that answers questions based on the provided text. If the question is unrelated to the text, respond with: 'This question is unrelated to the document or is not availbale in the document."},
+        {"role": "user", "content": f"Text:\n{text}\n\nQuestion:\n{custom_prompt}"},
+    ]
+
+async def aask_question(text, custom_prompt, use_cache=True):
+    """Answers a question about a document's text (see retrieval.build_context)."""
+    try:
+        return await achat_completion(_ask_question_messages(text, custom_prompt), use_cache=use_cache)
+    except Exception as e:
+        return f"Error answering question: {str(e)}"
+
+
+GPT_CHAT_SYSTEM_PROMPT = "You are a helpful assistant that answers questions based on the provided text. If the question is unrelated to the text, respond with: 'This question is unrelated to the document or is not available in the document.'"
@@ -0,0 +1,126 @@
+import os
+import tempfile
+import zlib
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+
+
+# Terms are hashed into N_FEATURES signed buckets and the resulting sparse
+# vector is reduced to DIMENSIONS with a fixed Gaussian random projection,
+# so embeddings need no model download and are identical in every process.
+N_FEATURES = 2 ** 14
+DIMENSIONS = 256
+PROJECTION_SEED = 20240601
+VECTORS_VERSION = 1
+VECTORS_FILENAME = f"vectors.v{VECTORS_VERSION}.npy"
+
+_FEATURE_MASK = N_FEATURES - 1
+_SIGN_BIT = 1 << 16
+_BUILD_BATCH = 1024
+
+
+@lru_cache(maxsize=1)
+def _projection():
+    rng = np.random.default_rng(PROJECTION_SEED)
+    return rng.standard_normal((N_FEATURES, DIMENSIONS), dtype=np.float32)
+
+def _hashed_features(terms):
+    features = Counter()
+    for term in terms:
+        digest = zlib.crc32(term.encode('utf-8'))
+        features[digest & _FEATURE_MASK] += -1 if digest & _SIGN_BIT else 1
+    # Adjacent pairs add a little phrase information.
+    for first, second in zip(terms, terms[1:]):
+        digest = zlib.crc32(f"{first} {second}".encode('utf-8'))
+        features[digest & _FEATURE_MASK] += -1 if digest & _SIGN_BIT else 1
+    return features
+
+def embed(term_lists) -> np.ndarray:
+    """
+    Embeds each list of terms as a unit-length float32 vector.
+
+    Term counts are dampened logarithmically before projection so that
+    repeated words do not dominate a passage.
+
+    Args:
+        term_lists (list): One list of index terms per text.
+
+    Returns:
+        np.ndarray: A (len(term_lists), DIMENSIONS) array.
+    """
+    projection = _projection()
+    vectors = np.zeros((len(term_lists), DIMENSIONS), dtype=np.float32)
+    for row, terms in enumerate(term_lists):
+        features = _hashed_features(terms)
+        if not features:
+            continue
+        buckets = np.fromiter(features.keys(), dtype=np.int64, count=len(features))
+        counts = np.fromiter(features.values(), dtype=np.float32, count=len(features))
+        weights = np.sign(counts) * np.log1p(np.abs(counts))
+        vectors[row] = weights @ projection[buckets]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class VectorIndex:
+    """
+    Passage embeddings of one document, stored as a .npy file and opened
+    memory-mapped.
+
+    Mapped pages live in the OS page cache rather than in any process's
+    heap, so every gunicorn worker querying the same document shares a
+    single copy.
+    """
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    @classmethod
+    def build(cls, path, term_lists):
+        """
+        Embeds passages in batches straight into a memory-mapped file, then
+        moves it into place atomically.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-", suffix=".npy")
+        os.close(fd)
+        try:
+            vectors = np.lib.format.open_memmap(
+                tmp_path, mode='w+', dtype=np.float32, shape=(len(term_lists), DIMENSIONS)
+            )
+            for start in range(0, len(term_lists), _BUILD_BATCH):
+                vectors[start:start + _BUILD_BATCH] = embed(term_lists[start:start + _BUILD_BATCH])
+            vectors.flush()
+            del vectors
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return cls.load(path)
+
+    @classmethod
+    def load(cls, path):
+        return cls(np.load(path, mmap_mode='r'))
+
+    def search(self, query_terms, k: int) -> list:
+        """
+        Returns up to `k` (passage_id, cosine_similarity) pairs for the
+        passages closest to the query, best first.
+        """
+        if not len(self.vectors) or not query_terms:
+            return []
+        query = embed([query_terms])[0]
+        scores = self.vectors @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(passage_id), float(scores[passage_id])) for passage_id in top]
+
+
+@lru_cache(maxsize=32)
+def load_vector_index(path):
+    """Opens a stored vector index, raising FileNotFoundError if missing."""
+    return VectorIndex.load(path)
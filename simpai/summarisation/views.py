@@ -1,17 +1,29 @@
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
-from .models import UploadedFile
-from .serializers import UploadedFileSerializer
+from .models import UploadedFile, ChatSession
+from .serializers import UploadedFileSerializer, ChatSessionSerializer
 from .utils import (
-    extract_text,
-    summarize_text,
-    ask_question,
-    text_to_speech,
-    gpt_chat
+    asummarize_pages,
+    aask_question,
+    prompt_key_or_default
 )
-from .pdfgen import generate_pdf
+from .pdfgen import render_pdf, RENDERER_VERSION
+from .artifacts import artifact_key, get_artifact, store_artifact, astream_into_artifact
+from .tts import aiter_speech, audio_version
+from .chat import aget_session, arecent_messages, astream_chat_turn
+from .batch import ZipBuffer, abatch_summaries
+from .textstore import get_document
+from .retrieval import build_context
+from helpers.sse import asse_text_stream
+from helpers.async_api import AsyncAPIView
+from helpers.http import conditional_file_response
+from jobs.views import JobSubmitView
+from asgiref.sync import sync_to_async
+from contextlib import aclosing
 import os
+import json
+import zipfile
 from django.conf import settings
 from django.http import FileResponse
 from rest_framework.parsers import JSONParser
@@ -19,9 +31,8 @@ from rest_framework.permissions import IsAuthenticated
 import uuid
 import logging
 from django.http import FileResponse
+from django.http import HttpResponse
 from django.http import StreamingHttpResponse
-import json
-import time
 from rest_framework import status
 
 logger = logging.getLogger(__name__)
@@ -33,21 +44,54 @@ class IsOwner(BasePermission):
     def has_object_permission(self, request, view, obj):
         return obj.user == request.user
     
-class FileWrapper:
-    def __init__(self, file, path):
-        self.file = file
-        self.path = path
-
-    def read(self, *args, **kwargs):
-        return self.file.read(*args, **kwargs)
-
-    def close(self):
-        self.file.close()
-        if os.path.exists(self.path):
-            try:
-                os.remove(self.path)
-            except PermissionError as e:
-                logger.warning(f"Could not delete file {self.path}: {str(e)}")
+def pdf_response(buffer, filename):
+    """Sends an in-memory PDF as a download, with no temporary file."""
+    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+async def audio_response(request, text, key, filename):
+    """
+    Serves the stored audio for `key`, or reads `text` out as a stream of
+    MP3 segments, storing the audio under `key` once it is complete.
+
+    `text` is a coroutine function returning the text, called only when
+    the audio is not stored. There is no audio of empty text: that is a 400.
+    """
+    audio_path = await sync_to_async(get_artifact, thread_sensitive=False)(key, ".mp3")
+    if audio_path is not None:
+        try:
+            # Players can seek in stored audio with Range requests
+            return await sync_to_async(conditional_file_response, thread_sensitive=False)(
+                request, audio_path, 'audio/mpeg', filename, asynchronous=True
+            )
+        except FileNotFoundError:
+            # Evicted since the lookup: read the text out again
+            pass
+
+    content = await text()
+    if not content.strip():
+        return Response({"error": "There is no text to read out."}, status=400)
+
+    chunks = astream_into_artifact(aiter_speech(content), key, ".mp3")
+    # Wait for the first segment, so a failing backend still gets an error
+    # response instead of an empty 200
+    first = await anext(chunks, b"")
+
+    async def body():
+        async with aclosing(chunks):
+            yield first
+            async for chunk in chunks:
+                yield chunk
+
+    response = StreamingHttpResponse(body(), content_type='audio/mpeg')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def _question_context(file_path, question):
+    # Extraction, indexing and passage search are CPU and disk bound, so
+    # async views run this in a thread.
+    return build_context(get_document(file_path), question)
 
 
 class FileUploadView(APIView):
@@ -70,43 +114,55 @@ class FileUploadView(APIView):
     else:
       return Response(file_serializer.errors, status=400)
 
-class SummarizeView(APIView):
+class SummarizeView(AsyncAPIView):
     parser_classes = [JSONParser]
     permission_classes = [IsAuthenticated, IsOwner]
 
-    def post(self, request, *args, **kwargs):
+    async def get(self, request, *args, **kwargs):
+        # GET makes the PDF cacheable and lets clients resume or revalidate
+        # the download with Range and If-None-Match
+        file_id = request.query_params.get("file_id")
+        prompt_key = request.query_params.get("prompt_key", "simple_summary")
+        return await self.summary_pdf(request, file_id, prompt_key)
+
+    async def post(self, request, *args, **kwargs):
         file_id = request.data.get("file_id")
         prompt_key = request.data.get("prompt_key", "simple_summary")
+        return await self.summary_pdf(request, file_id, prompt_key)
 
+    async def summary_pdf(self, request, file_id, prompt_key):
         if not file_id:
             return Response({"error": "file_id is required."}, status=400)
 
-        pdf_path = None
         try:
             # Retrieve the uploaded file and validate ownership
-            uploaded_file = UploadedFile.objects.get(id=file_id, user=request.user)
+            uploaded_file = await UploadedFile.objects.aget(id=file_id, user=request.user)
             file_path = uploaded_file.file.path
 
-            # Extract text from the file
-            text = extract_text(file_path)
-
-            # Summarize the text
-            summary = summarize_text(text, prompt_key)
-
-            # Generate a unique filename for the PDF
-            pdf_filename = f"{uuid.uuid4()}_summary.pdf"
-            pdf_path = os.path.join(settings.MEDIA_ROOT, pdf_filename)
-
-            # Generate the PDF
-            generate_pdf(summary, pdf_path)
-
-            # Serve the PDF for download
-            file = open(pdf_path, 'rb')
-            file_wrapper = FileWrapper(file, pdf_path)
-
-            response = FileResponse(file_wrapper, content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="{pdf_filename}"'
-            return response
+            # Extraction runs in a thread, off the event loop
+            document = await sync_to_async(get_document, thread_sensitive=False)(file_path)
+
+            # Reuse the PDF made earlier for the same document and prompt
+            key = artifact_key(document.digest, "summary_pdf", prompt_key_or_default(prompt_key), RENDERER_VERSION)
+            pdf_path = await sync_to_async(get_artifact, thread_sensitive=False)(key, ".pdf")
+            if pdf_path is not None:
+                try:
+                    return await self.pdf_file_response(request, pdf_path, key)
+                except FileNotFoundError:
+                    # Evicted since the lookup: make it again
+                    pass
+
+            # Stream the stored text page by page into the summariser
+            summary = await asummarize_pages(document.iter_pages(), prompt_key)
+
+            # Render the PDF in memory, in a thread, and keep it
+            pdf = await sync_to_async(render_pdf, thread_sensitive=False)(summary)
+            pdf_path = await sync_to_async(store_artifact, thread_sensitive=False)(key, ".pdf", pdf.getvalue())
+            try:
+                return await self.pdf_file_response(request, pdf_path, key)
+            except FileNotFoundError:
+                # Evicted as soon as it was stored: send the rendered copy
+                return pdf_response(pdf, f"{key[:16]}_summary.pdf")
 
         except UploadedFile.DoesNotExist:
             return Response({"error": "File not found or access denied."}, status=404)
@@ -115,11 +171,94 @@ class SummarizeView(APIView):
             logger.error(f"Error in SummarizeView: {str(e)}")
             return Response({"error": "An internal error occurred."}, status=500)
 
-class AskQuestionsView(APIView):
+    async def pdf_file_response(self, request, pdf_path, key):
+        # Serve the PDF for download
+        return await sync_to_async(conditional_file_response, thread_sensitive=False)(
+            request, pdf_path, 'application/pdf', f"{key[:16]}_summary.pdf", asynchronous=True
+        )
+
+class BatchSummarizeView(AsyncAPIView):
+    """
+    Summarises up to SUMMARY_BATCH_MAX_FILES files in one request, all at
+    once, and streams each result as soon as it is ready: NDJSON lines of
+    {"file_id", "name", "summary"} (or "error"), or, with "format": "zip",
+    a zip of summary PDFs in which files that failed are listed in
+    errors.json.
+    """
+    parser_classes = [JSONParser]
+    permission_classes = [IsAuthenticated]
+
+    async def post(self, request, *args, **kwargs):
+        file_ids = request.data.get("file_ids")
+        prompt_key = request.data.get("prompt_key", "simple_summary")
+        output = request.data.get("format", "ndjson")
+
+        if not isinstance(file_ids, list) or not file_ids:
+            return Response({"error": "file_ids must be a non-empty list."}, status=400)
+        if len(file_ids) > settings.SUMMARY_BATCH_MAX_FILES:
+            return Response({"error": f"At most {settings.SUMMARY_BATCH_MAX_FILES} files per batch."}, status=400)
+        if output not in ("ndjson", "zip"):
+            return Response({"error": "format must be 'ndjson' or 'zip'."}, status=400)
+        try:
+            file_ids = list(dict.fromkeys(int(file_id) for file_id in file_ids))
+        except (TypeError, ValueError):
+            return Response({"error": "file_ids must be integers."}, status=400)
+
+        uploaded_files = [
+            uploaded_file async for uploaded_file in
+            UploadedFile.objects.filter(id__in=file_ids, user=request.user)
+        ]
+        found = {uploaded_file.id for uploaded_file in uploaded_files}
+        missing = [file_id for file_id in file_ids if file_id not in found]
+        results = abatch_summaries(uploaded_files, prompt_key, with_pdf=output == "zip")
+
+        if output == "zip":
+            response = StreamingHttpResponse(self.zip_body(results, missing), content_type='application/zip')
+            response['Content-Disposition'] = 'attachment; filename="summaries.zip"'
+        else:
+            response = StreamingHttpResponse(self.ndjson_body(results, missing), content_type='application/x-ndjson')
+            response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @staticmethod
+    def _name(uploaded_file):
+        return uploaded_file.original_name or os.path.basename(uploaded_file.file.name)
+
+    async def ndjson_body(self, results, missing):
+        for file_id in missing:
+            yield json.dumps({"file_id": file_id, "error": "File not found or access denied."}) + "\n"
+        async with aclosing(results):
+            async for uploaded_file, result in results:
+                line = {"file_id": uploaded_file.id, "name": self._name(uploaded_file)}
+                if isinstance(result, Exception):
+                    line["error"] = "Failed to summarise this file."
+                else:
+                    line["summary"] = result["summary"]
+                yield json.dumps(line) + "\n"
+
+    async def zip_body(self, results, missing):
+        errors = [{"file_id": file_id, "error": "File not found or access denied."} for file_id in missing]
+        buffer = ZipBuffer()
+        # PDFs are compressed already
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+            async with aclosing(results):
+                async for uploaded_file, result in results:
+                    if isinstance(result, Exception):
+                        errors.append({"file_id": uploaded_file.id, "error": "Failed to summarise this file."})
+                        continue
+                    stem = os.path.splitext(self._name(uploaded_file))[0]
+                    archive.writestr(f"{uploaded_file.id}_{stem}_summary.pdf", result["pdf"])
+                    yield buffer.drain()
+            if errors:
+                archive.writestr("errors.json", json.dumps(errors, indent=2))
+        yield buffer.drain()
+
+
+class AskQuestionsView(AsyncAPIView):
     permission_classes = [IsAuthenticated, IsOwner]
     parser_classes = [JSONParser]
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         file_id = request.data.get("file_id")
         custom_prompt = request.data.get("custom_prompt")
 
@@ -129,28 +268,19 @@ class AskQuestionsView(APIView):
         if not custom_prompt:
             return Response({"error": "Please enter your question."}, status=400)
 
-        pdf_path = None
         try:
             # Retrieve the uploaded file
-            uploaded_file = UploadedFile.objects.get(id=file_id)
+            uploaded_file = await UploadedFile.objects.aget(id=file_id)
             file_path = uploaded_file.file.path
 
-            # Extract text
-            text = extract_text(file_path)
+            # Pick the passages relevant to the question
+            text = await sync_to_async(_question_context, thread_sensitive=False)(file_path, custom_prompt)
 
             # Ask the question using the custom prompt
-            answer = ask_question(text, custom_prompt)
+            answer = await aask_question(text, custom_prompt)
 
-            pdf_filename = f"{uuid.uuid4()}_answer.pdf"
-            pdf_path = os.path.join(settings.MEDIA_ROOT, pdf_filename)
-            generate_pdf(answer, pdf_path)
-
-            file = open(pdf_path, 'rb')
-            file_wrapper = FileWrapper(file, pdf_path
-                                       )
-            response = FileResponse(file_wrapper, content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="{pdf_filename}"'
-            return response
+            pdf = await sync_to_async(render_pdf, thread_sensitive=False)(answer)
+            return pdf_response(pdf, f"{uuid.uuid4()}_answer.pdf")
 
         except UploadedFile.DoesNotExist:
             return Response({"error": "Invalid file_id. File not found."}, status=404)
@@ -159,11 +289,11 @@ class AskQuestionsView(APIView):
             return Response({"error": str(e)}, status=500)
         
 
-class GPTChatView(APIView):
+class GPTChatView(AsyncAPIView):
     permission_classes = [IsAuthenticated, IsOwner]
     parser_classes = [JSONParser]
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         file_id = request.data.get("file_id")
         question = request.data.get("question")
 
@@ -174,23 +304,24 @@ class GPTChatView(APIView):
             return Response({"error": "Please enter your question."}, status=400)
 
         try:
-            # Retrieve the uploaded file
-            uploaded_file = UploadedFile.objects.get(id=file_id, user=request.user)
+            # Retrieve the uploaded file and the conversation about it
+            uploaded_file = await UploadedFile.objects.aget(id=file_id, user=request.user)
             file_path = uploaded_file.file.path
+            session = await aget_session(request.user, uploaded_file)
+            history = await arecent_messages(session)
 
-            # Extract text from the file
-            text = extract_text(file_path)
-
-            # Use GPT to answer the question
-            answer = gpt_chat(text, question)
+            # Pick the passages relevant to the question; follow-up questions
+            # often take their subject from the previous one
+            previous = next((message.content for message in reversed(history) if message.role == "user"), "")
+            text = await sync_to_async(_question_context, thread_sensitive=False)(file_path, f"{previous}\n{question}".strip())
 
-            def stream_response():
-                for word in answer.split():
-                    yield f"data: {json.dumps({'word': word})}\n\n"
-                    time.sleep(0.1)
+            # Stream the answer to the client as DeepSeek generates it
+            answer = astream_chat_turn(session, text, question, history)
 
-            response = StreamingHttpResponse(stream_response(), content_type='text/event-stream')
+            response = StreamingHttpResponse(asse_text_stream(answer), content_type='text/event-stream')
             response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'
+            response['X-Chat-Session'] = str(session.pk)
             return response
         #     # Generate a PDF for the answer (optional)
         #     pdf_filename = f"{uuid.uuid4()}_gpt_answer.pdf"
@@ -217,29 +348,56 @@ class GPTChatView(APIView):
         except Exception as e:
             logger.error(f"Error in GPTChatView: {str(e)}")
             return Response({"error": "An internal error occurred."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-class GenerateOriginalAudioView(APIView):
+
+class ChatHistoryView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def file_id(self, request):
+        """The file_id query parameter as an int, or None if missing or invalid."""
+        try:
+            return int(request.query_params.get("file_id", ""))
+        except ValueError:
+            return None
+
+    def get(self, request, *args, **kwargs):
+        file_id = self.file_id(request)
+        if file_id is None:
+            return Response({"error": "file_id must be an integer."}, status=400)
+
+        session = ChatSession.objects.filter(user=request.user, uploaded_file_id=file_id).first()
+        if session is None:
+            return Response({"summary": "", "messages": []})
+        return Response(ChatSessionSerializer(session).data)
+
+    def delete(self, request, *args, **kwargs):
+        file_id = self.file_id(request)
+        if file_id is None:
+            return Response({"error": "file_id must be an integer."}, status=400)
+
+        # Start the conversation about the file afresh
+        ChatSession.objects.filter(user=request.user, uploaded_file_id=file_id).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class GenerateOriginalAudioView(AsyncAPIView):
     parser_classes = [MultiPartParser]
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         file_id = request.data.get("file_id")
 
         if not file_id:
             return Response({"error": "file_id is required."}, status=400)
 
         try:
-            uploaded_file = UploadedFile.objects.get(id=file_id)
+            uploaded_file = await UploadedFile.objects.aget(id=file_id)
             file_path = uploaded_file.file.path
+            document = await sync_to_async(get_document, thread_sensitive=False)(file_path)
 
-            # Extract text from the file
-            text = extract_text(file_path)
-
-            # Convert text to audio
-            audio_path = text_to_speech(text, "original_audio")
+            async def text():
+                return await sync_to_async(lambda: document.text, thread_sensitive=False)()
 
-            # Serve the audio file
-            response = FileResponse(open(audio_path, 'rb'), content_type='audio/mpeg')
-            response['Content-Disposition'] = 'attachment; filename="original_audio.mp3"'
-            return response
+            # Stream the audio as its segments are synthesised
+            key = artifact_key(document.digest, "original_audio", "", audio_version())
+            return await audio_response(request, text, key, "original_audio.mp3")
 
         except UploadedFile.DoesNotExist:
             return Response({"error": "Invalid file_id. File not found."}, status=404)
@@ -247,34 +405,56 @@ class GenerateOriginalAudioView(APIView):
         except Exception as e:
             return Response({"error": str(e)}, status=500)
 
-class GenerateSummaryAudioView(APIView):
-    def post(self, request, *args, **kwargs):
+class GenerateSummaryAudioView(AsyncAPIView):
+    async def get(self, request, *args, **kwargs):
+        file_id = request.query_params.get("file_id")
+        prompt_key = request.query_params.get("prompt_key", "simple_summary")
+        return await self.summary_audio(request, file_id, prompt_key)
+
+    async def post(self, request, *args, **kwargs):
         file_id = request.data.get("file_id")
         prompt_key = request.data.get("prompt_key", "simple_summary")
+        return await self.summary_audio(request, file_id, prompt_key)
 
+    async def summary_audio(self, request, file_id, prompt_key):
         if not file_id:
             return Response({"error": "file_id is required."}, status=400)
 
         try:
-            uploaded_file = UploadedFile.objects.get(id=file_id)
+            uploaded_file = await UploadedFile.objects.aget(id=file_id)
             file_path = uploaded_file.file.path
+            document = await sync_to_async(get_document, thread_sensitive=False)(file_path)
 
-            # Extract text from the file
-            text = extract_text(file_path)
+            async def text():
+                # Stream the stored text page by page into the summariser
+                return await asummarize_pages(document.iter_pages(), prompt_key)
 
-            # Summarize the text
-            summary = summarize_text(text, prompt_key)
-
-            # Convert the summary to audio
-            audio_path = text_to_speech(summary, "summary_audio")
-
-            # Serve the audio file
-            response = FileResponse(open(audio_path, 'rb'), content_type='audio/mpeg')
-            response['Content-Disposition'] = 'attachment; filename="summary_audio.mp3"'
-            return response
+            # Reuse the audio made earlier for the same document and prompt,
+            # or stream it as its segments are synthesised
+            key = artifact_key(document.digest, "summary_audio", prompt_key_or_default(prompt_key), audio_version())
+            return await audio_response(request, text, key, "summary_audio.mp3")
 
         except UploadedFile.DoesNotExist:
             return Response({"error": "Invalid file_id. File not found."}, status=404)
 
         except Exception as e:
-            return Response({"error": str(e)}, status=500)
\ No newline at end of file
+            return Response({"error": str(e)}, status=500)
+
+
+class SummarizeJobView(JobSubmitView):
+    """Queues the work of SummarizeView as a background job."""
+    kind = "summarize"
+    file_model = UploadedFile
+    payload_fields = ("prompt_key",)
+
+
+class AudioJobView(JobSubmitView):
+    """Queues original or summary audio generation as a background job."""
+    kind = "audio"
+    file_model = UploadedFile
+    payload_fields = ("source", "prompt_key")
+
+    def validate(self, request):
+        if request.data.get("source", "original") not in ("original", "summary"):
+            return "source must be 'original' or 'summary'."
+        return None